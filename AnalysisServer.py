@@ -0,0 +1,306 @@
+"""This module serves position analysis over TCP, so several tools can share engine processes whose transposition
+tables stay warm between requests. Requests and responses are JSON objects, one per line. A request gives a position
+and limits:
+
+    {"id": 1, "fen": "<FEN, the start position if left out>", "moves": ["e2e4", "e7e5"], "depth": 8, "movetime": 2.0,
+     "nodes": 50000, "timeout": 10}
+
+and gets {"id": 1, "bestmove": "g1f3", "score": 35, "depth": 6, "nodes": 48213, "time": 1.93, "pv": ["g1f3", ...]}
+(score in centipawns for the side to move) or {"id": 1, "error": "..."}. Requests on one connection are answered as
+they finish, not in order. {"cancel": 1} stops request 1: if it is still waiting for a worker it is answered with the
+error "cancelled", if it is being searched it is answered with the best move found so far.
+
+Searches run in a pool of worker processes. Requests wait for a free worker in a bounded queue; when the queue is full,
+new requests are answered at once with the error "busy". The timeout of a request counts from its arrival: its search
+is stopped by then with the best move found so far, and a request still waiting for a worker at that time gets the
+error "timeout". Run it as a script:
+
+    python AnalysisServer.py serve [--port 8765] [--workers 2] [--queue 16]
+    python AnalysisServer.py query '{"fen": "...", "movetime": 1}' [--port 8765]"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import ChessEngine
+import SmartMoveFinder
+
+HOST = "127.0.0.1"  # Only local connections, the server has no authentication
+PORT = 8765
+DEFAULT_WORKERS = os.cpu_count() or 1
+QUEUE_LIMIT = 16  # Requests that may wait for a worker before new ones are turned away
+DEFAULT_MOVE_TIME = 1.0  # Seconds searched when a request gives no limits
+DEFAULT_TIMEOUT = 60.0
+TIMEOUT_GRACE = 1.0  # The first depth is always finished, so a search may overrun its time limit a little
+
+stopFlags = None  # Shared array with a stop flag per worker slot, set up in every worker process by init_worker
+
+
+def init_worker(flags):
+    global stopFlags
+    stopFlags = flags
+
+
+'''
+Stop event of the search in a worker slot, read by SmartMoveFinder.check_limits
+'''
+
+
+class StopFlag:
+    def __init__(self, slot):
+        self.slot = slot
+
+    def is_set(self):
+        return stopFlags[self.slot] != 0
+
+
+'''
+Runs in a worker process. Sets up the position of a request and searches it. The transposition table of the worker
+process is kept between requests. slot is the worker slot whose stop flag stops the search, or None for a search that
+cannot be stopped. Raises ValueError for a bad FEN or an illegal move
+'''
+
+
+def analyse_position(task):
+    slot, fen, moves, maxDepth, timeLimit, nodeLimit = task
+    gs = ChessEngine.game_state.from_fen(fen) if fen else ChessEngine.game_state()
+    for notation in moves:
+        move = next((move for move in gs.get_valid_moves() if move.get_chess_notation() == notation), None)
+        if move is None:
+            raise ValueError("Illegal move " + str(notation))
+        gs.make_move(move)
+    validMoves = gs.get_valid_moves()
+    if not validMoves:
+        return {"bestmove": None, "score": -SmartMoveFinder.CHECKMATE if gs.checkMate else SmartMoveFinder.STALEMATE,
+                "depth": 0, "nodes": 0, "time": 0.0, "pv": []}
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # The per depth lines of the search
+        bestMove = SmartMoveFinder.find_best_move_min_max(gs, validMoves, maxDepth, timeLimit, nodeLimit, None,
+                                                          StopFlag(slot) if slot is not None else None)
+    return {"bestmove": bestMove.get_chess_notation(), "score": SmartMoveFinder.bestScore,
+            "depth": SmartMoveFinder.completedDepth, "nodes": SmartMoveFinder.counter,
+            "time": round(time.perf_counter() - start, 3),
+            "pv": [move.get_chess_notation() for move in SmartMoveFinder.principalVariation]}
+
+
+class AnalysisServer:
+    def __init__(self, workers=DEFAULT_WORKERS, queueLimit=QUEUE_LIMIT):
+        self.workers = workers
+        self.queueLimit = queueLimit
+        # Workers are spawned rather than forked: a forked worker would inherit the sockets of the clients connected at
+        # the time, and a client that disconnects would not be noticed while the worker holds its socket open
+        context = multiprocessing.get_context("spawn")
+        self.stopFlags = context.RawArray('b', workers)
+        self.executor = concurrent.futures.ProcessPoolExecutor(workers, context, init_worker, (self.stopFlags,))
+        self.freeSlots = list(range(workers))  # Worker slots (stop flags) not used by a running search
+        self.slotFree = None  # asyncio.Condition, notified when a search ends and frees its slot
+        self.pending = 0  # Requests waiting for a worker or being searched
+        self.server = None
+
+    async def start(self, host=HOST, port=PORT):
+        self.slotFree = asyncio.Condition()
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for slot in range(self.workers):
+            self.stopFlags[slot] = 1
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    '''
+    Serves one connection. Every request line is handled in its own task, so a long search does not hold up the
+    requests behind it. The searches of a client that disconnects are stopped
+    '''
+
+    async def handle_client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        writeLock = asyncio.Lock()
+        requests = {}  # id -> (task, state) of the requests of this connection that have not been answered
+        connection = {"open": True}
+
+        async def send(response):
+            if not connection["open"]:
+                return
+            async with writeLock:
+                writer.write((json.dumps(response) + "\n").encode())
+                try:
+                    await writer.drain()  # Waits while a slow client's buffer is full
+                except ConnectionError:
+                    connection["open"] = False
+
+        def finish(task, requestID):
+            self.pending -= 1
+            requests.pop(requestID, None)
+            if task.cancelled():
+                response = {"id": requestID, "error": "cancelled"}
+            elif task.exception() is not None:
+                response = {"id": requestID, "error": repr(task.exception())}
+            else:
+                response = task.result()
+            loop.create_task(send(response))
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("A request must be a JSON object")
+                except ValueError as error:
+                    await send({"error": "Bad request: " + str(error)})
+                    continue
+                if "cancel" in request:
+                    self.cancel(*requests.get(request["cancel"], (None, None)))
+                    continue
+                requestID = request.get("id")
+                if self.pending >= self.workers + self.queueLimit:
+                    await send({"id": requestID, "error": "busy"})
+                    continue
+                self.pending += 1
+                state = {"slot": None}
+                task = asyncio.create_task(self.analyse(request, state))
+                task.add_done_callback(lambda task, requestID=requestID: finish(task, requestID))
+                requests[requestID] = (task, state)
+        except ConnectionError:
+            pass
+        finally:
+            connection["open"] = False
+            for task, state in list(requests.values()):
+                self.cancel(task, state)
+            writer.close()
+
+    '''
+    Stops a request: a search that is running is told to stop, a request still waiting for a worker is cancelled
+    '''
+
+    def cancel(self, task, state):
+        if task is None:
+            return
+        if state["slot"] is not None:
+            self.stopFlags[state["slot"]] = 1
+        else:
+            task.cancel()
+
+    '''
+    Waits for a free worker, searches the request on it and returns the response. state["slot"] holds the worker slot
+    while the search runs, so the request can be stopped
+    '''
+
+    async def analyse(self, request, state):
+        requestID = request.get("id")
+        try:
+            maxDepth = int(request["depth"]) if "depth" in request else None
+            timeLimit = float(request["movetime"]) if "movetime" in request else None
+            nodeLimit = int(request["nodes"]) if "nodes" in request else None
+            timeout = float(request.get("timeout", DEFAULT_TIMEOUT))
+            fen, moves = request.get("fen"), list(request.get("moves", []))
+            if maxDepth is not None and maxDepth <= 0:
+                raise ValueError("depth must be at least 1")
+        except (TypeError, ValueError) as error:
+            return {"id": requestID, "error": "Bad limits: " + str(error)}
+        if maxDepth is None and timeLimit is None and nodeLimit is None:
+            timeLimit = DEFAULT_MOVE_TIME
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            slot = await asyncio.wait_for(self.acquire_slot(), timeout)
+        except asyncio.TimeoutError:
+            return {"id": requestID, "error": "timeout"}
+        state["slot"] = slot
+        remaining = max(deadline - loop.time(), 0.0)
+        timeLimit = remaining if timeLimit is None else min(timeLimit, remaining)
+        try:
+            future = loop.run_in_executor(self.executor, analyse_position,
+                                          (slot, fen, moves, maxDepth, timeLimit, nodeLimit))
+        except RuntimeError:  # The pool is shut down or broken
+            await self.release_slot(slot)
+            raise
+        # The slot is only freed when the worker is done, even if this request stops waiting for it
+        future.add_done_callback(lambda _: loop.create_task(self.release_slot(slot)))
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), remaining + TIMEOUT_GRACE)
+        except asyncio.TimeoutError:
+            self.stopFlags[slot] = 1
+            return {"id": requestID, "error": "timeout"}
+        except asyncio.CancelledError:
+            self.stopFlags[slot] = 1
+            raise
+        except ValueError as error:
+            return {"id": requestID, "error": str(error)}
+        result["id"] = requestID
+        return result
+
+    async def acquire_slot(self):
+        async with self.slotFree:
+            await self.slotFree.wait_for(lambda: self.freeSlots)
+            slot = self.freeSlots.pop()
+        self.stopFlags[slot] = 0
+        return slot
+
+    async def release_slot(self, slot):
+        async with self.slotFree:
+            self.freeSlots.append(slot)
+            self.slotFree.notify()
+
+
+async def serve(host=HOST, port=PORT, workers=DEFAULT_WORKERS, queueLimit=QUEUE_LIMIT):
+    analysisServer = AnalysisServer(workers, queueLimit)
+    server = await analysisServer.start(host, port)
+    print("Analysing on %s:%d with %d workers" % (host, port, workers))
+    try:
+        await server.serve_forever()
+    finally:
+        await analysisServer.close()
+
+
+'''
+Sends one request to a running server and returns its response. For scripts that do not use asyncio
+'''
+
+
+def query(request, host=HOST, port=PORT):
+    with socket.create_connection((host, port)) as connection:
+        connection.sendall((json.dumps(request) + "\n").encode())
+        with connection.makefile("r") as responses:
+            return json.loads(responses.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Position analysis server")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serveParser = commands.add_parser("serve", help="run the server")
+    serveParser.add_argument("--host", default=HOST)
+    serveParser.add_argument("--port", type=int, default=PORT)
+    serveParser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    serveParser.add_argument("--queue", type=int, default=QUEUE_LIMIT, help="requests that may wait for a worker")
+    queryParser = commands.add_parser("query", help="send a request to a running server")
+    queryParser.add_argument("request", type=json.loads, help="request as JSON")
+    queryParser.add_argument("--host", default=HOST)
+    queryParser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    if args.command == "query":
+        print(json.dumps(query(args.request, args.host, args.port)))
+        return 0
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.queue))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
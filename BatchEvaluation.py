@@ -0,0 +1,239 @@
+"""This module scores many positions at once with NumPy. Boards are encoded as an N x 64 array of int8 piece codes, and
+the material and piece-square table scores of Evaluation are summed for all of them with array operations instead of
+square by square in Python. A mobility term (squares attacked by knights, bishops, rooks and queens) can be added, also
+worked out for the whole batch at once. NumPy is optional: without it the same functions fall back to
+Evaluation.evaluate_board and mobility_board. Run it as a script to compare the speed of both:
+
+    python BatchEvaluation.py [positions]"""
+
+import random
+import sys
+import time
+import ChessEngine
+import Evaluation
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, see the fallbacks below
+    np = None
+
+# Piece code of every square in an encoded board. Square index = rank * 8 + file, like BitboardEngine
+PIECE_CODES = {"--": 0}
+PIECE_CODES.update({piece: code + 1 for code, piece in enumerate(ChessEngine.PIECE_NAMES)})
+BATCH_POSITIONS = 5000  # Number of positions scored by the benchmark
+# Centipawns per square a piece attacks that does not hold a piece of its own color. game_state.evaluation() has no
+# mobility term, it would have to look at the board after every move, so it is only added when asked for
+MOBILITY_WEIGHTS = {'N': 4, 'B': 5, 'R': 2, 'Q': 1}
+OFF_BOARD = 3  # Color of the padding square that rays and knight jumps leaving the board point to
+
+'''
+Table with a row per piece code and a column per square, made from Evaluation.MG_SCORES or EG_SCORES. Row 0 is the
+empty square
+'''
+
+
+def build_score_table(scores):
+    table = [[0] * 64]
+    for piece in ChessEngine.PIECE_NAMES:
+        table.append([scores[piece][r][f] for r in range(8) for f in range(8)])
+    return table
+
+
+'''
+Table with a row per square and a column per step away from it, holding the square index reached or 64 (the padding
+square) past the edge of the board. Made from the [rank][file] square lists of ChessEngine
+'''
+
+
+def build_index_table(squareLists, length):
+    table = []
+    for r in range(8):
+        for f in range(8):
+            indices = [rank * 8 + file for rank, file in squareLists[r][f]]
+            table.append(indices + [64] * (length - len(indices)))
+    return table
+
+
+if np is not None:
+    MG_TABLE = np.array(build_score_table(Evaluation.MG_SCORES), dtype=np.int32)
+    EG_TABLE = np.array(build_score_table(Evaluation.EG_SCORES), dtype=np.int32)
+    PHASE_TABLE = np.array([0] + [Evaluation.PHASE_WEIGHTS[piece[1]] for piece in ChessEngine.PIECE_NAMES],
+                           dtype=np.int32)
+    SQUARES = np.arange(64)
+    # Mobility weight of every piece code (negative for black), the ray directions it moves along (1 diagonal,
+    # 2 straight, knights have none) and its color (1 white, 2 black)
+    MOBILITY_TABLE = np.array([0] + [MOBILITY_WEIGHTS.get(piece[1], 0) * (1 if piece[0] == 'w' else -1)
+                                     for piece in ChessEngine.PIECE_NAMES], dtype=np.int32)
+    SLIDER_DIRECTIONS = np.array([0] + [{'B': 1, 'R': 2, 'Q': 3}.get(piece[1], 0) for piece in ChessEngine.PIECE_NAMES],
+                                 dtype=np.int8)
+    COLOR_TABLE = np.array([0] + [1 if piece[0] == 'w' else 2 for piece in ChessEngine.PIECE_NAMES], dtype=np.int8)
+    KNIGHT_INDEX = np.array(build_index_table(ChessEngine.KNIGHT_SQUARES, 8))
+    # A ray has at most 7 squares, the 8th column is always the padding square
+    RAY_INDEX = {d: np.array(build_index_table([[ChessEngine.RAY_SQUARES[r][f][d] for f in range(8)] for r in range(8)],
+                                               8)) for d in ChessEngine.KING_STEPS}
+    RAY_DIRECTIONS = [(d, d[0] != 0 and d[1] != 0) for d in ChessEngine.KING_STEPS]
+
+
+def encode_board(board):
+    return [PIECE_CODES[piece] for rank in board for piece in rank]
+
+
+'''
+Encodes a list of boards as an N x 64 int8 array (a list of lists without NumPy)
+'''
+
+
+def encode_boards(boards):
+    codes = [encode_board(board) for board in boards]
+    return np.array(codes, dtype=np.int8).reshape(len(codes), 64) if np is not None else codes
+
+
+'''
+Static evaluation of every board in centipawns from white's point of view, the same score as game_state.evaluation().
+With mobility the mobility term is added. Returns a NumPy array, or a list without NumPy
+'''
+
+
+def evaluate_boards(boards, mobility=False):
+    if np is None:
+        return [Evaluation.tapered_score(*Evaluation.evaluate_board(board)) + (mobility_board(board) if mobility else 0)
+                for board in boards]
+    return evaluate_codes(encode_boards(boards), mobility)
+
+
+def evaluate_codes(codes, mobility=False):
+    mgScores = MG_TABLE[codes, SQUARES].sum(axis=1)
+    egScores = EG_TABLE[codes, SQUARES].sum(axis=1)
+    phases = np.minimum(PHASE_TABLE[codes].sum(axis=1), Evaluation.MAX_PHASE)
+    scores = (mgScores * phases + egScores * (Evaluation.MAX_PHASE - phases)) // Evaluation.MAX_PHASE
+    return scores + mobility_codes(codes) if mobility else scores
+
+
+'''
+Mobility term of one board from white's point of view, square by square. The reference for mobility_codes
+'''
+
+
+def mobility_board(board):
+    score = 0
+    for r in range(8):
+        for f in range(8):
+            piece = board[r][f]
+            if piece[1] not in MOBILITY_WEIGHTS:
+                continue
+            count = 0
+            if piece[1] == 'N':
+                count = sum(1 for rank, file in ChessEngine.KNIGHT_SQUARES[r][f] if board[rank][file][0] != piece[0])
+            else:
+                for direction, ray in ChessEngine.RAY_SQUARES[r][f].items():
+                    if piece[1] != 'Q' and (direction[0] != 0 and direction[1] != 0) != (piece[1] == 'B'):
+                        continue
+                    for rank, file in ray:  # Up to and including the first piece along the ray
+                        if board[rank][file][0] != piece[0]:
+                            count += 1
+                        if board[rank][file] != "--":
+                            break
+            score += MOBILITY_WEIGHTS[piece[1]] * count if piece[0] == 'w' else -MOBILITY_WEIGHTS[piece[1]] * count
+    return score
+
+
+'''
+Mobility term of every board of an N x 64 code array. Only the squares holding a knight, bishop, rook or queen are
+looked at: they are gathered from all boards into one flat list, and the squares along their rays are looked up for the
+whole list at once. Every board gets a 65th padding square, which rays and knight jumps leaving the board point to. The
+squares in front of the first piece along a ray are empty and all count. The first piece counts if it has the other
+color, the padding square never does
+'''
+
+
+def mobility_codes(codes):
+    colors = np.full((len(codes), 65), OFF_BOARD, dtype=np.int8)
+    colors[:, :64] = COLOR_TABLE[codes]
+    colors = colors.ravel()
+    boardIndex, square = np.nonzero(MOBILITY_TABLE[codes] != 0)
+    pieceCodes = codes[boardIndex, square]
+    offsets = boardIndex * 65
+    enemyColors = 3 - COLOR_TABLE[pieceCodes]
+    scores = np.zeros(len(codes))  # np.bincount sums its weights as floats, exact for these small whole numbers
+
+    knights = np.nonzero(SLIDER_DIRECTIONS[pieceCodes] == 0)[0]
+    targets = colors[offsets[knights, None] + KNIGHT_INDEX[square[knights]]]
+    counts = ((targets == 0) | (targets == enemyColors[knights, None])).sum(axis=1)
+    scores += np.bincount(boardIndex[knights], MOBILITY_TABLE[pieceCodes[knights]] * counts, len(codes))
+    for direction, diagonal in RAY_DIRECTIONS:
+        sliders = np.nonzero(SLIDER_DIRECTIONS[pieceCodes] & (1 if diagonal else 2))[0]  # Bishops or rooks and queens
+        targets = colors[offsets[sliders, None] + RAY_INDEX[direction][square[sliders]]]
+        firstPiece = (targets != 0).argmax(axis=1)  # The last column is always the padding square
+        counts = firstPiece + (targets[np.arange(len(sliders)), firstPiece] == enemyColors[sliders])
+        scores += np.bincount(boardIndex[sliders], MOBILITY_TABLE[pieceCodes[sliders]] * counts, len(codes))
+    return scores.astype(np.int32)
+
+
+'''
+Scores the position after each of moves in one batch. The moves are made and undone on gs
+'''
+
+
+def evaluate_moves(gs, moves, mobility=False):
+    boards = []
+    for move in moves:
+        gs.make_move(move)
+        boards.append([rank[:] for rank in gs.board])
+        gs.undo_move()
+    return evaluate_boards(boards, mobility)
+
+
+'''
+Boards of random games from the starting position, used by the benchmark
+'''
+
+
+def random_boards(count, seed=0):
+    rng = random.Random(seed)
+    boards = []
+    gs = ChessEngine.game_state()
+    while len(boards) < count:
+        validMoves = gs.get_valid_moves()
+        if not validMoves or len(gs.moveLog) >= 100:
+            gs = ChessEngine.game_state()
+            continue
+        gs.make_move(rng.choice(validMoves))
+        boards.append([rank[:] for rank in gs.board])
+    return boards
+
+
+def main(count=BATCH_POSITIONS):
+    boards = random_boards(count)
+    start = time.perf_counter()
+    expected = [Evaluation.tapered_score(*Evaluation.evaluate_board(board)) for board in boards]
+    loopTime = time.perf_counter() - start
+    print("one at a time: %d positions in %.3f s, %.0f positions/s" % (count, loopTime, count / loopTime))
+    if np is None:
+        print("NumPy is not installed, evaluate_boards scores one board at a time")
+        return
+    start = time.perf_counter()
+    codes = encode_boards(boards)
+    encodeTime = time.perf_counter() - start
+    start = time.perf_counter()
+    scores = evaluate_codes(codes)
+    batchTime = time.perf_counter() - start
+    if scores.tolist() != expected:
+        raise RuntimeError("Batched scores differ from Evaluation.evaluate_board")
+    print("batched:       %d positions in %.3f s (%.3f s encoding), %.0f positions/s" % (
+        count, encodeTime + batchTime, encodeTime, count / (encodeTime + batchTime)))
+    print("speedup %.1fx, %.1fx without encoding" % (loopTime / (encodeTime + batchTime), loopTime / batchTime))
+
+    start = time.perf_counter()
+    expected = [mobility_board(board) for board in boards]
+    loopTime = time.perf_counter() - start
+    start = time.perf_counter()
+    scores = mobility_codes(codes)
+    batchTime = time.perf_counter() - start
+    if scores.tolist() != expected:
+        raise RuntimeError("Batched mobility differs from mobility_board")
+    print("mobility:      %.0f positions/s one at a time, %.0f positions/s batched, speedup %.1fx" % (
+        count / loopTime, count / batchTime, loopTime / batchTime))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else BATCH_POSITIONS)
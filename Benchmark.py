@@ -0,0 +1,159 @@
+"""This module benchmarks the engine backends against each other. Run it as a script to compare the move generation
+throughput of the list-of-strings board (ChessEngine) with the bitboard board (BitboardEngine). Run it with
+"ordering [depth]" or "pruning [depth]" to compare the number of nodes searched by SmartMoveFinder with each move
+ordering heuristic or each selective search feature (null move, late move reductions, check extensions) switched
+off."""
+
+import contextlib
+import io
+import random
+import sys
+import time
+import ChessEngine
+import BitboardEngine
+import SmartMoveFinder
+
+BACKENDS = {"list board": ChessEngine.game_state, "bitboards": BitboardEngine.game_state}
+# Positions are reached by playing these moves from the starting position
+BENCHMARK_POSITIONS = {
+    "start": [],
+    "open game": ["e2e4", "e7e5", "g1f3", "b8c6", "f1c4", "f8c5", "c2c3", "g8f6", "d2d4", "e5d4"],
+    "middlegame": ["d2d4", "g8f6", "c2c4", "e7e6", "b1c3", "f8b4", "e2e3", "e8g8", "f1d3", "d7d5", "g1f3", "c7c5",
+                   "e1g1", "b8c6", "a2a3", "b4c3", "b2c3", "d8c7"],
+    "queens and rooks": ["e2e4", "d7d5", "e4d5", "d8d5", "b1c3", "d5a5", "d2d4", "c7c6", "g1f3", "c8f5", "f1c4",
+                         "e7e6", "c1d2", "b8d7", "d1e2", "f8b4", "c3d5", "a5d5", "c4d5", "b4d2", "e2d2", "c6d5"],
+}
+ITERATIONS = 200  # Number of get_valid_moves calls per position
+WALK_DEPTH = 2  # Depth of the make_move/get_valid_moves/undo_move walk per position
+ORDERING_DEPTH = 4  # Search depth of the move ordering and selective search comparisons
+
+'''
+Plays a list of moves in coordinate notation (e.g. "e2e4") from the starting position
+'''
+
+
+def set_up_position(gameState, moves):
+    gs = gameState()
+    for notation in moves:
+        for move in gs.get_valid_moves():
+            if move.get_chess_notation() == notation:
+                gs.make_move(move)
+                break
+        else:
+            raise ValueError("Illegal move in benchmark position: " + notation)
+    return gs
+
+
+'''
+Calls get_valid_moves repeatedly on the same position. Returns (calls per second, moves per second)
+'''
+
+
+def time_move_generation(gs, iterations=ITERATIONS):
+    moveCount = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        moveCount += len(gs.get_valid_moves())
+    elapsed = time.perf_counter() - start
+    return iterations / elapsed, moveCount / elapsed
+
+
+'''
+Makes and undoes every move down to depth, generating the moves at every node. Returns (nodes, nodes per second)
+'''
+
+
+def time_tree_walk(gs, depth=WALK_DEPTH):
+    start = time.perf_counter()
+    nodes = walk(gs, depth)
+    return nodes, nodes / (time.perf_counter() - start)
+
+
+def walk(gs, depth):
+    moves = gs.get_valid_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += walk(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+
+def main(iterations=ITERATIONS, depth=WALK_DEPTH):
+    print("%-18s %-12s %8s %12s %12s %10s %12s" % ("position", "backend", "moves", "calls/s", "moves/s", "nodes",
+                                                    "nodes/s"))
+    totals = {name: [0.0, 0.0] for name in BACKENDS}
+    for positionName, moves in BENCHMARK_POSITIONS.items():
+        for backendName, gameState in BACKENDS.items():
+            gs = set_up_position(gameState, moves)
+            moveCount = len(gs.get_valid_moves())
+            callRate, moveRate = time_move_generation(gs, iterations)
+            nodes, nodeRate = time_tree_walk(gs, depth)
+            totals[backendName][0] += moveRate
+            totals[backendName][1] += nodeRate
+            print("%-18s %-12s %8d %12.0f %12.0f %10d %12.0f" % (positionName, backendName, moveCount, callRate,
+                                                                 moveRate, nodes, nodeRate))
+    listBoard, bitboards = totals["list board"], totals["bitboards"]
+    print("\nBitboard speedup: %.2fx move generation, %.2fx tree walk" % (bitboards[0] / listBoard[0],
+                                                                           bitboards[1] / listBoard[1]))
+
+
+'''
+Searches every benchmark position with all the switches on (e.g. SmartMoveFinder.MOVE_ORDERING), with each switch off
+in turn and with all of them off. Prints the nodes searched and the time taken, and returns {configuration: total nodes}
+'''
+
+
+def compare_switches(switches, depth=ORDERING_DEPTH):
+    configurations = [("all on", [])]
+    configurations += [("no " + name, [name]) for name in switches]
+    configurations.append(("none", list(switches)))
+    defaults = dict(switches)
+    print("%-18s %-24s %10s %10s" % ("position", "configuration", "nodes", "seconds"))
+    totals = {}
+    try:
+        for configurationName, switchedOff in configurations:
+            switches.update({name: name not in switchedOff for name in defaults})
+            totalNodes = 0
+            totalTime = 0.0
+            for positionName, moves in BENCHMARK_POSITIONS.items():
+                gs = set_up_position(ChessEngine.game_state, moves)
+                SmartMoveFinder.transpositionTable.clear()
+                random.seed(0)  # The root moves are shuffled, so use the same order for every configuration
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    SmartMoveFinder.find_best_move_min_max(gs, gs.get_valid_moves(), maxDepth=depth)
+                elapsed = time.perf_counter() - start
+                totalNodes += SmartMoveFinder.counter
+                totalTime += elapsed
+                print("%-18s %-24s %10d %10.2f" % (positionName, configurationName, SmartMoveFinder.counter, elapsed))
+            totals[configurationName] = totalNodes
+            print("%-18s %-24s %10d %10.2f" % ("total", configurationName, totalNodes, totalTime))
+    finally:
+        switches.update(defaults)
+    baseline = totals["all on"]
+    print("\nNodes relative to all on:")
+    for configurationName, nodes in totals.items():
+        print("%-24s %8.2fx" % (configurationName, nodes / baseline))
+    return totals
+
+
+def compare_move_ordering(depth=ORDERING_DEPTH):
+    return compare_switches(SmartMoveFinder.MOVE_ORDERING, depth)
+
+
+def compare_search_features(depth=ORDERING_DEPTH):
+    return compare_switches(SmartMoveFinder.SEARCH_FEATURES, depth)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "ordering":
+        compare_move_ordering(int(sys.argv[2]) if len(sys.argv) > 2 else ORDERING_DEPTH)
+    elif len(sys.argv) > 1 and sys.argv[1] == "pruning":
+        compare_search_features(int(sys.argv[2]) if len(sys.argv) > 2 else ORDERING_DEPTH)
+    elif len(sys.argv) > 1:
+        main(depth=int(sys.argv[1]))
+    else:
+        main()
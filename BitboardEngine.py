@@ -0,0 +1,386 @@
+"""This module is an alternative backend for the state of the game. It keeps the same interface as ChessEngine.game_state
+(make_move, undo_move, get_valid_moves, board, moveLog, ...) so ChessMain and SmartMoveFinder can use it unchanged, but
+the move generation is done with bitboards instead of looking up the 8x8 list of strings square by square."""
+
+import ChessEngine
+from ChessEngine import Move, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, KNIGHT_JUMPS, KING_STEPS
+
+# A bitboard is a 64-bit integer where every bit is one square of the board. Square index = rank * 8 + file, using the
+# same rank and file numbering as game_state.board (rank 0 is black's back rank, file 0 is the a-file).
+FULL_BOARD = (1 << 64) - 1
+
+'''
+Lookup tables. These are built once when the module is imported
+'''
+
+
+def square_bitboard(r, f):
+    return 1 << (r * 8 + f)
+
+
+def build_step_attacks(steps):
+    attacks = []
+    for sq in range(64):
+        r, f = divmod(sq, 8)
+        bb = 0
+        for dr, df in steps:
+            if 0 <= r + dr <= 7 and 0 <= f + df <= 7:
+                bb |= square_bitboard(r + dr, f + df)
+        attacks.append(bb)
+    return attacks
+
+
+def build_rays():
+    rays = {}
+    for d in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+        rays[d] = []
+        for sq in range(64):
+            r, f = divmod(sq, 8)
+            bb = 0
+            rank, file = r + d[0], f + d[1]
+            while 0 <= rank <= 7 and 0 <= file <= 7:
+                bb |= square_bitboard(rank, file)
+                rank += d[0]
+                file += d[1]
+            rays[d].append(bb)
+    return rays
+
+
+def build_between():
+    # between[a][b] holds the squares strictly between a and b if they share a rank, file or diagonal, otherwise 0
+    between = [[0] * 64 for _ in range(64)]
+    for a in range(64):
+        for d in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            r, f = divmod(a, 8)
+            bb = 0
+            rank, file = r + d[0], f + d[1]
+            while 0 <= rank <= 7 and 0 <= file <= 7:
+                between[a][rank * 8 + file] = bb
+                bb |= square_bitboard(rank, file)
+                rank += d[0]
+                file += d[1]
+    return between
+
+
+KNIGHT_ATTACKS = build_step_attacks(KNIGHT_JUMPS)
+KING_ATTACKS = build_step_attacks(KING_STEPS)
+# Squares attacked by a pawn of the given color. White pawns move towards rank 0
+PAWN_ATTACKS = {'w': build_step_attacks([(-1, -1), (-1, 1)]), 'b': build_step_attacks([(1, -1), (1, 1)])}
+RAYS = build_rays()
+BETWEEN = build_between()
+ROOK_RAYS = [RAYS[(-1, 0)][sq] | RAYS[(1, 0)][sq] | RAYS[(0, -1)][sq] | RAYS[(0, 1)][sq] for sq in range(64)]
+BISHOP_RAYS = [RAYS[(-1, -1)][sq] | RAYS[(-1, 1)][sq] | RAYS[(1, -1)][sq] | RAYS[(1, 1)][sq] for sq in range(64)]
+# (rays, increasing) pairs. For rays going towards higher square indexes the closest blocker is the lowest set bit,
+# otherwise it is the highest set bit
+ROOK_SLIDES = [(RAYS[d], d[0] * 8 + d[1] > 0) for d in ROOK_DIRECTIONS]
+BISHOP_SLIDES = [(RAYS[d], d[0] * 8 + d[1] > 0) for d in BISHOP_DIRECTIONS]
+RANK_3 = 0xFF << 40  # White pawns that pushed one square from their starting rank
+RANK_6 = 0xFF << 16  # Black pawns that pushed one square from their starting rank
+BACK_RANKS = 0xFF | 0xFF << 56  # Pawns pushed onto these promote
+
+'''
+Bitboard helpers
+'''
+
+
+def slider_attacks(sq, occupied, slides):
+    attacks = 0
+    for rays, increasing in slides:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if blockers:
+            if increasing:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= rays[blocker]  # Remove the squares behind the first blocker
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq, occupied):
+    return slider_attacks(sq, occupied, ROOK_SLIDES)
+
+
+def bishop_attacks(sq, occupied):
+    return slider_attacks(sq, occupied, BISHOP_SLIDES)
+
+
+def squares(bb):  # Yields the index of every set bit
+    while bb:
+        lowest = bb & -bb
+        yield lowest.bit_length() - 1
+        bb ^= lowest
+
+
+def lowest_square(bb):
+    return (bb & -bb).bit_length() - 1
+
+
+class game_state(ChessEngine.game_state):
+    def __init__(self):
+        super().__init__()
+        # One bitboard per piece (color + type), plus occupancy for each color and for the whole board
+        self.bitboards = {}
+        self.occupancy = {}
+        self.occupied = 0
+        self.load_bitboards()
+
+    '''
+    Rebuilds every bitboard from self.board
+    '''
+
+    def load_bitboards(self):
+        self.bitboards = {piece: 0 for piece in ChessEngine.PIECE_NAMES}
+        self.occupancy = {'w': 0, 'b': 0}
+        for r in range(8):
+            for f in range(8):
+                piece = self.board[r][f]
+                if piece != "--":
+                    self.bitboards[piece] |= square_bitboard(r, f)
+                    self.occupancy[piece[0]] |= square_bitboard(r, f)
+        self.occupied = self.occupancy['w'] | self.occupancy['b']
+
+    def set_position(self, board, whiteToMove, castlingRights, enPassant=(), halfmoveClock=0, fullmoveNumber=1):
+        super().set_position(board, whiteToMove, castlingRights, enPassant, halfmoveClock, fullmoveNumber)
+        self.load_bitboards()
+
+    '''
+    The board is updated by ChessEngine.game_state. Afterwards the bitboards are updated for the squares the move
+    touched
+    '''
+
+    def make_move(self, move):
+        touched = self.squares_touched(move)
+        before = [self.board[r][f] for r, f in touched]
+        super().make_move(move)
+        self.update_bitboards(touched, before)
+
+    def undo_move(self):
+        if self.moveLog and self.moveLog[-1] is None:  # Null moves do not change the board
+            super().undo_move()
+        elif len(self.moveLog) != 0:
+            touched = self.squares_touched(self.moveLog[-1])
+            before = [self.board[r][f] for r, f in touched]
+            super().undo_move()
+            self.update_bitboards(touched, before)
+
+    '''
+    Squares whose content may change when the move is made or undone
+    '''
+
+    @staticmethod
+    def squares_touched(move):
+        touched = [(move.startRank, move.startFile), (move.endRank, move.endFile)]
+        if move.pieceMoved[1] == 'K' and abs(move.endFile - move.startFile) == 2:  # Castling also moves a rook
+            if move.endFile == 6:
+                touched += [(move.startRank, 7), (move.startRank, 5)]
+            else:
+                touched += [(move.startRank, 0), (move.startRank, 3)]
+        elif move.pieceMoved[1] == 'P' and move.endFile != move.startFile:  # Pawn captured en passant
+            touched.append((move.startRank, move.endFile))
+        return touched
+
+    def update_bitboards(self, touched, before):
+        for i in range(len(touched)):
+            r, f = touched[i]
+            oldPiece = before[i]
+            newPiece = self.board[r][f]
+            if oldPiece != newPiece:
+                bit = square_bitboard(r, f)
+                if oldPiece != "--":
+                    self.bitboards[oldPiece] ^= bit
+                    self.occupancy[oldPiece[0]] ^= bit
+                if newPiece != "--":
+                    self.bitboards[newPiece] ^= bit
+                    self.occupancy[newPiece[0]] ^= bit
+        self.occupied = self.occupancy['w'] | self.occupancy['b']
+
+    '''
+    Bitboard of the pieces of color attacking square sq, given the occupancy of the board
+    '''
+
+    def attackers_to(self, sq, occupied, color):
+        bb = self.bitboards
+        enemyColor = 'b' if color == 'w' else 'w'
+        attackers = KNIGHT_ATTACKS[sq] & bb[color + 'N']
+        attackers |= KING_ATTACKS[sq] & bb[color + 'K']
+        attackers |= PAWN_ATTACKS[enemyColor][sq] & bb[color + 'P']
+        attackers |= bishop_attacks(sq, occupied) & (bb[color + 'B'] | bb[color + 'Q'])
+        attackers |= rook_attacks(sq, occupied) & (bb[color + 'R'] | bb[color + 'Q'])
+        return attackers
+
+    def in_check(self):
+        allyColor, enemyColor = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        kingSq = lowest_square(self.bitboards[allyColor + 'K'])
+        return self.attackers_to(kingSq, self.occupied, enemyColor) != 0
+
+    def has_non_pawn_material(self):
+        allyColor = 'w' if self.whiteToMove else 'b'
+        bb = self.bitboards
+        return (bb[allyColor + 'N'] | bb[allyColor + 'B'] | bb[allyColor + 'R'] | bb[allyColor + 'Q']) != 0
+
+    '''
+    All moves considering checks. Pins and checks are turned into masks of the squares a piece may move to, so every
+    move generated here is legal. With capturesOnly the masks are cut down to the enemy pieces, so only captures and
+    promotions are generated and checkMate and staleMate are left unset
+    '''
+
+    def get_valid_moves(self, capturesOnly=False):
+        if self.whiteToMove:
+            allyColor = 'w'
+            enemyColor = 'b'
+        else:
+            allyColor = 'b'
+            enemyColor = 'w'
+        bb = self.bitboards
+        allies = self.occupancy[allyColor]
+        enemies = self.occupancy[enemyColor]
+        occupied = self.occupied
+        kingSq = lowest_square(bb[allyColor + 'K'])
+        kingRank, kingFile = divmod(kingSq, 8)
+        moves = []
+        self.castleMoves = []
+        self.enPassantMoves = []
+        self.checkMate = False
+        self.staleMate = False
+
+        # King moves. The king is taken off the board so it does not block slider attacks along the line it moves on
+        occupiedNoKing = occupied ^ bb[allyColor + 'K']
+        for sq in squares(KING_ATTACKS[kingSq] & (enemies if capturesOnly else ~allies)):
+            if not self.attackers_to(sq, occupiedNoKing, enemyColor):
+                moves.append(Move((kingRank, kingFile), divmod(sq, 8), self.board))
+
+        checkers = self.attackers_to(kingSq, occupied, enemyColor)
+        self.inCheck = checkers != 0
+        if checkers & (checkers - 1):  # Double check, king has to move
+            self.checkMate = not moves and not capturesOnly
+            return moves
+        if checkers:  # Pieces must capture the checking piece or block the check
+            checkMask = checkers | BETWEEN[kingSq][lowest_square(checkers)]
+        else:
+            checkMask = FULL_BOARD
+
+        # Pinned pieces may only move along the line between the king and the pinning piece
+        pinMasks = {}
+        snipers = (ROOK_RAYS[kingSq] & (bb[enemyColor + 'R'] | bb[enemyColor + 'Q'])) | \
+                  (BISHOP_RAYS[kingSq] & (bb[enemyColor + 'B'] | bb[enemyColor + 'Q']))
+        for sniper in squares(snipers):
+            inBetween = BETWEEN[kingSq][sniper] & occupied
+            if inBetween and not inBetween & (inBetween - 1) and inBetween & allies:
+                pinMasks[lowest_square(inBetween)] = BETWEEN[kingSq][sniper] | (1 << sniper)
+
+        targets = (enemies if capturesOnly else ~allies) & checkMask
+        for sq in squares(bb[allyColor + 'N']):
+            if sq not in pinMasks:  # A pinned knight can never move
+                self.add_moves(sq, KNIGHT_ATTACKS[sq] & targets, moves)
+        for sq in squares(bb[allyColor + 'B'] | bb[allyColor + 'Q']):
+            self.add_moves(sq, bishop_attacks(sq, occupied) & targets & pinMasks.get(sq, FULL_BOARD), moves)
+        for sq in squares(bb[allyColor + 'R'] | bb[allyColor + 'Q']):
+            self.add_moves(sq, rook_attacks(sq, occupied) & targets & pinMasks.get(sq, FULL_BOARD), moves)
+        self.get_pawn_bitboard_moves(allyColor, enemyColor, enemies, checkers, checkMask, pinMasks, kingSq, moves,
+                                     capturesOnly)
+        if capturesOnly:
+            return moves
+        if not checkers:
+            self.get_castle_bitboard_moves(allyColor, enemyColor, kingRank, kingFile, moves)
+
+        if not moves:
+            if checkers:
+                self.checkMate = True
+            else:
+                self.staleMate = True
+        return moves
+
+    '''
+    Legal captures and promotions only, for the capture stage of get_staged_moves and the quiescence search
+    '''
+
+    def get_capture_moves(self):
+        return self.get_valid_moves(capturesOnly=True)
+
+    def add_moves(self, startSq, targets, moves):
+        start = divmod(startSq, 8)
+        for sq in squares(targets):
+            moves.append(Move(start, divmod(sq, 8), self.board))
+
+    def get_pawn_bitboard_moves(self, allyColor, enemyColor, enemies, checkers, checkMask, pinMasks, kingSq, moves,
+                                capturesOnly=False):
+        pawns = self.bitboards[allyColor + 'P']
+        empty = ~self.occupied & FULL_BOARD
+        # Pushes are done for all pawns at once by shifting the pawn bitboard one rank forward
+        if allyColor == 'w':
+            singlePush = (pawns >> 8) & empty
+            doublePush = ((singlePush & RANK_3) >> 8) & empty
+            forward = -8
+        else:
+            singlePush = (pawns << 8) & empty & FULL_BOARD
+            doublePush = ((singlePush & RANK_6) << 8) & empty
+            forward = 8
+        if capturesOnly:  # Promotions are the only pushes kept
+            singlePush &= BACK_RANKS
+            doublePush = 0
+        for sq in squares(singlePush & checkMask):
+            start = sq - forward
+            if (1 << sq) & pinMasks.get(start, FULL_BOARD):
+                self.add_pawn_moves(divmod(start, 8), divmod(sq, 8), moves)
+        for sq in squares(doublePush & checkMask):
+            start = sq - 2 * forward
+            if (1 << sq) & pinMasks.get(start, FULL_BOARD):
+                moves.append(Move(divmod(start, 8), divmod(sq, 8), self.board))
+        for sq in squares(pawns):
+            captures = PAWN_ATTACKS[allyColor][sq] & enemies & checkMask & pinMasks.get(sq, FULL_BOARD)
+            for target in squares(captures):
+                self.add_pawn_moves(divmod(sq, 8), divmod(target, 8), moves)
+
+        enPassant = self.en_passant_square()
+        if enPassant:
+            epSq = enPassant[0] * 8 + enPassant[1]
+            capturedSq = epSq - forward
+            # The capture must remove the checking pawn or block the check
+            if checkers and not (checkers & (1 << capturedSq) or checkMask & (1 << epSq)):
+                return
+            bb = self.bitboards
+            for sq in squares(PAWN_ATTACKS[enemyColor][epSq] & pawns):
+                # Both pawns leave their squares, so check for a discovered slider attack on the king. This also
+                # covers pinned pawns
+                occupied = (self.occupied ^ (1 << sq) ^ (1 << capturedSq)) | (1 << epSq)
+                exposed = (bishop_attacks(kingSq, occupied) & (bb[enemyColor + 'B'] | bb[enemyColor + 'Q'])) | \
+                          (rook_attacks(kingSq, occupied) & (bb[enemyColor + 'R'] | bb[enemyColor + 'Q']))
+                if not exposed:
+                    move = Move(divmod(sq, 8), enPassant, self.board)
+                    move.enPassant = divmod(capturedSq, 8)
+                    move.pieceCaptured = enemyColor + 'P'
+                    self.enPassantMoves.append(move)
+                    moves.append(move)
+
+    def get_castle_bitboard_moves(self, allyColor, enemyColor, kingRank, kingFile, moves):
+        castleShort, castleLong = self.castlingRights[allyColor]
+        if kingFile != 4 or kingRank != (7 if allyColor == 'w' else 0):
+            return
+        rook = self.bitboards[allyColor + 'R']
+        if castleShort and rook & square_bitboard(kingRank, 7) and \
+                self.path_clear(kingRank, [5, 6], [5, 6], enemyColor):
+            move = Move((kingRank, kingFile), (kingRank, 6), self.board)
+            move.castle = ((kingRank, 7), (kingRank, 5))
+            self.castleMoves.append(move)
+            moves.append(move)
+        if castleLong and rook & square_bitboard(kingRank, 0) and \
+                self.path_clear(kingRank, [1, 2, 3], [2, 3], enemyColor):
+            move = Move((kingRank, kingFile), (kingRank, 2), self.board)
+            move.castle = ((kingRank, 0), (kingRank, 3))
+            self.castleMoves.append(move)
+            moves.append(move)
+
+    '''
+    Checks that the squares between king and rook are empty and the squares the king crosses are not attacked
+    '''
+
+    def path_clear(self, rank, emptyFiles, safeFiles, enemyColor):
+        for f in emptyFiles:
+            if self.occupied & square_bitboard(rank, f):
+                return False
+        for f in safeFiles:
+            if self.attackers_to(rank * 8 + f, self.occupied, enemyColor):
+                return False
+        return True
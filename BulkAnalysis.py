@@ -0,0 +1,161 @@
+"""This module analyses many positions at once. Positions are read from a file, searched on a pool of worker processes
+with the same budget each, and written as JSON Lines as soon as each one is done. The output file is also the
+checkpoint: when a run is started again with the same output file, the positions already in it are skipped, so an
+interrupted run carries on where it stopped. Run it as a script:
+
+    python BulkAnalysis.py positions.txt results.jsonl [--depth 6 | --movetime 1.0 | --nodes 20000] [--workers 4]
+
+Every line of the positions file is a FEN, "startpos", or either followed by "moves e2e4 e7e5 ...". Empty lines and
+lines starting with # are skipped. Every output line holds the line number of the position, the FEN and moves, and the
+best move, score (centipawns for the side to move), depth, nodes, time and principal variation, or an error."""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+import AnalysisServer
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_MOVE_TIME = 1.0  # Seconds per position when no budget is given
+BATCH_SIZE = 256  # Positions handed to the pool at a time, so a large file is never read into memory as a whole
+
+'''
+Reads a positions file one line at a time. Yields (line number, FEN or None for the start position, list of moves)
+'''
+
+
+def read_positions(path):
+    with open(path) as positionsFile:
+        for lineNumber, line in enumerate(positionsFile, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            position, _, moves = line.partition("moves")
+            position = position.strip()
+            yield lineNumber, None if position in ("", "startpos") else position, moves.split()
+
+
+'''
+Runs in a worker process. Searches one position and returns its output record. Any error is written to the record
+instead of raised, so one bad position does not end the run
+'''
+
+
+def analyse_task(task):
+    lineNumber, fen, moves, maxDepth, timeLimit, nodeLimit = task
+    record = {"line": lineNumber, "fen": fen, "moves": moves}
+    try:
+        record.update(AnalysisServer.analyse_position((None, fen, moves, maxDepth, timeLimit, nodeLimit)))
+    except ValueError as error:  # Bad FEN or illegal move
+        record["error"] = str(error)
+    except Exception as error:
+        record["error"] = repr(error)
+    return record
+
+
+'''
+Searches positions ((key, FEN or None, moves) tuples from any iterable) on a pool of worker processes with the same
+budget each. Yields the output record of every position as soon as it is done, so not in the order of positions. The
+"line" field of a record is the key of its position
+'''
+
+
+def analyse_positions(positions, workers=DEFAULT_WORKERS, maxDepth=None, timeLimit=None, nodeLimit=None):
+    if maxDepth is not None and maxDepth <= 0:
+        raise ValueError("The depth must be at least 1")
+    if maxDepth is None and timeLimit is None and nodeLimit is None:
+        timeLimit = DEFAULT_MOVE_TIME
+    positions = iter(positions)
+    with multiprocessing.Pool(workers) as pool:
+        while True:
+            batch = [(key, fen, moves, maxDepth, timeLimit, nodeLimit)
+                     for key, fen, moves in itertools.islice(positions, BATCH_SIZE)]
+            if not batch:
+                return
+            for record in pool.imap_unordered(analyse_task, batch):
+                yield record
+
+
+'''
+Line numbers of the positions already in an output file. A last line cut off by a crash is removed from the file, so
+the position is searched again
+'''
+
+
+def completed_lines(outputPath):
+    done = set()
+    if not os.path.exists(outputPath):
+        return done
+    goodLength = 0
+    with open(outputPath, "rb") as outputFile:
+        for line in outputFile:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            done.add(record["line"])
+            goodLength += len(line)
+    if goodLength < os.path.getsize(outputPath):
+        with open(outputPath, "rb+") as outputFile:
+            outputFile.truncate(goodLength)
+    return done
+
+
+'''
+Analyses every position of positionsPath that is not yet in outputPath and appends the results to it. Every record is
+flushed to the file when it is written. Returns the number of positions analysed and skipped
+'''
+
+
+def analyse_file(positionsPath, outputPath, workers=DEFAULT_WORKERS, maxDepth=None, timeLimit=None, nodeLimit=None,
+                 progress=None):
+    done = completed_lines(outputPath)
+    positions = (position for position in read_positions(positionsPath) if position[0] not in done)
+    analysed = 0
+    with open(outputPath, "a") as outputFile:
+        for record in analyse_positions(positions, workers, maxDepth, timeLimit, nodeLimit):
+            outputFile.write(json.dumps(record) + "\n")
+            outputFile.flush()
+            analysed += 1
+            if progress is not None:
+                progress(analysed, record)
+    return analysed, len(done)
+
+
+def positive_int(text):
+    value = int(text)
+    if value <= 0:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse a file of positions")
+    parser.add_argument("positions", help="file with a FEN or startpos, optionally followed by moves, per line")
+    parser.add_argument("output", help="JSON Lines file the results are appended to. Positions in it are skipped")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--depth", type=positive_int, help="depth per position")
+    parser.add_argument("--movetime", type=float, help="seconds per position (%g if no budget is given)" %
+                        DEFAULT_MOVE_TIME)
+    parser.add_argument("--nodes", type=int, help="nodes per position")
+    args = parser.parse_args()
+    start = time.perf_counter()
+
+    def report(analysed, record):
+        elapsed = time.perf_counter() - start
+        print("%d positions, %.1f positions/s, line %d: %s" % (analysed, analysed / elapsed, record["line"],
+                                                                record.get("bestmove", record.get("error"))))
+
+    analysed, skipped = analyse_file(args.positions, args.output, args.workers, args.depth, args.movetime, args.nodes,
+                                     report)
+    print("%d positions analysed, %d already done, in %.1f s" % (analysed, skipped, time.perf_counter() - start))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,104 @@
 """This module is responsible for storing all the information about the current state of the game. It will also be
 responsible for determining legal moves at the current state. In addition, it will log all moves."""
 
+import random
+import Evaluation
+
+PIECE_NAMES = ["wK", "wQ", "wR", "wB", "wN", "wP", "bK", "bQ", "bR", "bB", "bN", "bP"]
+PIECE_NEED_UPDATE = ['wK', 'wQ', 'wB', 'wR', 'bK', 'bQ', 'bB', 'bR']  # Pieces tracked in game_state.pieceLocation
+VERIFY_ZOBRIST = False  # Debug mode. When True, every make_move/undo_move checks the key against a full recompute
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+# FEN letters of the pieces (upper case for white) and the board squares of a run of empty squares
+FEN_PIECES = {symbol: ('w' if symbol.isupper() else 'b') + symbol.upper() for symbol in "KQRBNPkqrbnp"}
+FEN_SYMBOLS = {piece: symbol for symbol, piece in FEN_PIECES.items()}
+FEN_EMPTY_SQUARES = {str(n): ["--"] * n for n in range(1, 9)}
+
+# Zobrist keys. Every piece on every square, black to move, each castling right and each en passant file gets a random
+# 64-bit number. The key of a position is the XOR of the numbers of everything in it. The fixed seed keeps keys the same
+# between runs, so keys can be stored on disk.
+zobristRandom = random.Random(20220101)
+ZOBRIST_PIECES = {piece: [[zobristRandom.getrandbits(64) for _ in range(8)] for _ in range(8)]
+                  for piece in PIECE_NAMES}
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
+ZOBRIST_CASTLING_RIGHT = {'w': (zobristRandom.getrandbits(64), zobristRandom.getrandbits(64)),
+                          'b': (zobristRandom.getrandbits(64), zobristRandom.getrandbits(64))}  # (short, long)
+ZOBRIST_EN_PASSANT = [zobristRandom.getrandbits(64) for _ in range(8)]  # Indexed by file
+
+
+def build_zobrist_castling():
+    # XOR of the castling right keys for every combination of castlingRights, indexed by (white rights, black rights)
+    allRights = [(True, True), (True, False), (False, True), (False, False)]
+    castlingKeys = {}
+    for whiteRights in allRights:
+        for blackRights in allRights:
+            key = 0
+            for i in range(2):
+                if whiteRights[i]:
+                    key ^= ZOBRIST_CASTLING_RIGHT['w'][i]
+                if blackRights[i]:
+                    key ^= ZOBRIST_CASTLING_RIGHT['b'][i]
+            castlingKeys[(whiteRights, blackRights)] = key
+    return castlingKeys
+
+
+ZOBRIST_CASTLING = build_zobrist_castling()
+
+ROOK_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+BISHOP_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+KNIGHT_JUMPS = [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
+KING_STEPS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+'''
+Attack lookup tables. These are built once when the module is imported, so square_under_attack and in_pin never have to
+work out which squares are on the board or which squares lie between two pieces. All of them are indexed by [rank][file]
+'''
+
+
+def build_step_squares(steps):
+    return [[[(r + dr, f + df) for dr, df in steps if 0 <= r + dr <= 7 and 0 <= f + df <= 7] for f in range(8)]
+            for r in range(8)]
+
+
+def build_ray_squares():
+    # rays[r][f][d] lists the squares from (r, f) to the edge of the board in direction d, closest square first
+    rays = [[{} for _ in range(8)] for _ in range(8)]
+    for r in range(8):
+        for f in range(8):
+            for d in KING_STEPS:
+                squares = []
+                rank, file = r + d[0], f + d[1]
+                while 0 <= rank <= 7 and 0 <= file <= 7:
+                    squares.append((rank, file))
+                    rank += d[0]
+                    file += d[1]
+                rays[r][f][d] = squares
+    return rays
+
+
+def build_lines():
+    # lines[r][f][rank][file] is (direction, squares in between, diagonal) when (rank, file) shares a rank, file or
+    # diagonal with (r, f), otherwise None. Direction points from (r, f) towards (rank, file)
+    lines = [[[[None] * 8 for _ in range(8)] for _ in range(8)] for _ in range(8)]
+    for r in range(8):
+        for f in range(8):
+            for d in KING_STEPS:
+                ray = RAY_SQUARES[r][f][d]
+                for i in range(len(ray)):
+                    lines[r][f][ray[i][0]][ray[i][1]] = (d, ray[:i], d[0] != 0 and d[1] != 0)
+    return lines
+
+
+KNIGHT_SQUARES = build_step_squares(KNIGHT_JUMPS)
+KING_SQUARES = build_step_squares(KING_STEPS)
+# Squares attacked by a pawn of the given color. White pawns move towards rank 0. These are also the squares from which
+# enemy pawns attack (r, f)
+PAWN_ATTACK_SQUARES = {'w': build_step_squares([(-1, -1), (-1, 1)]), 'b': build_step_squares([(1, -1), (1, 1)])}
+RAY_SQUARES = build_ray_squares()
+LINES = build_lines()
+# Castling paths as ((squares that must be empty, squares the king crosses), ...) for (short, long)
+CASTLING_PATHS = {'w': (([(7, 5), (7, 6)], [(7, 5), (7, 6)]), ([(7, 1), (7, 2), (7, 3)], [(7, 2), (7, 3)])),
+                  'b': (([(0, 5), (0, 6)], [(0, 5), (0, 6)]), ([(0, 1), (0, 2), (0, 3)], [(0, 2), (0, 3)]))}
+
 
 class game_state:
     def __init__(self):
@@ -20,6 +118,11 @@ class game_state:
                               'B': self.get_bishop_moves, 'N': self.get_knight_moves, 'P': self.get_pawn_moves}
         self.whiteToMove = True
         self.moveLog = []
+        # En passant square and FEN move counters of the position before the first move in moveLog. After that the en
+        # passant square follows from the last move, and the counters from the moves in moveLog
+        self.startEnPassant = ()
+        self.startHalfmoveClock = 0
+        self.startFullmoveNumber = 1
         # The following keeps track of the locations for every piece except the knight and pawns. This will be useful
         # when checking for pins
         self.pieceLocation = {'wK': (7, 4), 'wQ': [(7, 3)], 'wB': [(7, 2), (7, 5)],
@@ -28,19 +131,167 @@ class game_state:
         self.pins = []  # Will store square that is pinned and direction of pin
         self.checkMate = False
         self.staleMate = False
-
-        self.promotePawn = ''  # If pawn is promoted, this will hold information regarding promotion piece
+        self.inCheck = False  # Set by get_valid_moves
 
         self.enPassantMoves = []  # Logs move instances where en passant can occur
 
         # The following attributes keeps track of player's castling rights. Will track if player may castle king side
         # (short) or queen side (long)
         self.castlingRights = {'w': (True, True), 'b': (True, True)}  # (short, long)
+        self.castlingRightsLog = []  # Castling rights of both players before every move in moveLog, (white, black)
         self.canCastle = (False, False)  # Checks if player can castle. (short, long)
         self.castleMoves = []  # Logs move instances where castling can occur
 
+        # 64-bit Zobrist key of the position. It is updated incrementally by make_move and undo_move
+        self.zobristKey = self.compute_zobrist_key()
+        self.verifyZobrist = VERIFY_ZOBRIST
+
+        # Middlegame score, endgame score and phase of the position (see Evaluation). They are updated by make_move and
+        # undo_move, and scoreLog holds their values before every move in moveLog
+        self.mgScore, self.egScore, self.phase = Evaluation.evaluate_board(self.board)
+        self.scoreLog = []
+
     '''
-    Takes a move as a parameter and executes it 
+    Sets up a position from a board (8x8 list of strings like self.board), the side to move, castling rights and
+    optionally the en passant square (rank, file) and FEN move counters. Piece locations, the Zobrist key and the
+    evaluation are rebuilt from the board and the move log starts empty
+    '''
+
+    def set_position(self, board, whiteToMove, castlingRights, enPassant=(), halfmoveClock=0, fullmoveNumber=1):
+        self.board = board
+        self.whiteToMove = whiteToMove
+        self.castlingRights = castlingRights
+        self.moveLog = []
+        self.startEnPassant = enPassant
+        self.startHalfmoveClock = halfmoveClock
+        self.startFullmoveNumber = fullmoveNumber
+        self.castlingRightsLog = []
+        self.pieceLocation = {piece: [] for piece in PIECE_NEED_UPDATE}
+        for r in range(8):
+            for f in range(8):
+                piece = board[r][f]
+                if piece[1] == 'K':
+                    self.pieceLocation[piece] = (r, f)
+                elif piece in PIECE_NEED_UPDATE:
+                    self.pieceLocation[piece].append((r, f))
+        self.pins = []
+        self.checkMate = False
+        self.staleMate = False
+        self.inCheck = False
+        self.enPassantMoves = []
+        self.castleMoves = []
+        self.canCastle = (False, False)
+        self.zobristKey = self.compute_zobrist_key()
+        self.mgScore, self.egScore, self.phase = Evaluation.evaluate_board(self.board)
+        self.scoreLog = []
+
+    '''
+    Sets up the position of a FEN string. The castling rights of a king or rook that is not on its starting square and
+    an en passant square without a pawn that just moved past it are dropped. Raises ValueError for a malformed FEN and
+    for a position that cannot be played: not exactly one king per side, a pawn on the first or last rank, or the side
+    not to move in check
+    '''
+
+    def set_fen(self, fen):
+        fields = fen.split()
+        rows = fields[0].split('/') if fields else []
+        if len(fields) < 2 or len(rows) != 8 or fields[1] not in ('w', 'b'):
+            raise ValueError("Not a FEN position: " + fen)
+        board = []
+        for row in rows:
+            rank = []
+            for symbol in row:
+                if symbol in FEN_PIECES:
+                    rank.append(FEN_PIECES[symbol])
+                elif symbol in FEN_EMPTY_SQUARES:
+                    rank.extend(FEN_EMPTY_SQUARES[symbol])
+                else:
+                    raise ValueError("Unknown piece " + symbol + " in FEN: " + fen)
+            if len(rank) != 8:
+                raise ValueError("Rank " + row + " does not have 8 squares in FEN: " + fen)
+            board.append(rank)
+        whiteToMove = fields[1] == 'w'
+        for king in ('wK', 'bK'):
+            if sum(rank.count(king) for rank in board) != 1:
+                raise ValueError("There must be exactly one " + ("white" if king[0] == 'w' else "black") +
+                                 " king in FEN: " + fen)
+        if any(piece[1] == 'P' for piece in board[0] + board[7]):
+            raise ValueError("Pawn on the first or last rank in FEN: " + fen)
+        # The king of the side not to move could be captured. A list game_state is enough to look for the attack
+        checkState = game_state()
+        checkState.set_position([rank[:] for rank in board], not whiteToMove, {'w': (False, False), 'b': (False, False)})
+        if checkState.in_check():
+            raise ValueError("The side not to move is in check in FEN: " + fen)
+
+        castling = fields[2] if len(fields) > 2 else '-'
+        castlingRights = {}
+        for color, backRank, symbols in (('w', 7, "KQ"), ('b', 0, "kq")):
+            kingHome = board[backRank][4] == color + 'K'
+            castlingRights[color] = (kingHome and symbols[0] in castling and board[backRank][7] == color + 'R',
+                                     kingHome and symbols[1] in castling and board[backRank][0] == color + 'R')
+
+        enPassant = ()
+        if len(fields) > 3 and fields[3] != '-':
+            if len(fields[3]) != 2 or fields[3][0] not in Move.filesToCols or fields[3][1] not in Move.ranksToRows:
+                raise ValueError("Bad en passant square in FEN: " + fen)
+            r, f = Move.ranksToRows[fields[3][1]], Move.filesToCols[fields[3][0]]
+            pawnRank, pawn = (r + 1, 'bP') if whiteToMove else (r - 1, 'wP')  # The pawn that moved two squares
+            if r == (2 if whiteToMove else 5) and board[pawnRank][f] == pawn and board[r][f] == "--":
+                enPassant = (r, f)
+        try:
+            halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+            fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("Bad move counters in FEN: " + fen)
+        self.set_position(board, whiteToMove, castlingRights, enPassant, halfmoveClock, fullmoveNumber)
+
+    '''
+    Creates a game state (of this class, so BitboardEngine.game_state.from_fen makes a bitboard one) from a FEN string
+    '''
+
+    @classmethod
+    def from_fen(cls, fen):
+        gs = cls()
+        gs.set_fen(fen)
+        return gs
+
+    '''
+    FEN string of the current position. The halfmove clock and move number count on from the loaded position
+    '''
+
+    def get_fen(self):
+        rows = []
+        for rank in self.board:
+            row = ""
+            empty = 0
+            for piece in rank:
+                if piece == "--":
+                    empty += 1
+                else:
+                    if empty:
+                        row += str(empty)
+                        empty = 0
+                    row += FEN_SYMBOLS[piece]
+            rows.append(row + str(empty) if empty else row)
+        castling = "".join(symbol for symbol, right in zip("KQkq", self.castlingRights['w'] + self.castlingRights['b'])
+                           if right) or '-'
+        enPassant = self.en_passant_square()
+        enPassantField = Move.colsToFiles[enPassant[1]] + Move.rowsToRanks[enPassant[0]] if enPassant else '-'
+        plies = len(self.moveLog)
+        halfmoveClock = self.startHalfmoveClock + plies
+        for i in range(plies - 1, -1, -1):  # Plies since the last capture or pawn move
+            move = self.moveLog[i]
+            if move is not None and (move.pieceMoved[1] == 'P' or move.pieceCaptured != "--"):
+                halfmoveClock = plies - 1 - i
+                break
+        startedWhite = self.whiteToMove == (plies % 2 == 0)
+        fullmoveNumber = self.startFullmoveNumber + (plies if startedWhite else plies + 1) // 2
+        return "%s %s %s %s %d %d" % ("/".join(rows), 'w' if self.whiteToMove else 'b', castling, enPassantField,
+                                      halfmoveClock, fullmoveNumber)
+
+    '''
+    Takes a move as a parameter and executes it. Castling and en passant are read from the move itself, so the move must
+    be one of the moves returned by get_valid_moves
     '''
 
     def make_move(self, move):
@@ -50,143 +301,281 @@ class game_state:
         else:
             playerColor = 'b'
             enemyColor = 'w'
+        castlingRightsBefore = (self.castlingRights['w'], self.castlingRights['b'])
+        self.castlingRightsLog.append(castlingRightsBefore)
+        self.scoreLog.append((self.mgScore, self.egScore, self.phase))
+        self.update_evaluation(move)
+        key = self.zobristKey ^ ZOBRIST_BLACK_TO_MOVE
+        enPassant = self.en_passant_square()
+        if enPassant:  # The en passant square of the previous move expires
+            key ^= ZOBRIST_EN_PASSANT[enPassant[1]]
+
         self.whiteToMove = not self.whiteToMove  # Switch turns
         self.board[move.startRank][move.startFile] = "--"
         self.board[move.endRank][move.endFile] = move.pieceMoved
-        pieceNeedUpdate = ['wK', 'wQ', 'wB', 'wR', 'bK', 'bQ', 'bB', 'bR']  # Piece's that need to update location
+        key ^= ZOBRIST_PIECES[move.pieceMoved][move.startRank][move.startFile]
+        key ^= ZOBRIST_PIECES[move.pieceMoved][move.endRank][move.endFile]
 
-        # Check if move causes enemy to lose castling rights (short or long). If enemy rook is captured, then opponent
-        # loses rights to castle on the same side
-        enemyCastlingRights = self.castlingRights[enemyColor][0] or self.castlingRights[enemyColor][1]
-        if enemyCastlingRights:
-            if move.pieceCaptured == enemyColor + 'R':
+        if move.enPassant:  # This executes en passant. The captured pawn is beside the end square
+            r, f = move.enPassant
+            self.board[r][f] = "--"
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][r][f]
+        elif move.pieceCaptured != "--":
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][move.endRank][move.endFile]
+            if move.pieceCaptured in PIECE_NEED_UPDATE:  # Update the piece location of the captured piece
+                self.pieceLocation[move.pieceCaptured].remove((move.endRank, move.endFile))
+            # If enemy rook is captured on its starting square, then opponent loses rights to castle on the same side
+            enemyBackRank = 0 if enemyColor == 'b' else 7
+            if move.pieceCaptured == enemyColor + 'R' and move.endRank == enemyBackRank:
                 if move.endFile == 7:
-                    self.castlingRights[enemyColor] = (False, self.castlingRights[playerColor][1])
-                else:
-                    self.castlingRights[enemyColor] = (self.castlingRights[playerColor][0], False)
-
-        if move in self.castleMoves:  # This executes castling
-            for m in self.castleMoves:
-                if move == m:
-                    rookStartRank, rookStartFile = m.castle[0]
-                    rookEndRank, rookEndFile = m.castle[1]
-                    self.board[rookStartRank][rookStartFile] = "--"
-                    self.board[rookEndRank][rookEndFile] = playerColor + "R"
-                    for i in range(len(self.pieceLocation[playerColor + "R"])):  # Update rook location
-                        if (rookStartRank, rookStartFile) == self.pieceLocation[playerColor + "R"][i]:
-                            self.pieceLocation[playerColor + "R"][i] = (rookEndRank, rookEndFile)
-                            break
-                    self.pieceLocation[move.pieceMoved] = (move.endRank, move.endFile)  # Update king location
-                    m.castlingRights = self.castlingRights[playerColor]  # Preserves castling rights
-                    self.moveLog.append(m)
-                    break
-            self.castlingRights[playerColor] = (False, False)  # Once castled no more castling rights
-        elif move in self.enPassantMoves:  # This executes en passant
-            for m in self.enPassantMoves:
-                if move == m:
-                    r, f = m.enPassant
-                    self.board[r][f] = "--"
-                    self.moveLog.append(m)
-                    break
+                    self.castlingRights[enemyColor] = (False, self.castlingRights[enemyColor][1])
+                elif move.endFile == 0:
+                    self.castlingRights[enemyColor] = (self.castlingRights[enemyColor][0], False)
+
+        if move.castle:  # This executes castling
+            rookStartRank, rookStartFile = move.castle[0]
+            rookEndRank, rookEndFile = move.castle[1]
+            self.board[rookStartRank][rookStartFile] = "--"
+            self.board[rookEndRank][rookEndFile] = playerColor + "R"
+            key ^= ZOBRIST_PIECES[playerColor + "R"][rookStartRank][rookStartFile]
+            key ^= ZOBRIST_PIECES[playerColor + "R"][rookEndRank][rookEndFile]
+            rookLocations = self.pieceLocation[playerColor + "R"]
+            rookLocations[rookLocations.index((rookStartRank, rookStartFile))] = (rookEndRank, rookEndFile)
+
         # If the move is promoting a pawn, this conditional will promote the pawn
-        elif self.promotePawn != '':
-            self.board[move.endRank][move.endFile] = self.promotePawn
-            if self.promotePawn in pieceNeedUpdate:
-                self.pieceLocation[self.promotePawn].append((move.endRank, move.endFile))
-            self.promotePawn = ''
-            self.moveLog.append(move)
-        else:
-            # This will update castling rights if either a rook or king is moved for the first time
-            castlingRights = self.castlingRights[playerColor][0] or self.castlingRights[playerColor][1]
-            if castlingRights:
-                if move.pieceMoved == playerColor + 'K':
-                    move.castlingRights = self.castlingRights[playerColor]
-                    self.castlingRights[playerColor] = (False, False)
-                elif move.pieceMoved == playerColor + 'R':
-                    if move.startFile == 7:
-                        move.castlingRights = self.castlingRights[playerColor]
-                        self.castlingRights[playerColor] = (False, self.castlingRights[playerColor][1])
-                    else:
-                        move.castlingRights = self.castlingRights[playerColor]
-                        self.castlingRights[playerColor] = (self.castlingRights[playerColor][0], False)
-
-            # Update the piece location if moved for queen, king, bishop or rook
-            if move.pieceCaptured in pieceNeedUpdate:
-                for j in self.pieceLocation[move.pieceCaptured]:
-                    if (move.endRank, move.endFile) == j:
-                        self.pieceLocation[move.pieceCaptured].remove(j)
-                        break
-            if move.pieceMoved in pieceNeedUpdate:
-                if type(self.pieceLocation[move.pieceMoved]) == list:
-                    for i in range(len(self.pieceLocation[move.pieceMoved])):
-                        if (move.startRank, move.startFile) == self.pieceLocation[move.pieceMoved][i]:
-                            self.pieceLocation[move.pieceMoved][i] = (move.endRank, move.endFile)
-                            break
-                else:
-                    self.pieceLocation[move.pieceMoved] = (move.endRank, move.endFile)
-            self.moveLog.append(move)  # Log the move so we can undo it later
+        if move.promotionPiece:
+            self.board[move.endRank][move.endFile] = move.promotionPiece
+            key ^= ZOBRIST_PIECES[move.pieceMoved][move.endRank][move.endFile]
+            key ^= ZOBRIST_PIECES[move.promotionPiece][move.endRank][move.endFile]
+            if move.promotionPiece in PIECE_NEED_UPDATE:
+                self.pieceLocation[move.promotionPiece].append((move.endRank, move.endFile))
+        elif move.pieceMoved in PIECE_NEED_UPDATE:  # Update the piece location if moved for queen, king, bishop or rook
+            if move.pieceMoved[1] == 'K':
+                self.pieceLocation[move.pieceMoved] = (move.endRank, move.endFile)
+            else:
+                pieceLocations = self.pieceLocation[move.pieceMoved]
+                pieceLocations[pieceLocations.index((move.startRank, move.startFile))] = (move.endRank, move.endFile)
+
+        # This will update castling rights if either a rook or king is moved for the first time
+        if self.castlingRights[playerColor][0] or self.castlingRights[playerColor][1]:
+            playerBackRank = 7 if playerColor == 'w' else 0
+            if move.pieceMoved == playerColor + 'K':
+                self.castlingRights[playerColor] = (False, False)  # Once king moved (or castled) no more castling rights
+            elif move.pieceMoved == playerColor + 'R' and move.startRank == playerBackRank:
+                if move.startFile == 7:
+                    self.castlingRights[playerColor] = (False, self.castlingRights[playerColor][1])
+                elif move.startFile == 0:
+                    self.castlingRights[playerColor] = (self.castlingRights[playerColor][0], False)
+        key ^= ZOBRIST_CASTLING[castlingRightsBefore]
+        key ^= ZOBRIST_CASTLING[(self.castlingRights['w'], self.castlingRights['b'])]
+
+        self.moveLog.append(move)  # Log the move so we can undo it later
+        enPassant = self.en_passant_square()
+        if enPassant:
+            key ^= ZOBRIST_EN_PASSANT[enPassant[1]]
+        self.zobristKey = key
+        if self.verifyZobrist:
+            self.verify_zobrist_key()
 
         # Reset attributes that do not need to be carried over to the next turn. This will prevent bugs that might
         # occur if attributes are not reset
         self.castleMoves = []
         self.enPassantMoves = []
         self.canCastle = (False, False)
-        self.promotePawn = ''
 
     '''
     Undo the last move
     '''
 
     def undo_move(self):
-        if len(self.moveLog) != 0:  # make sure that there is a move to undo
+        if self.moveLog and self.moveLog[-1] is None:  # The last move was a null move
+            self.undo_null_move()
+        elif len(self.moveLog) != 0:  # make sure that there is a move to undo
             self.whiteToMove = not self.whiteToMove  # Switch turns
             if self.whiteToMove:
                 playerColor = 'w'
-                enemyColor = 'b'
             else:
                 playerColor = 'b'
-                enemyColor = 'w'
+            key = self.zobristKey ^ ZOBRIST_BLACK_TO_MOVE
+            enPassant = self.en_passant_square()
+            if enPassant:
+                key ^= ZOBRIST_EN_PASSANT[enPassant[1]]
             move = self.moveLog.pop()
-            pieceNeedUpdate = ['wK', 'wQ', 'wB', 'wR', 'bK', 'bQ', 'bB', 'bR']  # Piece's that need to update locations
 
-            if move.castle:
-                self.castlingRights[playerColor] = move.castlingRights
-                self.board[move.startRank][move.startFile] = move.pieceMoved
+            # The piece on the end square is not the piece moved if a pawn was promoted
+            pieceOnEnd = self.board[move.endRank][move.endFile]
+            self.board[move.startRank][move.startFile] = move.pieceMoved
+            key ^= ZOBRIST_PIECES[pieceOnEnd][move.endRank][move.endFile]
+            key ^= ZOBRIST_PIECES[move.pieceMoved][move.startRank][move.startFile]
+            if move.promotionPiece:
+                if move.promotionPiece in PIECE_NEED_UPDATE:
+                    self.pieceLocation[move.promotionPiece].remove((move.endRank, move.endFile))
+            elif move.pieceMoved in PIECE_NEED_UPDATE:  # Will undo location change for piece in pieceNeedUpdate
+                if move.pieceMoved[1] == 'K':
+                    self.pieceLocation[move.pieceMoved] = (move.startRank, move.startFile)
+                else:
+                    pieceLocations = self.pieceLocation[move.pieceMoved]
+                    pieceLocations[pieceLocations.index((move.endRank, move.endFile))] = (move.startRank,
+                                                                                          move.startFile)
+
+            if move.enPassant:  # This undoes en passant move
+                self.board[move.endRank][move.endFile] = "--"
+                r, f = move.enPassant
+                self.board[r][f] = move.pieceCaptured
+                key ^= ZOBRIST_PIECES[move.pieceCaptured][r][f]
+            else:
                 self.board[move.endRank][move.endFile] = move.pieceCaptured
+                if move.pieceCaptured != "--":
+                    key ^= ZOBRIST_PIECES[move.pieceCaptured][move.endRank][move.endFile]
+                    if move.pieceCaptured in PIECE_NEED_UPDATE:
+                        self.pieceLocation[move.pieceCaptured].append((move.endRank, move.endFile))
+
+            if move.castle:
                 rookStartRank, rookStartFile = move.castle[0]
                 rookEndRank, rookEndFile = move.castle[1]
                 self.board[rookStartRank][rookStartFile] = playerColor + 'R'
                 self.board[rookEndRank][rookEndFile] = "--"
-                for i in range(len(self.pieceLocation[playerColor + "R"])):  # Update rook location
-                    if (rookEndRank, rookEndFile) == self.pieceLocation[playerColor + "R"][i]:
-                        self.pieceLocation[playerColor + "R"][i] = (rookStartRank, rookStartFile)
-                        break
-                self.pieceLocation[move.pieceMoved] = (move.startRank, move.startFile)  # Update king location
-            elif move.enPassant:  # This undoes en passant move
-                self.board[move.startRank][move.startFile] = move.pieceMoved
-                self.board[move.endRank][move.endFile] = "--"
-                r, f = move.enPassant
-                self.board[r][f] = enemyColor + 'P'
-            else:
-                # Checks if move being undone affected castling rights. If so, revert castling rights attribute back
-                if move.castlingRights:
-                    self.castlingRights[playerColor] = move.castlingRights
+                key ^= ZOBRIST_PIECES[playerColor + "R"][rookStartRank][rookStartFile]
+                key ^= ZOBRIST_PIECES[playerColor + "R"][rookEndRank][rookEndFile]
+                rookLocations = self.pieceLocation[playerColor + "R"]
+                rookLocations[rookLocations.index((rookEndRank, rookEndFile))] = (rookStartRank, rookStartFile)
 
-                # Makes move
-                self.board[move.startRank][move.startFile] = move.pieceMoved
-                self.board[move.endRank][move.endFile] = move.pieceCaptured
+            self.mgScore, self.egScore, self.phase = self.scoreLog.pop()
+            # Revert castling rights of both players back to what they were before the move
+            key ^= ZOBRIST_CASTLING[(self.castlingRights['w'], self.castlingRights['b'])]
+            self.castlingRights['w'], self.castlingRights['b'] = self.castlingRightsLog.pop()
+            key ^= ZOBRIST_CASTLING[(self.castlingRights['w'], self.castlingRights['b'])]
+
+            enPassant = self.en_passant_square()
+            if enPassant:  # The en passant square of the move before comes back
+                key ^= ZOBRIST_EN_PASSANT[enPassant[1]]
+            self.zobristKey = key
+            if self.verifyZobrist:
+                self.verify_zobrist_key()
+
+    '''
+    Passes the turn to the opponent without moving a piece. Used by null move pruning in the search. The null move is
+    logged as None in moveLog, so it takes away any en passant capture, and undo_move takes it back
+    '''
+
+    def make_null_move(self):
+        key = self.zobristKey ^ ZOBRIST_BLACK_TO_MOVE
+        enPassant = self.en_passant_square()
+        if enPassant:
+            key ^= ZOBRIST_EN_PASSANT[enPassant[1]]
+        self.zobristKey = key
+        self.whiteToMove = not self.whiteToMove
+        self.moveLog.append(None)
+
+    def undo_null_move(self):
+        self.moveLog.pop()
+        self.whiteToMove = not self.whiteToMove
+        key = self.zobristKey ^ ZOBRIST_BLACK_TO_MOVE
+        enPassant = self.en_passant_square()
+        if enPassant:
+            key ^= ZOBRIST_EN_PASSANT[enPassant[1]]
+        self.zobristKey = key
+
+    '''
+    True if the king of the player to move is attacked. Unlike inCheck this does not need get_valid_moves to be called
+    '''
+
+    def in_check(self):
+        kingRank, kingFile = self.pieceLocation['wK' if self.whiteToMove else 'bK']
+        return len(self.square_under_attack(kingRank, kingFile)) != 0
+
+    '''
+    True if the player to move has a piece other than king and pawns. Without one, passing the turn is often the best
+    move (zugzwang), so the search does not try null moves
+    '''
+
+    def has_non_pawn_material(self):
+        allyColor = 'w' if self.whiteToMove else 'b'
+        if self.pieceLocation[allyColor + 'Q'] or self.pieceLocation[allyColor + 'R'] or \
+                self.pieceLocation[allyColor + 'B']:
+            return True
+        return any(allyColor + 'N' in rank for rank in self.board)  # Knights are not in pieceLocation
+
+    '''
+    Adds the change of the middlegame score, endgame score and phase caused by move. Called by make_move before the move
+    is made on the board
+    '''
+
+    def update_evaluation(self, move):
+        mgScores = Evaluation.MG_SCORES
+        egScores = Evaluation.EG_SCORES
+        piece = move.pieceMoved
+        mgScore = mgScores[piece][move.endRank][move.endFile] - mgScores[piece][move.startRank][move.startFile]
+        egScore = egScores[piece][move.endRank][move.endFile] - egScores[piece][move.startRank][move.startFile]
+        phase = 0
+        if move.pieceCaptured != "--":
+            captureRank, captureFile = move.enPassant if move.enPassant else (move.endRank, move.endFile)
+            mgScore -= mgScores[move.pieceCaptured][captureRank][captureFile]
+            egScore -= egScores[move.pieceCaptured][captureRank][captureFile]
+            phase -= Evaluation.PHASE_WEIGHTS[move.pieceCaptured[1]]
+        if move.castle:
+            rook = piece[0] + 'R'
+            (rookStartRank, rookStartFile), (rookEndRank, rookEndFile) = move.castle
+            mgScore += mgScores[rook][rookEndRank][rookEndFile] - mgScores[rook][rookStartRank][rookStartFile]
+            egScore += egScores[rook][rookEndRank][rookEndFile] - egScores[rook][rookStartRank][rookStartFile]
+        if move.promotionPiece:
+            promotion = move.promotionPiece
+            mgScore += mgScores[promotion][move.endRank][move.endFile] - mgScores[piece][move.endRank][move.endFile]
+            egScore += egScores[promotion][move.endRank][move.endFile] - egScores[piece][move.endRank][move.endFile]
+            phase += Evaluation.PHASE_WEIGHTS[promotion[1]]
+        self.mgScore += mgScore
+        self.egScore += egScore
+        self.phase += phase
+
+    '''
+    Static evaluation of the position in centipawns from white's point of view
+    '''
+
+    def evaluation(self):
+        return Evaluation.tapered_score(self.mgScore, self.egScore, self.phase)
+
+    '''
+    Square (rank, file) the side to move could capture en passant on, or () if the last move was not a two square pawn
+    push. Before the first move it is the en passant square the position was set up with
+    '''
+
+    def en_passant_square(self):
+        if self.moveLog:
+            lastMove = self.moveLog[-1]
+            if lastMove is not None and lastMove.pieceMoved[1] == 'P' and \
+                    abs(lastMove.endRank - lastMove.startRank) == 2:
+                return (lastMove.startRank + lastMove.endRank) // 2, lastMove.endFile
+            return ()
+        return self.startEnPassant
+
+    '''
+    Computes the Zobrist key of the position from scratch
+    '''
+
+    def compute_zobrist_key(self):
+        key = 0
+        for r in range(8):
+            for f in range(8):
+                piece = self.board[r][f]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][r][f]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_CASTLING[(self.castlingRights['w'], self.castlingRights['b'])]
+        enPassant = self.en_passant_square()
+        if enPassant:
+            key ^= ZOBRIST_EN_PASSANT[enPassant[1]]
+        return key
+
+    '''
+    Debug check that the incrementally updated key matches the key computed from scratch
+    '''
 
-                # Check if pieceLocation needs to be updated
-                if move.pieceCaptured in pieceNeedUpdate:
-                    self.pieceLocation[move.pieceCaptured].append((move.endRank, move.endFile))
-                if move.pieceMoved in pieceNeedUpdate:  # Will undo location change for piece in pieceNeedUpdate
-                    if type(self.pieceLocation[move.pieceMoved]) == list:
-                        pieceLocations = self.pieceLocation[move.pieceMoved]
-                        for i in range(len(pieceLocations)):
-                            if (move.endRank, move.endFile) == pieceLocations[i]:
-                                self.pieceLocation[move.pieceMoved][i] = (move.startRank, move.startFile)
-                    else:
-                        self.pieceLocation[move.pieceMoved] = (move.startRank, move.startFile)
+    def verify_zobrist_key(self):
+        expectedKey = self.compute_zobrist_key()
+        if self.zobristKey != expectedKey:
+            raise RuntimeError("Zobrist key mismatch after move " + str(len(self.moveLog)) + ": incremental key " +
+                               hex(self.zobristKey) + ", recomputed key " + hex(expectedKey))
 
     '''
     All moves without considering checks
@@ -209,42 +598,37 @@ class game_state:
 
     def get_valid_moves(self):
         moves = []
+        self.checkMate = False
+        self.staleMate = False
         if self.whiteToMove:
             allyColor = 'w'
             kingRank = self.pieceLocation['wK'][0]
             kingFile = self.pieceLocation['wK'][1]
-            print("\nWhite's turn")
         else:
             allyColor = 'b'
             kingRank = self.pieceLocation['bK'][0]
             kingFile = self.pieceLocation['bK'][1]
-            print("\nBlack's turn")
 
-        print("Piece locations = " + str(self.pieceLocation))
-        print("Castling right = " + str(self.castlingRights[allyColor]))
+        # This loop will check for all pins and store them in a list called self.pins
+        self.pins = self.in_pin()
+        checks = self.square_under_attack(kingRank, kingFile)
+        self.inCheck = len(checks) != 0
 
         # Following code checks if player can castle short (self.castlingRights[allyColor][0]) or long
-        # (self.castlingRights[allyColor][1])
+        # (self.castlingRights[allyColor][1]). The king may not castle out of check or through an attacked square, and
+        # the squares between king and rook must be empty
+        self.canCastle = (False, False)
         castlingRights = self.castlingRights[allyColor][0] or self.castlingRights[allyColor][1]
-        if castlingRights:
-            possiblyShort = self.castlingRights[allyColor][0]
-            possiblyLong = self.castlingRights[allyColor][1]
-            for i in range(1, 3):
-                inBetweenShort = self.board[kingRank][kingFile + i]
-                underAttackShort = self.square_under_attack(kingRank, kingFile + i)
-                inBetweenLong = self.board[kingRank][kingFile - i]
-                underAttackLong = self.square_under_attack(kingRank, kingFile - i)
-                if (inBetweenShort != "--" or underAttackShort != []) and possiblyShort:
-                    possiblyShort = False
-                if (inBetweenLong != "--" or underAttackLong != []) and possiblyLong:
-                    possiblyLong = False
-            self.canCastle = (possiblyShort, possiblyLong)
+        if castlingRights and not checks:
+            canCastle = []
+            for i in range(2):  # 0 is short, 1 is long
+                emptySquares, kingPath = CASTLING_PATHS[allyColor][i]
+                rookSquare = self.board[kingRank][7 if i == 0 else 0]
+                canCastle.append(self.castlingRights[allyColor][i] and rookSquare == allyColor + 'R' and
+                                 all(self.board[rank][file] == "--" for rank, file in emptySquares) and
+                                 not any(self.square_under_attack(rank, file) for rank, file in kingPath))
+            self.canCastle = (canCastle[0], canCastle[1])
 
-        # This loop will check for all pins and store them in a list called self.pins
-        self.pins = self.in_pin()
-        checks = self.square_under_attack(kingRank, kingFile)
-        print("checks = " + str(checks))
-        print("List of Piece locations pinned with direction = " + str(self.pins))
         # 2. For each move, make the move
         if checks:
             if len(checks) == 1:  # Only 1 check, so can block or move king
@@ -258,20 +642,13 @@ class game_state:
                 # If knight, must capture knight or move king, other pieces can be blocked
                 if pieceChecking[1] == 'N':
                     validSquares = [(checkRank, checkFile)]
-                else:
-                    for i in range(1, 8):
-                        validSquare = (
-                            kingRank + check[1][0] * i,
-                            kingFile + check[1][1] * i)  # check[1][0] and check[1][1] are the
-                        # check directions
-                        validSquares.append(validSquare)
-                        # Once you get to piece end checks
-                        if validSquare[0] == checkRank and validSquare[1] == checkFile:
-                            break
+                else:  # The squares between king and checking piece, then the checking piece itself
+                    validSquares = LINES[kingRank][kingFile][checkRank][checkFile][1] + [(checkRank, checkFile)]
                 # Get rid of any moves that don't block check or move king.
                 # When removing items from a list go backwards to prevent index errors
+                # En passant moves were already checked for leaving the king in check when they were generated
                 for i in range(len(moves) - 1, -1, -1):
-                    if moves[i].pieceMoved[1] != 'K':  # Move doesn't move king, so it must block or capture
+                    if moves[i].pieceMoved[1] != 'K' and not moves[i].enPassant:  # Move must block or capture
                         if not (moves[i].endRank,
                                 moves[i].endFile) in validSquares:  # Move doesn't block check or capture pieces
                             moves.remove(moves[i])
@@ -287,102 +664,211 @@ class game_state:
                 self.staleMate = True
         return moves
 
+    '''
+    Legal captures and promotions only, for the capture stage of get_staged_moves and the quiescence search. Each piece
+    only looks at the first piece along its lines, so no quiet moves are made. checkMate and staleMate are left unset,
+    telling them apart needs all the moves
+    '''
+
+    def get_capture_moves(self):
+        moves = []
+        self.checkMate = False
+        self.staleMate = False
+        if self.whiteToMove:
+            allyColor, enemyColor, moveAmount = 'w', 'b', -1
+        else:
+            allyColor, enemyColor, moveAmount = 'b', 'w', 1
+        board = self.board
+        kingRank, kingFile = self.pieceLocation[allyColor + 'K']
+        checks = self.square_under_attack(kingRank, kingFile)
+        self.inCheck = len(checks) != 0
+
+        for rank, file in KING_SQUARES[kingRank][kingFile]:
+            if board[rank][file][0] == enemyColor and not self.square_under_attack(rank, file):
+                moves.append(Move((kingRank, kingFile), (rank, file), board))
+        if len(checks) > 1:  # Double check, king has to move
+            return moves
+        validSquares = None  # Squares that capture the checking piece or block the check
+        if checks:
+            checkRank, checkFile = checks[0][0]
+            if board[checkRank][checkFile][1] == 'N':
+                validSquares = [(checkRank, checkFile)]
+            else:
+                validSquares = LINES[kingRank][kingFile][checkRank][checkFile][1] + [(checkRank, checkFile)]
+        pins = {square: direction for square, direction in self.in_pin()}
+        enPassant = self.en_passant_square()
+
+        pieceMoves = []
+        for r in range(8):
+            for f in range(8):
+                piece = board[r][f]
+                if piece[0] != allyColor or piece[1] == 'K':
+                    continue
+                pinDirection = pins.get((r, f))
+                if piece[1] == 'P':
+                    # A push onto the last rank promotes. A pinned pawn may only push along a file pin
+                    if (r + moveAmount == 0 or r + moveAmount == 7) and board[r + moveAmount][f] == "--" and \
+                            (pinDirection is None or pinDirection[1] == 0):
+                        self.add_pawn_moves((r, f), (r + moveAmount, f), pieceMoves)
+                    for captureDirection in (-1, 1):
+                        captureFile = f + captureDirection
+                        if not 0 <= captureFile <= 7:
+                            continue
+                        if board[r + moveAmount][captureFile][0] == enemyColor:
+                            if pinDirection is None or pinDirection == (moveAmount, captureDirection) or \
+                                    pinDirection == (-moveAmount, -captureDirection):
+                                self.add_pawn_moves((r, f), (r + moveAmount, captureFile), pieceMoves)
+                        elif enPassant == (r + moveAmount, captureFile) and \
+                                not self.en_passant_exposes_king(r, f, captureFile):
+                            # Checked for leaving the king in check already, so it skips the validSquares test
+                            move = Move((r, f), (r + moveAmount, captureFile), board)
+                            move.enPassant = (r, captureFile)
+                            move.pieceCaptured = board[r][captureFile]
+                            self.enPassantMoves.append(move)
+                            moves.append(move)
+                elif piece[1] == 'N':
+                    if pinDirection is None:  # A pinned knight can never move
+                        for rank, file in KNIGHT_SQUARES[r][f]:
+                            if board[rank][file][0] == enemyColor:
+                                pieceMoves.append(Move((r, f), (rank, file), board))
+                else:  # Bishop, rook or queen. Only the first piece along each ray can be captured
+                    for direction, ray in RAY_SQUARES[r][f].items():
+                        if piece[1] != 'Q' and (direction[0] != 0 and direction[1] != 0) != (piece[1] == 'B'):
+                            continue
+                        if pinDirection is not None and direction != pinDirection and \
+                                direction != (-pinDirection[0], -pinDirection[1]):
+                            continue
+                        for rank, file in ray:
+                            if board[rank][file] != "--":
+                                if board[rank][file][0] == enemyColor:
+                                    pieceMoves.append(Move((r, f), (rank, file), board))
+                                break
+
+        if validSquares is None:
+            moves.extend(pieceMoves)
+        else:
+            moves.extend(move for move in pieceMoves if (move.endRank, move.endFile) in validSquares)
+        return moves
+
+    '''
+    Generator of the legal moves in the order a search wants to try them: the hash move, captures and promotions, killer
+    moves, then the remaining quiet moves. Each stage is only generated when the one before it did not cause a cutoff:
+    the hash and killer moves are checked on their own, the captures come from get_capture_moves and the quiet moves
+    are only generated once the quiet stage is reached. captureKey and quietKey are optional sort keys, captures and
+    quiet moves are tried from the highest key down. If the generator yields no moves, checkMate or staleMate is set
+    just like after get_valid_moves
+    '''
+
+    def get_staged_moves(self, hashMoveID=None, killerIDs=(), captureKey=None, quietKey=None):
+        yielded = set()  # moveIDs already yielded
+        if hashMoveID is not None:
+            move = self.legal_move_from_id(hashMoveID)
+            if move is not None:
+                yielded.add(move.moveID)
+                yield move
+
+        captures = [move for move in self.get_capture_moves() if move.moveID not in yielded]
+        if captureKey is not None:
+            captures.sort(key=captureKey, reverse=True)
+        for move in captures:
+            yielded.add(move.moveID)
+            yield move
+
+        for killerID in killerIDs:
+            if killerID is not None and killerID not in yielded:
+                move = self.legal_move_from_id(killerID)
+                if move is not None and move.pieceCaptured == "--" and not move.promotionPiece:
+                    yielded.add(killerID)
+                    yield move
+
+        quietMoves = [move for move in self.get_valid_moves() if move.moveID not in yielded and
+                      move.pieceCaptured == "--" and not move.promotionPiece]
+        if quietKey is not None:
+            quietMoves.sort(key=quietKey, reverse=True)
+        for move in quietMoves:
+            yield move
+
+    '''
+    Returns the move encoded by moveID if it is legal in this position, otherwise None. Used to check a move remembered
+    from another position (e.g. a hash or killer move) without generating all moves. Castling and en passant are not
+    recognized here, those are left to get_valid_moves
+    '''
+
+    def legal_move_from_id(self, moveID):
+        startRank, startFile = divmod(moveID & 63, 8)
+        endRank, endFile = divmod(moveID >> 6 & 63, 8)
+        allyColor = 'w' if self.whiteToMove else 'b'
+        piece = self.board[startRank][startFile]
+        target = self.board[endRank][endFile]
+        if piece[0] != allyColor or target[0] == allyColor or target[1] == 'K' or \
+                moveID >> 12 not in Move.promotionPieces:
+            return None
+
+        if piece[1] == 'N':
+            possible = (endRank, endFile) in KNIGHT_SQUARES[startRank][startFile]
+        elif piece[1] == 'K':
+            possible = (endRank, endFile) in KING_SQUARES[startRank][startFile]
+        elif piece[1] == 'P':
+            moveAmount = -1 if allyColor == 'w' else 1
+            if endFile == startFile:  # Pawn push, one square or two from the starting rank
+                possible = target == "--" and (endRank == startRank + moveAmount or (
+                    startRank == (6 if allyColor == 'w' else 1) and endRank == startRank + 2 * moveAmount and
+                    self.board[startRank + moveAmount][startFile] == "--"))
+            else:  # Capture
+                possible = target != "--" and endRank == startRank + moveAmount and abs(endFile - startFile) == 1
+        else:  # Bishop, rook or queen. It must move along its lines and the squares in between must be empty
+            line = LINES[startRank][startFile][endRank][endFile]
+            possible = line is not None and (piece[1] == 'Q' or line[2] == (piece[1] == 'B')) and \
+                all(self.board[rank][file] == "--" for rank, file in line[1])
+        if not possible:
+            return None
+
+        move = Move.from_id(moveID, self.board)
+        # Only pawns reaching the last rank promote, and they always do
+        if (move.promotionPiece != '') != (piece[1] == 'P' and (endRank == 0 or endRank == 7)):
+            return None
+        if move.moveID != moveID:
+            return None
+
+        # Make the move and see if the king is attacked
+        self.make_move(move)
+        self.whiteToMove = not self.whiteToMove  # square_under_attack looks for attacks by the side not to move
+        kingRank, kingFile = self.pieceLocation[allyColor + 'K']
+        kingAttacked = len(self.square_under_attack(kingRank, kingFile)) != 0
+        self.whiteToMove = not self.whiteToMove
+        self.undo_move()
+        return None if kingAttacked else move
+
     '''
     Determine if an enemy piece pins an ally piece. Returns location of pin and direction
     '''
 
     def in_pin(self):
         pins = []
-        possiblePin = ()  # Piece locations of possible pin
         if self.whiteToMove:
             allyColor = "w"
-            kingRank = self.pieceLocation['wK'][0]
-            kingFile = self.pieceLocation['wK'][1]
-            bishopLocation = self.pieceLocation['bB']
-            rookLocation = self.pieceLocation['bR']
-            queenLocation = self.pieceLocation['bQ']
+            enemyColor = "b"
         else:
             allyColor = "b"
-            kingRank = self.pieceLocation['bK'][0]
-            kingFile = self.pieceLocation['bK'][1]
-            bishopLocation = self.pieceLocation['wB']
-            rookLocation = self.pieceLocation['wR']
-            queenLocation = self.pieceLocation['wQ']
-        for j in bishopLocation:  # Checks if there are any pins from enemy bishop
-            r = j[0]
-            f = j[1]
-            if abs(kingRank - r) - abs(kingFile - f) == 0:
-                distance = max(kingRank, r) - min(kingRank, r)
-                # This is direction of bishop relative to king
-                d = ((j[0] - kingRank) // distance,
-                     (j[1] - kingFile) // distance)
-                for i in range(1, distance):
-                    rank = kingRank + d[0] * i
-                    file = kingFile + d[1] * i
-                    InBetween = self.board[rank][file]
-                    if InBetween[0] == allyColor and possiblePin == ():
-                        possiblePin = (rank, file)
-                    elif InBetween != "--" and possiblePin != ():
-                        possiblePin = ()
-                        break
-                if possiblePin != ():
-                    pins.append([possiblePin, d])
-        for j in rookLocation:  # Check if there is any pins from enemy rook
-            r = j[0]
-            f = j[1]
-            if (r - kingRank == 0) or (f - kingFile == 0):
-                distance = abs((r - kingRank) + (f - kingFile))
-                d = ((r - kingRank) // distance,
-                     (f - kingFile) // distance)  # This is direction of rook relative to king
-                for i in range(1, distance):
-                    rank = kingRank + d[0] * i
-                    file = kingFile + d[1] * i
-                    InBetween = self.board[rank][file]
-                    if InBetween[0] == allyColor and possiblePin == ():
-                        possiblePin = (rank, file)
-                    elif InBetween != "--" and possiblePin != ():
-                        possiblePin = ()
-                        break
-                if possiblePin != ():
-                    pins.append([possiblePin, d])
-        for j in queenLocation:
-            r = j[0]
-            f = j[1]
-            # Checks if pin comes from diagonal
-            fromDiagonal = abs(kingRank - r) - abs(kingFile - f) == 0
-            fromRankFile = (r - kingRank == 0) or (f - kingFile == 0)
-            if fromDiagonal:
-                distance = max(kingRank, r) - min(kingRank, r)
-                # This is direction of bishop relative to king
-                d = ((j[0] - kingRank) // distance,
-                     (j[1] - kingFile) // distance)
-                for i in range(1, distance):
-                    rank = kingRank + d[0] * i
-                    file = kingFile + d[1] * i
-                    InBetween = self.board[rank][file]
-                    if InBetween[0] == allyColor and possiblePin == ():
-                        possiblePin = (rank, file)
-                    elif InBetween != "--" and possiblePin != ():
-                        possiblePin = ()
-                        break
-                if possiblePin != ():
-                    pins.append([possiblePin, d])
-            elif fromRankFile:
-                distance = abs((r - kingRank) + (f - kingFile))
-                # This is direction of rook relative to king
-                d = ((r - kingRank) // distance,
-                     (f - kingFile) // distance)
-                for i in range(1, distance):
-                    rank = kingRank + d[0] * i
-                    file = kingFile + d[1] * i
+            enemyColor = "w"
+        kingRank, kingFile = self.pieceLocation[allyColor + 'K']
+        lines = LINES[kingRank][kingFile]
+        for piece in [enemyColor + 'B', enemyColor + 'R', enemyColor + 'Q']:
+            for j in self.pieceLocation[piece]:
+                line = lines[j[0]][j[1]]
+                # Bishops only pin along diagonals and rooks only along ranks and files
+                if line is None or (piece[1] == 'B' and not line[2]) or (piece[1] == 'R' and line[2]):
+                    continue
+                possiblePin = ()  # Piece locations of possible pin
+                for rank, file in line[1]:
                     InBetween = self.board[rank][file]
                     if InBetween[0] == allyColor and possiblePin == ():
                         possiblePin = (rank, file)
-                    elif InBetween != "--" and possiblePin != ():
+                    elif InBetween != "--":  # An enemy piece or a second ally piece means there is no pin
                         possiblePin = ()
                         break
                 if possiblePin != ():
-                    pins.append([possiblePin, d])
+                    pins.append([possiblePin, line[0]])  # line[0] is the direction of the slider relative to king
         return pins
 
     '''
@@ -393,138 +879,49 @@ class game_state:
         if self.whiteToMove:  # Check if black pieces attack squares
             enemyColor = 'b'
             allyColor = 'w'
-            bishopLocation = self.pieceLocation['bB']
-            rookLocation = self.pieceLocation['bR']
-            queenLocation = self.pieceLocation['bQ']
-            sq = []
         else:  # Check if white pieces attack square
             enemyColor = 'w'
             allyColor = 'b'
-            bishopLocation = self.pieceLocation['wB']
-            rookLocation = self.pieceLocation['wR']
-            queenLocation = self.pieceLocation['wQ']
-            sq = []
-
-        # Check if Bishop is attacking
-        for j in bishopLocation:
-            onDiagonal = abs(j[0] - r) - abs(j[1] - f) == 0  # Checks if bishop is on same diagonal as square (r, f)
-            if onDiagonal and j != (r, f):  # Piece on a square cannot attack same square
-                distance = max(j[0], r) - min(j[1], r)
-                # Bishop direction relative to square (r, f)
-                d = ((j[0] - r) // abs(j[0] - r), (j[1] - f) // abs(j[1] - f))
-                if distance == 1:
-                    sq.append([j, d])
-                else:
-                    for i in range(1, 8):
-                        rank = r + d[0] * i
-                        file = f + d[1] * i
-                        InBetween = self.board[rank][file]  # squares in between square (r, f) and Bishop
-                        if (rank, file) != j:
-                            # King cannot block squares under attack, since it will be in check. So, if the king is
-                            # attacked, squares behind it can potentially be vulnerable unless blocked by another piece.
-                            # Hence, the bottom conditional statement disregards the king. This also prevents any issues
-                            # when computing king moves using this method.
-                            if InBetween != "--" and InBetween != allyColor + 'K':
-                                break
-                        else:
-                            sq.append([j, d, enemyColor + 'B'])
-                            break
-
-        # Check if Rook is attacking
-        for j in rookLocation:
-            if (j[0] - r == 0) or (j[1] - f == 0) and j != (r, f):
-                distance = abs((j[0] - r) + (j[1] - f))
-                if distance != 0:
-                    d = ((j[0] - r) // distance, (j[1] - f) // distance)
-                    if distance == 1:
-                        sq.append([j, d])
-                    else:
-                        for i in range(1, 8):
-                            rank = r + d[0] * i
-                            file = f + d[1] * i
-                            InBetween = self.board[rank][file]  # squares in between square (r, f) and Rook
-                            if (rank, file) != j:
-                                if InBetween != "--" and InBetween != allyColor + 'K':
-                                    break
-                            else:
-                                sq.append([j, d, enemyColor + 'R'])
-                                break
+        sq = []
+        board = self.board
+        allyKing = allyColor + 'K'
 
-        # Check if Queen is attacking
-        for j in queenLocation:
-            if abs(j[0] - r) - abs(j[1] - f) == 0 and j != (r, f):
-                distance = max(j[0], r) - min(j[0], r)
-                if distance != 0:
-                    d = ((j[0] - r) // abs(j[0] - r), (j[1] - f) // abs(j[1] - f))
-                    if distance == 1:
-                        sq.append([j, d])
-                    else:
-                        for i in range(1, 8):
-                            rank = r + d[0] * i
-                            file = f + d[1] * i
-                            InBetween = self.board[rank][file]  # squares in between square (r, f) and Queen
-                            if (rank, file) != j:
-                                if InBetween != "--" and InBetween != allyColor + 'K':
-                                    break
-                            else:
-                                sq.append([j, d, enemyColor + 'Q'])
-                                break
-            elif (j[0] - r == 0) or (j[1] - f == 0) and j != (r, f):
-                distance = abs((j[0] - r) + (j[1] - f))
-                if distance != 0:
-                    d = ((j[0] - r) // distance, (j[1] - f) // distance)
-                    if distance == 1:
-                        sq.append([j, d])
-                    else:
-                        for i in range(1, 8):
-                            rank = r + d[0] * i
-                            file = f + d[1] * i
-                            InBetween = self.board[rank][file]  # squares in between square (r, f) and Queen
-                            if (rank, file) != j:
-                                if InBetween != "--" and InBetween != allyColor + 'K':
-                                    break
-                            else:
-                                sq.append([j, d, enemyColor + 'Q'])
-                                break
+        # Check if bishops, rooks and queens are attacking. LINES tells if the slider is on the same rank, file or
+        # diagonal as (r, f) and which squares are in between
+        lines = LINES[r][f]
+        for piece in [enemyColor + 'B', enemyColor + 'R', enemyColor + 'Q']:
+            for j in self.pieceLocation[piece]:
+                line = lines[j[0]][j[1]]
+                if line is None or (piece[1] == 'B' and not line[2]) or (piece[1] == 'R' and line[2]):
+                    continue
+                for rank, file in line[1]:
+                    # King cannot block squares under attack, since it will be in check. So, if the king is attacked,
+                    # squares behind it can potentially be vulnerable unless blocked by another piece. Hence, the
+                    # king is disregarded. This also prevents any issues when computing king moves using this method.
+                    if board[rank][file] != "--" and board[rank][file] != allyKing:
+                        break
+                else:
+                    sq.append([j, line[0], piece])
 
         # Check if chosen square is being defended by enemy knights
-        knightSq = [(r + 1, f + 2), (r + 2, f + 1), (r + 2, f - 1), (r + 1, f - 2), (r - 1, f - 2), (r - 2, f - 1),
-                    (r - 2, f + 1), (r - 1, f + 2)]
-        for j in knightSq:
-            rank = j[0]
-            file = j[1]
-            onBoard = (0 <= rank <= 7) and (0 <= file <= 7)
-            if onBoard:
-                targetSq = self.board[rank][file]
-                if targetSq == enemyColor + 'N':
-                    sq.append([(rank, file), -1, enemyColor + 'N'])
-
-        # Check if chosen square is defended by enemy pawns
-        if self.whiteToMove:  # White's turn. Check if black pawns defend chosen square
-            targetSq = self.board
-            if (0 <= f - 1) and (targetSq[r - 1][f - 1] == 'bP'):  # Check left side of targetSq for pawn attack
-                sq.append([(r - 1, f - 1), (-1, -1), 'bP'])
-            elif (7 >= f + 1) and (targetSq[r - 1][f + 1] == 'bP'):  # Check right side of targetSq for pawn attack
-                sq.append([(r - 1, f + 1), (-1, 1), 'bP'])
-        else:  # Black's turn. Check if white pawns defend chosen square
-            targetSq = self.board
-            if (0 <= f - 1) and (targetSq[r + 1][f - 1] == 'wP'):  # Check right side of targetSq for pawn attack
-                sq.append([(r + 1, f - 1), (1, -1), 'wP'])
-            elif (7 <= f + 1) and (targetSq[r + 1][f + 1] == 'wP'):  # Check left side of targetSq for pawn attack
-                sq.append([(r + 1, f + 1), (1, 1), 'wP'])
+        enemyKnight = enemyColor + 'N'
+        for rank, file in KNIGHT_SQUARES[r][f]:
+            if board[rank][file] == enemyKnight:
+                sq.append([(rank, file), -1, enemyKnight])
+
+        # Check if chosen square is defended by enemy pawns. Enemy pawns attack (r, f) from the squares an ally pawn on
+        # (r, f) would attack
+        enemyPawn = enemyColor + 'P'
+        for rank, file in PAWN_ATTACK_SQUARES[allyColor][r][f]:
+            if board[rank][file] == enemyPawn:
+                sq.append([(rank, file), (rank - r, file - f), enemyPawn])
 
         # Check if enemy king is attacking square
-        kingSq = [(r, f - 1), (r - 1, f - 1), (r - 1, f), (r - 1, f + 1), (r, f + 1), (r + 1, f + 1), (r + 1, f),
-                  (r + 1, f - 1)]
-        for i in range(8):
-            onBoard = (0 <= kingSq[i][0] <= 7) and (0 <= kingSq[i][1] <= 7)
-            if onBoard:
-                rank = kingSq[i][0]
-                file = kingSq[i][1]
-                targetSq = self.board[rank][file]
-                if targetSq == enemyColor + 'K':
-                    sq.append([(rank, file), (rank - r, file - f), enemyColor + 'K'])
-                    break
+        enemyKing = enemyColor + 'K'
+        for rank, file in KING_SQUARES[r][f]:
+            if board[rank][file] == enemyKing:
+                sq.append([(rank, file), (rank - r, file - f), enemyKing])
+                break
         return sq
 
     '''
@@ -541,91 +938,66 @@ class game_state:
                 self.pins.remove(self.pins[i])
                 break
 
-        if self.whiteToMove:  # white pawn moves
-            if self.board[r - 1][f] == "--":  # 1 square pawn push
-                if not piecePinned or pinDirection == (-1, 0):
-                    moves.append(Move((r, f), (r - 1, f), self.board))
-                    if r == 6 and self.board[r - 2][f] == "--":  # 2 square pawn push
-                        moves.append(Move((r, f), (r - 2, f), self.board))
-            if f - 1 >= 0:  # captures to the left
-                if self.board[r - 1][f - 1][0] == 'b':  # Opponents piece can be captured
-                    if not piecePinned or pinDirection == (-1, -1):
-                        moves.append(Move((r, f), (r - 1, f - 1), self.board))
-                if self.moveLog:  # This is to prevent errors when first running script due to empty list
-                    lastMove = self.moveLog[-1]
-                    startRank = lastMove.startRank
-                    endRank = lastMove.endRank
-                    endFile = lastMove.endFile
-                    moveTwoSquares = (startRank == 1) and (endRank == 3 == r)
-                    enPassant = (lastMove.pieceMoved == 'bP') and moveTwoSquares and (endFile == f - 1)
-                    if enPassant:
-                        if not piecePinned or pinDirection == (-1, -1):
-                            move = Move((r, f), (r - 1, f - 1), self.board)
-                            move.enPassant = (r, f - 1)
-                            move.pieceCaptured = self.board[r][f - 1]
-                            self.enPassantMoves.append(move)
-                            moves.append(move)
-            if f + 1 <= 7:  # captures to the right
-                if self.board[r - 1][f + 1][0] == 'b':  # Opponents piece can be captured
-                    if not piecePinned or pinDirection == (-1, 1):
-                        moves.append(Move((r, f), (r - 1, f + 1), self.board))
-                if self.moveLog:  # This is to prevent errors when first running script due to empty list
-                    lastMove = self.moveLog[-1]
-                    startRank = lastMove.startRank
-                    endRank = lastMove.endRank
-                    endFile = lastMove.endFile
-                    moveTwoSquares = (startRank == 1) and (endRank == 3 == r)
-                    enPassant = (lastMove.pieceMoved == 'bP') and moveTwoSquares and (endFile == f + 1)
-                    if enPassant:
-                        if not piecePinned or pinDirection == (-1, 1):
-                            move = Move((r, f), (r - 1, f + 1), self.board)
-                            move.enPassant = (r, f + 1)
-                            move.pieceCaptured = self.board[r][f + 1]
-                            self.enPassantMoves.append(move)
-                            moves.append(move)
+        if self.whiteToMove:  # white pawn moves up the board
+            moveAmount = -1
+            startRank = 6
+            enemyColor = 'b'
+        else:  # Black pawn moves down the board
+            moveAmount = 1
+            startRank = 1
+            enemyColor = 'w'
 
-        else:  # Black pawn moves
-            if self.board[r + 1][f] == "--":  # 1 square pawn push
-                if not piecePinned or pinDirection == (1, 0):
-                    moves.append(Move((r, f), (r + 1, f), self.board))
-                    if r == 1 and self.board[r + 2][f] == "--":  # 2 square pawn push
-                        moves.append(Move((r, f), (r + 2, f), self.board))
-            if f + 1 <= 7:  # Captures to the left
-                if self.board[r + 1][f + 1][0] == 'w':  # Opponents piece can be captured
-                    if not piecePinned or pinDirection == (1, 1):
-                        moves.append(Move((r, f), (r + 1, f + 1), self.board))
-                if self.moveLog:  # This is to prevent errors when first running script due to empty list
-                    lastMove = self.moveLog[-1]
-                    startRank = lastMove.startRank
-                    endRank = lastMove.endRank
-                    endFile = lastMove.endFile
-                    moveTwoSquares = (startRank == 6) and (endRank == 4 == r)
-                    enPassant = (lastMove.pieceMoved == 'wP') and moveTwoSquares and (endFile == f + 1)
-                    if enPassant:
-                        if not piecePinned or pinDirection == (1, 1):
-                            move = Move((r, f), (r + 1, f + 1), self.board)
-                            move.enPassant = (r, f + 1)
-                            move.pieceCaptured = self.board[r][f + 1]
-                            self.enPassantMoves.append(move)
-                            moves.append(move)
-            if f - 1 >= 0:  # Captures piece to the right
-                if self.board[r + 1][f - 1][0] == 'w':  # Opponents piece can be captured
-                    if not piecePinned or pinDirection == (1, -1):
-                        moves.append(Move((r, f), (r + 1, f - 1), self.board))
-                if self.moveLog:  # This is to prevent errors when first running script due to empty list
-                    lastMove = self.moveLog[-1]
-                    startRank = lastMove.startRank
-                    endRank = lastMove.endRank
-                    endFile = lastMove.endFile
-                    moveTwoSquares = (startRank == 6) and (endRank == 4 == r)
-                    enPassant = (lastMove.pieceMoved == 'wP') and moveTwoSquares and (endFile == f - 1)
-                    if enPassant:
-                        if not piecePinned or pinDirection == (1, -1):
-                            move = Move((r, f), (r + 1, f - 1), self.board)
-                            move.enPassant = (r, f - 1)
-                            move.pieceCaptured = self.board[r][f - 1]
-                            self.enPassantMoves.append(move)
-                            moves.append(move)
+        # A pinned pawn may still move along the line of the pin, towards the king or towards the pinning piece
+        if self.board[r + moveAmount][f] == "--":  # 1 square pawn push
+            if not piecePinned or pinDirection == (-1, 0) or pinDirection == (1, 0):
+                self.add_pawn_moves((r, f), (r + moveAmount, f), moves)
+                if r == startRank and self.board[r + 2 * moveAmount][f] == "--":  # 2 square pawn push
+                    moves.append(Move((r, f), (r + 2 * moveAmount, f), self.board))
+        enPassant = self.en_passant_square()
+        for captureDirection in (-1, 1):  # captures to the left and to the right
+            captureFile = f + captureDirection
+            if 0 <= captureFile <= 7:
+                if self.board[r + moveAmount][captureFile][0] == enemyColor:  # Opponents piece can be captured
+                    if not piecePinned or pinDirection == (moveAmount, captureDirection) or \
+                            pinDirection == (-moveAmount, -captureDirection):
+                        self.add_pawn_moves((r, f), (r + moveAmount, captureFile), moves)
+                elif enPassant == (r + moveAmount, captureFile) and not self.en_passant_exposes_king(r, f, captureFile):
+                    move = Move((r, f), (r + moveAmount, captureFile), self.board)
+                    move.enPassant = (r, captureFile)
+                    move.pieceCaptured = self.board[r][captureFile]
+                    self.enPassantMoves.append(move)
+                    moves.append(move)
+
+    '''
+    Adds a pawn move. A pawn reaching the last rank can promote to a queen, rook, bishop or knight
+    '''
+
+    def add_pawn_moves(self, startSq, endSq, moves):
+        if endSq[0] == 0 or endSq[0] == 7:
+            color = self.board[startSq[0]][startSq[1]][0]
+            for piece in ['Q', 'R', 'B', 'N']:
+                moves.append(Move(startSq, endSq, self.board, color + piece))
+        else:
+            moves.append(Move(startSq, endSq, self.board))
+
+    '''
+    En passant removes two pawns from the same rank at once, which can expose the king in ways the pins do not cover.
+    So the capture is made on the board, the king is checked, and the board is put back
+    '''
+
+    def en_passant_exposes_king(self, r, f, captureFile):
+        pawn = self.board[r][f]
+        capturedPawn = self.board[r][captureFile]
+        endRank = r - 1 if pawn[0] == 'w' else r + 1
+        self.board[r][f] = "--"
+        self.board[r][captureFile] = "--"
+        self.board[endRank][captureFile] = pawn
+        kingRank, kingFile = self.pieceLocation[pawn[0] + 'K']
+        exposed = len(self.square_under_attack(kingRank, kingFile)) != 0
+        self.board[r][f] = pawn
+        self.board[r][captureFile] = capturedPawn
+        self.board[endRank][captureFile] = "--"
+        return exposed
 
     '''
     Get all possible knight moves located on rank, file and add them to the list
@@ -646,13 +1018,9 @@ class game_state:
                 break
 
         if not piecePinned:
-            knightMoves = [(r + 1, f + 2), (r + 2, f + 1), (r + 2, f - 1), (r + 1, f - 2), (r - 1, f - 2),
-                           (r - 2, f - 1), (r - 2, f + 1), (r - 1, f + 2)]
-            for i in range(8):
-                onBoard = (0 <= knightMoves[i][0] <= 7) and (0 <= knightMoves[i][1] <= 7)
-                if onBoard:
-                    if self.board[knightMoves[i][0]][knightMoves[i][1]][0] != allyColor:
-                        moves.append(Move((r, f), knightMoves[i], self.board))
+            for rank, file in KNIGHT_SQUARES[r][f]:
+                if self.board[rank][file][0] != allyColor:
+                    moves.append(Move((r, f), (rank, file), self.board))
 
     '''
     Get all possible bishop moves located on rank, file and add them to the list
@@ -805,17 +1173,10 @@ class game_state:
         else:
             allyColor = 'b'
 
-        kingMoves = [(r, f - 1), (r - 1, f - 1), (r - 1, f), (r - 1, f + 1), (r, f + 1), (r + 1, f + 1), (r + 1, f),
-                     (r + 1, f - 1)]
-        for i in range(8):
-            rank = kingMoves[i][0]
-            file = kingMoves[i][1]
-            onBoard = (0 <= rank <= 7) and (0 <= file <= 7)
-            if onBoard:
-                squareAttacked = self.square_under_attack(rank, file)
-                allyPiece = self.board[rank][file][0] == allyColor
-                if not (squareAttacked or allyPiece):
-                    moves.append(Move((r, f), (rank, file), self.board))
+        for rank, file in KING_SQUARES[r][f]:
+            allyPiece = self.board[rank][file][0] == allyColor
+            if not (allyPiece or self.square_under_attack(rank, file)):
+                moves.append(Move((r, f), (rank, file), self.board))
 
         canCastle = self.canCastle[0] or self.canCastle[1]
         if canCastle:
@@ -841,7 +1202,14 @@ class Move:
     filesToCols = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
-    def __init__(self, startSq, endSq, board):
+    promotionIDs = {'': 0, 'Q': 1, 'R': 2, 'B': 3, 'N': 4}
+    promotionPieces = {v: k for k, v in promotionIDs.items()}
+
+    # Moves are created by the thousand during a search, so they use __slots__ instead of a __dict__ per instance
+    __slots__ = ('startRank', 'startFile', 'endRank', 'endFile', 'pieceMoved', 'pieceCaptured', 'enPassant', 'castle',
+                 'promotionPiece', 'moveID')
+
+    def __init__(self, startSq, endSq, board, promotionPiece=''):
         self.startRank = startSq[0]
         self.startFile = startSq[1]
         self.endRank = endSq[0]
@@ -851,9 +1219,27 @@ class Move:
         self.enPassant = ()  # Holds location of pawn being captured
         # Holds start and end location of rook being castled ((startRank, startFile), (endRank, endFile))
         self.castle = ()
-        self.castlingRights = ()  # This will preserve the castling rights of the player if move in undone
-        self.moveID = self.startRank * 1000 + self.startFile * 100 + self.endRank * 10 + self.endFile
-        # print(self.moveID)
+        # Piece a pawn reaching the last rank turns into (e.g. 'wQ'). Defaults to a queen
+        if self.pieceMoved[1] == 'P' and (self.endRank == 0 or self.endRank == 7) and not promotionPiece:
+            promotionPiece = self.pieceMoved[0] + 'Q'
+        self.promotionPiece = promotionPiece
+        # Integer encoding of the move: bits 0-5 start square, bits 6-11 end square (square = rank * 8 + file) and bits
+        # 12-14 promotion piece. It identifies the move in a position, so it is used for equality and hashing
+        self.moveID = (self.startRank * 8 + self.startFile) | (self.endRank * 8 + self.endFile) << 6 | \
+            self.promotionIDs[promotionPiece[1:]] << 12
+
+    '''
+    Builds the move encoded by moveID in the position board. Castling and en passant details are not part of the
+    encoding, so the result should be matched against get_valid_moves before it is made
+    '''
+
+    @classmethod
+    def from_id(cls, moveID, board):
+        startSq = divmod(moveID & 63, 8)
+        endSq = divmod(moveID >> 6 & 63, 8)
+        promotion = cls.promotionPieces[moveID >> 12 & 7]
+        pieceMoved = board[startSq[0]][startSq[1]]
+        return cls(startSq, endSq, board, pieceMoved[0] + promotion if promotion else '')
 
     '''
     Overwriting the equals method
@@ -864,9 +1250,16 @@ class Move:
             return self.moveID == other.moveID
         return False
 
+    # Equal moves have equal moveIDs, so moves can be kept in sets and used as dict keys
+    def __hash__(self):
+        return self.moveID
+
     def get_chess_notation(self):
         # you can add to make this like real chess notation
-        return self.get_rank_file(self.startRank, self.startFile) + self.get_rank_file(self.endRank, self.endFile)
+        notation = self.get_rank_file(self.startRank, self.startFile) + self.get_rank_file(self.endRank, self.endFile)
+        if self.promotionPiece:
+            notation += self.promotionPiece[1].lower()
+        return notation
 
     def get_rank_file(self, r, c):
         return self.colsToFiles[c] + self.rowsToRanks[r]
@@ -3,12 +3,21 @@ user input."""
 
 import pygame as p
 import ChessEngine
+import BitboardEngine
+import SearchThread
 
 WIDTH = HEIGHT = 720
 DIMENSION = 8  # Chess Board has dimensions 8x8.
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15  # For animations later on
 IMAGES = {}
+# Backend holding the state of the game. Both have the same interface, BitboardEngine generates moves with bitboards
+USE_BITBOARDS = False
+GAME_STATE = BitboardEngine.game_state if USE_BITBOARDS else ChessEngine.game_state
+PLAYER_ONE = True  # True if a human plays white, False if the engine does
+PLAYER_TWO = False  # Same for black
+ENGINE_TIME = 2.0  # Seconds the engine thinks per move
+PONDER = True  # The engine thinks about its next move on the human's time
 
 '''
 Initialize a global dictionary of images. This will be called exactly once in the main
@@ -32,7 +41,7 @@ def main():
     screen = p.display.set_mode((WIDTH, HEIGHT))
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
-    gs = ChessEngine.game_state()
+    gs = GAME_STATE()
     validMoves = gs.get_valid_moves()
     moveMade = False  # Flag variable for when a move is made
     animate = False  # Flag variable for when we should animate
@@ -41,13 +50,17 @@ def main():
     sqSelected = ()  # no square is selected initially. Keeps track of user's last click (tuple: (# rank, file))
     player_clicks = []  # keep track of player clicks (two tuples: [(6,4), (4,4)])
     gameOver = False
+    searchThread = None  # Engine search running in the background
+    ponderThread = None  # Search of the position after the human move the engine expects
+    thinking = None  # Last depth the engine search reported: (depth, score, nodes, seconds, principal variation)
     while running:
+        humanTurn = (gs.whiteToMove and PLAYER_ONE) or (not gs.whiteToMove and PLAYER_TWO)
         for e in p.event.get():
             if e.type == p.QUIT:
                 running = False
             # mouse handler
             elif e.type == p.MOUSEBUTTONDOWN:
-                if not gameOver:
+                if not gameOver and humanTurn:
                     location = p.mouse.get_pos()  # (x, y) location of mouse
                     file = location[0] // SQ_SIZE
                     rank = location[1] // SQ_SIZE
@@ -60,7 +73,9 @@ def main():
                     if len(player_clicks) == 2:  # after the 2nd click
                         move = ChessEngine.Move(player_clicks[0], player_clicks[1], gs.board)
                         print(move.get_chess_notation())
-                        if move in validMoves:
+                        if move in validMoves:  # A pawn reaching the last rank is matched as a queen promotion
+                            # The generated move knows whether it castles or captures en passant
+                            move = validMoves[validMoves.index(move)]
                             pawnPromotion = (move.pieceMoved[1] == 'P') and (move.endRank == 7 or move.endRank == 0)
                             if pawnPromotion:
                                 allyColor = move.pieceMoved[0]
@@ -69,8 +84,9 @@ def main():
                                 if not result:
                                     running = False
                                 elif result in promotionPieces:
-                                    gs.promotePawn = result
-                                    gs.make_move(move)
+                                    promotionMove = ChessEngine.Move(player_clicks[0], player_clicks[1], gs.board,
+                                                                     result)
+                                    gs.make_move(validMoves[validMoves.index(promotionMove)])
                                     moveMade = True
                                     sqSelected = ()
                                     player_clicks = []
@@ -89,12 +105,25 @@ def main():
                             player_clicks = [sqSelected]
             # key handler
             elif e.type == p.KEYDOWN:
+                if e.key == p.K_u or e.key == p.K_r:  # The engine stops thinking about the old position
+                    for thread in (searchThread, ponderThread):
+                        if thread is not None:
+                            thread.stop()
+                    searchThread = None
+                    ponderThread = None
+                    thinking = None
+                    gameOver = False
                 if e.key == p.K_u:  # undo move when 'u' is pressed
-                    gs.undo_move()
+                    if gs.moveLog:
+                        gs.undo_move()
+                    # Against the engine, take back its reply too, so it is the human's turn again
+                    if (PLAYER_ONE or PLAYER_TWO) and gs.moveLog and \
+                            not ((gs.whiteToMove and PLAYER_ONE) or (not gs.whiteToMove and PLAYER_TWO)):
+                        gs.undo_move()
                     moveMade = True
                     animate = False
                 if e.key == p.K_r:  # reset the board when 'r' is pressed
-                    gs = ChessEngine.game_state()
+                    gs = GAME_STATE()
                     validMoves = gs.get_valid_moves()
                     sqSelected = ()
                     player_clicks = []
@@ -106,8 +135,49 @@ def main():
             validMoves = gs.get_valid_moves()
             moveMade = False
 
-        draw_game_state(screen, gs, validMoves, sqSelected)
+        # Engine move. The search runs in a background thread, the loop only collects its result
+        elif not gameOver and not humanTurn:
+            if searchThread is None:
+                if ponderThread is not None and gs.moveLog[-1] == ponderThread.ponderMove:  # Ponder hit
+                    searchThread = ponderThread
+                    searchThread.ponder_hit(ENGINE_TIME)
+                else:
+                    if ponderThread is not None:
+                        ponderThread.stop()
+                    searchThread = SearchThread.SearchThread(gs, timeLimit=ENGINE_TIME)
+                    searchThread.start()
+                ponderThread = None
+            for message in searchThread.poll():
+                if message[0] == "info":
+                    thinking = message[1:]
+                elif message[0] == "bestmove":
+                    searchThread = None
+                    thinking = None
+                    gs.make_move(validMoves[validMoves.index(message[1])])
+                    moveMade = True
+                    animate = True
+                    principalVariation = message[2]
+                    humanNext = (gs.whiteToMove and PLAYER_ONE) or (not gs.whiteToMove and PLAYER_TWO)
+                    if PONDER and humanNext and len(principalVariation) > 1:
+                        ponderThread = SearchThread.SearchThread(gs, ponderMove=principalVariation[1])
+                        ponderThread.start()
 
+        draw_game_state(screen, gs, validMoves, sqSelected)
+        if searchThread is not None:
+            nodes, nodesPerSecond = searchThread.progress()
+            text = "Thinking: %d nodes, %.0f nodes/s" % (nodes, nodesPerSecond)
+            if thinking is not None:
+                text += ", depth %d, score %+.2f, %s" % (thinking[0], thinking[1] / 100,
+                                                           " ".join(move.get_chess_notation() for move in thinking[4]))
+            draw_status(screen, text)
+        elif ponderThread is not None:
+            nodes, nodesPerSecond = ponderThread.progress()
+            draw_status(screen, "Pondering on %s: %d nodes, %.0f nodes/s" % (
+                ponderThread.ponderMove.get_chess_notation(), nodes, nodesPerSecond))
+
+        if (gs.checkMate or gs.staleMate) and ponderThread is not None:  # The human ended the game
+            ponderThread.stop()
+            ponderThread = None
         if gs.checkMate:
             gameOver = True
             if gs.whiteToMove:
@@ -275,6 +345,21 @@ def animate_move(screen, move, board, clock):
         clock.tick(60)
 
 
+'''
+Writes a line of text in a strip along the bottom of the board, used to show what the engine is doing
+'''
+
+
+def draw_status(screen, text):
+    font = p.font.SysFont("Helvetica", 16, True, False)
+    textObject = font.render(text, True, p.Color("Black"))
+    strip = p.Surface((WIDTH, textObject.get_height() + 6))
+    strip.set_alpha(180)
+    strip.fill(p.Color("light grey"))
+    screen.blit(strip, (0, HEIGHT - strip.get_height()))
+    screen.blit(textObject, (4, HEIGHT - strip.get_height() + 3))
+
+
 '''
 Writes text on the board
 '''
@@ -0,0 +1,169 @@
+"""This module reads and builds opening books. A book is a binary file of 16 byte entries in the layout of Polyglot
+books: position key (8 bytes), move (2 bytes), weight (2 bytes) and learn (4 bytes, unused), big-endian and sorted by
+key. The key is game_state.zobristKey, so books are built with this module rather than taken from other programs. The
+file is memory-mapped and binary searched, so it is never read into memory as a whole. Run it as a script:
+
+    python OpeningBook.py build book.bin games.pgn [more.pgn ...] [--plies 20]
+    python OpeningBook.py show book.bin [e2e4 e7e5 ...]"""
+
+import argparse
+import mmap
+import random
+import struct
+import sys
+import ChessEngine
+import PGN
+
+ENTRY = struct.Struct(">QHHI")
+BOOK_PLIES = 20  # Number of plies of every game that are added to a book
+MAX_WEIGHT = 0xFFFF
+# Promotion piece field of a book move
+BOOK_PROMOTIONS = {'': 0, 'N': 1, 'B': 2, 'R': 3, 'Q': 4}
+# Points of a game result for the side that played the move, as Polyglot counts them: win 2, draw 1, loss 0
+RESULT_POINTS = {"1-0": {'w': 2, 'b': 0}, "0-1": {'w': 0, 'b': 2}, "1/2-1/2": {'w': 1, 'b': 1}}
+
+'''
+Encodes a move as a book move: target file in bits 0-2, target rank in 3-5, start file in 6-8, start rank in 9-11 and
+promotion piece in 12-14. Ranks count from white's first rank. Castling is written as the king taking its own rook
+'''
+
+
+def encode_move(move):
+    endFile = move.endFile
+    if move.castle:
+        endFile = 7 if move.endFile > move.startFile else 0
+    return endFile | (7 - move.endRank) << 3 | move.startFile << 6 | (7 - move.startRank) << 9 | \
+        BOOK_PROMOTIONS[move.promotionPiece[1:]] << 12
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.entries = 0
+        self.data = None
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.entries = len(self.data) // ENTRY.size
+        except ValueError:  # An empty file cannot be mapped
+            pass
+
+    '''
+    Returns the (move, weight, learn) of every entry for key, found by binary search
+    '''
+
+    def find_entries(self, key):
+        low, high = 0, self.entries
+        while low < high:  # First entry with a key not below key
+            middle = (low + high) // 2
+            if ENTRY.unpack_from(self.data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.entries:
+            entryKey, move, weight, learn = ENTRY.unpack_from(self.data, low * ENTRY.size)
+            if entryKey != key:
+                break
+            entries.append((move, weight, learn))
+            low += 1
+        return entries
+
+    '''
+    Returns the book moves of the position as (move, weight), matched against validMoves
+    '''
+
+    def get_moves(self, gs, validMoves):
+        movesByCode = {encode_move(move): move for move in validMoves}
+        return [(movesByCode[code], weight) for code, weight, _ in self.find_entries(gs.zobristKey)
+                if code in movesByCode and weight > 0]
+
+    '''
+    Picks one of the book moves of the position at random, in proportion to their weights. Returns None if the position
+    is not in the book
+    '''
+
+    def choose_move(self, gs, validMoves, rng=random):
+        bookMoves = self.get_moves(gs, validMoves)
+        if not bookMoves:
+            return None
+        return rng.choices([move for move, _ in bookMoves], [weight for _, weight in bookMoves])[0]
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+        self.file.close()
+
+
+'''
+Builds a book from PGN files. The first plies of every game are replayed and every move scores points by the result of
+the game (win 2, draw 1, loss 0 for the side that played it). Moves that scored no points are left out, and the weights
+are scaled down if the largest one does not fit in 16 bits. Returns the number of games and entries
+'''
+
+
+def build_book(pgnPaths, bookPath, plies=BOOK_PLIES, gameState=ChessEngine.game_state):
+    points = {}  # (key, book move) -> points
+    games = 0
+    for pgnPath in pgnPaths:
+        with open(pgnPath, encoding="utf-8", errors="replace") as pgnFile:
+            for tags, sanMoves in PGN.read_games(pgnFile):
+                if "FEN" in tags or tags.get("Result") not in RESULT_POINTS:
+                    continue  # Only games from the start position with a known result
+                games += 1
+                resultPoints = RESULT_POINTS[tags["Result"]]
+                gs = gameState()
+                for san in sanMoves[:plies]:
+                    move = PGN.read_san(gs, san)
+                    if move is None:  # Stop at a move that cannot be read or is not legal
+                        break
+                    entry = (gs.zobristKey, encode_move(move))
+                    points[entry] = points.get(entry, 0) + resultPoints['w' if gs.whiteToMove else 'b']
+                    gs.make_move(move)
+
+    entries = [(key, code, weight) for (key, code), weight in points.items() if weight > 0]
+    largest = max((weight for _, _, weight in entries), default=0)
+    if largest > MAX_WEIGHT:
+        entries = [(key, code, max(1, weight * MAX_WEIGHT // largest)) for key, code, weight in entries]
+    entries.sort(key=lambda entry: (entry[0], -entry[2]))
+    with open(bookPath, "wb") as bookFile:
+        for key, code, weight in entries:
+            bookFile.write(ENTRY.pack(key, code, weight, 0))
+    return games, len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect an opening book")
+    commands = parser.add_subparsers(dest="command", required=True)
+    buildParser = commands.add_parser("build", help="build a book from PGN files")
+    buildParser.add_argument("book")
+    buildParser.add_argument("pgn", nargs="+")
+    buildParser.add_argument("--plies", type=int, default=BOOK_PLIES, help="plies of every game added to the book")
+    showParser = commands.add_parser("show", help="list the book moves of a position")
+    showParser.add_argument("book")
+    showParser.add_argument("moves", nargs="*", help="moves from the start position, e.g. e2e4 e7e5")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        games, entries = build_book(args.pgn, args.book, args.plies)
+        print("%d games, %d entries written to %s" % (games, entries, args.book))
+        return 0
+    gs = ChessEngine.game_state()
+    for notation in args.moves:
+        move = next((move for move in gs.get_valid_moves() if move.get_chess_notation() == notation), None)
+        if move is None:
+            print("Illegal move: " + notation)
+            return 1
+        gs.make_move(move)
+    book = OpeningBook(args.book)
+    bookMoves = book.get_moves(gs, gs.get_valid_moves())
+    book.close()
+    total = sum(weight for _, weight in bookMoves)
+    for move, weight in sorted(bookMoves, key=lambda bookMove: -bookMove[1]):
+        print("%-6s %6d %5.1f%%" % (move.get_chess_notation(), weight, 100 * weight / total))
+    if not bookMoves:
+        print("Position not in book")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
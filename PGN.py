@@ -0,0 +1,333 @@
+"""This module reads and writes games in Portable Game Notation (PGN) with moves in standard algebraic notation (SAN).
+Games are read from a file one at a time, so files of any size are read with the memory of a single game. Run it as a
+script to replay every game of PGN files, checking that all moves are legal, and optionally write them out again:
+
+    python PGN.py games.pgn [more.pgn ...] [--output checked.pgn] [--backend bitboards]"""
+
+import argparse
+import copy
+import re
+import sys
+import time
+import ChessEngine
+import Perft
+
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+TAG_PATTERN = re.compile(r'\[(\w+)\s+"(.*)"\]')
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+# The Seven Tag Roster, written first and in this order by write_game
+ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+LINE_LENGTH = 80  # Longest line of move text written
+
+'''
+Finds the move of validMoves written in standard algebraic notation (e.g. "Nbd7", "exd5", "e8=Q", "O-O"). Returns None
+if there is no such move, or if the notation fits more than one
+'''
+
+
+def move_from_san(san, validMoves):
+    san = san.rstrip("+#!?")
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        for move in validMoves:
+            if move.castle and (move.endFile == 6) == (len(san) == 3):
+                return move
+        return None
+    match = SAN_PATTERN.match(san)
+    if match is None:
+        return None
+    piece, fromFile, fromRank, target, promotion = match.groups()
+    endRank = ChessEngine.Move.ranksToRows[target[1]]
+    endFile = ChessEngine.Move.filesToCols[target[0]]
+    candidates = [move for move in validMoves if move.pieceMoved[1] == (piece or 'P') and move.endRank == endRank and
+                  move.endFile == endFile and move.promotionPiece[1:] == (promotion or '') and
+                  (fromFile is None or move.startFile == ChessEngine.Move.filesToCols[fromFile]) and
+                  (fromRank is None or move.startRank == ChessEngine.Move.ranksToRows[fromRank])]
+    return candidates[0] if len(candidates) == 1 else None
+
+
+'''
+Finds the legal move written as san in the position of gs, or None. Instead of generating all moves, the squares the
+piece can have come from are looked up from the target square and each is checked with gs.legal_move_from_id. Castling
+and pawn captures onto an empty square (which may be en passant) are matched against get_valid_moves
+'''
+
+
+def read_san(gs, san):
+    match = SAN_PATTERN.match(san.rstrip("+#!?"))
+    if match is None:
+        return move_from_san(san, gs.get_valid_moves())
+    piece, fromFile, fromRank, target, promotion = match.groups()
+    piece = piece or 'P'
+    endRank = ChessEngine.Move.ranksToRows[target[1]]
+    endFile = ChessEngine.Move.filesToCols[target[0]]
+    color = 'w' if gs.whiteToMove else 'b'
+    board = gs.board
+    if piece == 'P':
+        behind = 1 if gs.whiteToMove else -1  # White pawns move towards rank 0
+        if not 0 <= endRank + behind <= 7:
+            return None
+        if fromFile is not None:  # Capture
+            if board[endRank][endFile] == "--":
+                return move_from_san(san, gs.get_valid_moves())
+            origins = [(endRank + behind, ChessEngine.Move.filesToCols[fromFile])]
+        elif board[endRank + behind][endFile] == "--" and 0 <= endRank + 2 * behind <= 7:
+            origins = [(endRank + 2 * behind, endFile)]
+        else:
+            origins = [(endRank + behind, endFile)]
+    elif piece == 'N':
+        origins = ChessEngine.KNIGHT_SQUARES[endRank][endFile]
+    elif piece == 'K':
+        origins = ChessEngine.KING_SQUARES[endRank][endFile]
+    else:
+        origins = []
+        for direction, ray in ChessEngine.RAY_SQUARES[endRank][endFile].items():
+            if piece != 'Q' and (direction[0] != 0 and direction[1] != 0) != (piece == 'B'):
+                continue
+            for rank, file in ray:  # The first piece along the ray
+                if board[rank][file] != "--":
+                    origins.append((rank, file))
+                    break
+    promotionID = ChessEngine.Move.promotionIDs[promotion or '']
+    found = None
+    for rank, file in origins:
+        if board[rank][file] != color + piece or \
+                (fromFile is not None and file != ChessEngine.Move.filesToCols[fromFile]) or \
+                (fromRank is not None and rank != ChessEngine.Move.ranksToRows[fromRank]):
+            continue
+        move = gs.legal_move_from_id(rank * 8 + file | (endRank * 8 + endFile) << 6 | promotionID << 12)
+        if move is not None:
+            if found is not None:  # Ambiguous
+                return None
+            found = move
+    # A pawn capture written without the file ("d5" for exd5) or castling written as a king move ("Kg1")
+    if found is None and (piece == 'K' or piece == 'P' and fromFile is None):
+        return move_from_san(san, gs.get_valid_moves())
+    return found
+
+
+'''
+SAN of move without the check suffix. validMoves are the legal moves of the position the move is made in, used to add
+the start file or rank when another piece of the same kind can reach the same square
+'''
+
+
+def move_to_san(move, validMoves):
+    if move.castle:
+        return "O-O" if move.endFile == 6 else "O-O-O"
+    target = move.get_rank_file(move.endRank, move.endFile)
+    capture = move.pieceCaptured != "--" or bool(move.enPassant)
+    piece = move.pieceMoved[1]
+    if piece == 'P':
+        san = (ChessEngine.Move.colsToFiles[move.startFile] + "x" + target) if capture else target
+        return san + "=" + move.promotionPiece[1] if move.promotionPiece else san
+    rivals = [other for other in validMoves if other.pieceMoved == move.pieceMoved and other.endRank == move.endRank and
+              other.endFile == move.endFile and other.moveID != move.moveID]
+    origin = ""
+    if rivals:
+        if all(other.startFile != move.startFile for other in rivals):
+            origin = ChessEngine.Move.colsToFiles[move.startFile]
+        elif all(other.startRank != move.startRank for other in rivals):
+            origin = ChessEngine.Move.rowsToRanks[move.startRank]
+        else:
+            origin = move.get_rank_file(move.startRank, move.startFile)
+    return piece + origin + ("x" if capture else "") + target
+
+
+'''
+Reads the games of a PGN file one at a time. Yields (tags, list of moves in SAN) for every game. A game without a Result
+tag gets the termination marker its move text ends with as its result. Only the move text of the current game is kept
+in memory. The lines of move text keep their line breaks, since a ; comment ends at the end of its line, and a line
+inside a {...} comment is never taken for a tag
+'''
+
+
+def read_games(pgnFile):
+    tags = {}
+    moveText = []
+    inComment = False  # Inside a {...} comment that goes on to the next line
+    for line in pgnFile:
+        line = line.strip()
+        if not inComment and line.startswith("["):
+            if moveText:  # A tag after move text starts the next game
+                yield game_from_text(tags, moveText)
+                tags, moveText = {}, []
+            tagMatch = TAG_PATTERN.match(line)
+            if tagMatch:
+                tags[tagMatch.group(1)] = tagMatch.group(2)
+        elif line and (inComment or not line.startswith("%")):
+            moveText.append(line)
+            inComment = comment_open(line, inComment)
+    if tags or moveText:
+        yield game_from_text(tags, moveText)
+
+
+'''
+(tags, moves) of a game read by read_games from its tags and lines of move text
+'''
+
+
+def game_from_text(tags, moveText):
+    sanMoves, result = parse_move_text("\n".join(moveText))
+    if result is not None and "Result" not in tags:
+        tags["Result"] = result
+    return tags, sanMoves
+
+
+'''
+True if a {...} comment is still open at the end of line. inComment tells if one was open at its start. Braces after a
+; comment are part of that comment
+'''
+
+
+def comment_open(line, inComment):
+    for symbol in line:
+        if inComment:
+            inComment = symbol != "}"
+        elif symbol == "{":
+            inComment = True
+        elif symbol == ";":
+            break
+    return inComment
+
+
+'''
+Strips comments, variations, move numbers and annotations from PGN move text. Returns the moves and the game
+termination marker ("1-0", "0-1", "1/2-1/2" or "*"), or None if the move text has none
+'''
+
+
+def parse_move_text(text):
+    text = re.sub(r"\{[^}]*\}|;[^\n]*", " ", text)
+    while "(" in text:  # Innermost variations first, so nested variations are removed too
+        stripped = re.sub(r"\([^()]*\)", " ", text)
+        if stripped == text:
+            break
+        text = stripped
+    moves = []
+    result = None
+    for token in text.split():
+        token = re.sub(r"^\d+\.+", "", token)
+        if token in RESULTS:
+            result = token
+        elif token and not token.startswith("$") and token != "e.p.":
+            moves.append(token)
+    return moves, result
+
+
+'''
+Replays a game read by read_games on a new game state (from the FEN tag if there is one) and returns it. Raises
+ValueError at the first move that is not legal
+'''
+
+
+def replay_game(tags, sanMoves, gameState=ChessEngine.game_state):
+    gs = gameState.from_fen(tags["FEN"]) if "FEN" in tags else gameState()
+    for san in sanMoves:
+        move = read_san(gs, san)
+        if move is None:
+            raise ValueError("Illegal move %s after %s" % (san, " ".join(sanMoves[:len(gs.moveLog)]) or "the start"))
+        gs.make_move(move)
+    return gs
+
+
+'''
+SAN of every move in gs.moveLog, with "+" for check and "#" for mate. The moves are replayed on a copy of gs
+'''
+
+
+def game_san(gs):
+    start = copy.deepcopy(gs)
+    while start.moveLog:
+        start.undo_move()
+    startFen = start.get_fen()
+    sanMoves = []
+    validMoves = start.get_valid_moves()
+    for move in gs.moveLog:
+        san = move_to_san(move, validMoves)
+        start.make_move(move)
+        validMoves = start.get_valid_moves()
+        if start.in_check():
+            san += "#" if not validMoves else "+"
+        sanMoves.append(san)
+    return startFen, sanMoves
+
+
+'''
+PGN text of the game in gs. tags are added to the Seven Tag Roster, which is filled with "?" where it is missing. The
+result is taken from tags, or from the position if the game ended in mate or stalemate
+'''
+
+
+def write_game(gs, tags=None):
+    tags = dict(tags or {})
+    startFen, sanMoves = game_san(gs)
+    if "Result" not in tags:
+        ended = not gs.get_valid_moves()  # Also sets checkMate and staleMate
+        tags["Result"] = ("0-1" if gs.whiteToMove else "1-0") if gs.checkMate else "1/2-1/2" if ended else "*"
+    tags.pop("SetUp", None)
+    tags.pop("FEN", None)
+    if startFen != ChessEngine.START_FEN:  # SetUp comes right before FEN
+        tags.update(SetUp="1", FEN=startFen)
+    lines = ['[%s "%s"]' % (name, tags.get(name, "?")) for name in ROSTER]
+    lines += ['[%s "%s"]' % (name, value) for name, value in tags.items() if name not in ROSTER]
+    lines.append("")
+
+    fields = startFen.split()
+    whiteToMove, moveNumber = fields[1] == 'w', int(fields[5])
+    tokens = []
+    for i, san in enumerate(sanMoves):
+        if whiteToMove:
+            tokens.append("%d. %s" % (moveNumber, san))
+        else:
+            tokens.append(("%d... %s" % (moveNumber, san)) if i == 0 else san)
+            moveNumber += 1
+        whiteToMove = not whiteToMove
+    tokens.append(tags["Result"])
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay and check the games of PGN files")
+    parser.add_argument("pgn", nargs="+")
+    parser.add_argument("--output", help="write the games that replayed without errors to this PGN file")
+    parser.add_argument("--backend", choices=Perft.BACKENDS.keys(), default="list")
+    args = parser.parse_args()
+    gameState = Perft.BACKENDS[args.backend]
+
+    games = plies = errors = 0
+    output = open(args.output, "w") if args.output else None
+    start = time.perf_counter()
+    try:
+        for pgnPath in args.pgn:
+            with open(pgnPath, encoding="utf-8", errors="replace") as pgnFile:
+                for tags, sanMoves in read_games(pgnFile):
+                    games += 1
+                    try:
+                        gs = replay_game(tags, sanMoves, gameState)
+                    except ValueError as error:
+                        errors += 1
+                        print("%s game %d (%s - %s): %s" % (pgnPath, games, tags.get("White", "?"),
+                                                            tags.get("Black", "?"), error))
+                        continue
+                    plies += len(gs.moveLog)
+                    if output is not None:
+                        output.write(write_game(gs, tags) + "\n")
+    finally:
+        if output is not None:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print("%d games, %d plies, %d with errors in %.2f s (%.0f games/s, %.0f plies/s)" % (
+        games, plies, errors, elapsed, games / elapsed if elapsed > 0 else 0, plies / elapsed if elapsed > 0 else 0))
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""This module searches the root position with several processes at once (root splitting). The moves of the root are
+shared out between a pool of worker processes. Every worker runs the iterative deepening search of SmartMoveFinder on
+its share of the moves, with its own transposition table, and the best result of the deepest depth that every worker
+completed is returned (workers that stopped on a forced mate keep their mate score at deeper depths). Run it as a script
+to check the results against the search in a single process and measure the speedup over it:
+
+    python ParallelSearch.py [workers] [depth]"""
+
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import time
+import ChessEngine
+import SmartMoveFinder
+import Benchmark
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+SPEEDUP_DEPTH = 4  # Search depth used by measure_speedup
+# Positions check_results searches both ways. In the first, every move of some of the workers loses to a forced mate,
+# so those workers stop after a shallow depth while the others go on
+CHECK_POSITIONS = ["4r1k1/5ppp/8/8/8/2N5/5PPP/3R2K1 w - - 0 1"]
+CHECK_MARGIN = 50  # Centipawns the scores may differ by. The workers order moves with their own transposition tables
+
+pool = None  # Worker processes are kept between searches, so their transposition tables stay warm
+poolWorkers = 0
+
+'''
+Returns a pool with the given number of worker processes, starting a new one if the number changed
+'''
+
+
+def get_pool(workers):
+    global pool, poolWorkers
+    if pool is None or poolWorkers != workers:
+        close_pool()
+        pool = multiprocessing.Pool(workers)
+        poolWorkers = workers
+    return pool
+
+
+def close_pool():
+    global pool, poolWorkers
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+    pool = None
+    poolWorkers = 0
+
+
+'''
+Runs in a worker process. Searches the root moves whose moveID is in moveIDs and returns
+({depth: (score, principal variation, moveID of the best move)}, nodes searched)
+'''
+
+
+def search_root_moves(task):
+    gs, moveIDs, maxDepth, timeLimit, nodeLimit = task
+    validMoves = [move for move in gs.get_valid_moves() if move.moveID in moveIDs]
+    results = {}
+
+    def record_depth(depth, score, nodes, seconds, principalVariation):
+        results[depth] = (score, principalVariation, SmartMoveFinder.nextMove.moveID)
+
+    with contextlib.redirect_stdout(io.StringIO()):  # The per depth lines of the workers would be mixed up
+        SmartMoveFinder.find_best_move_min_max(gs, validMoves, maxDepth, timeLimit, nodeLimit, record_depth)
+    return results, SmartMoveFinder.counter
+
+
+'''
+Parallel version of SmartMoveFinder.find_best_move_min_max with the same limits. nodeLimit is shared out between the
+workers. The nodes searched, the completed depth, the score and the principal variation are left in counter,
+completedDepth, bestScore and principalVariation
+'''
+
+
+def find_best_move_parallel(gs, validMoves, workers=DEFAULT_WORKERS, maxDepth=None, timeLimit=None, nodeLimit=None):
+    global counter, completedDepth, bestScore, principalVariation
+    if workers <= 1 or len(validMoves) <= 1:
+        bestMove = SmartMoveFinder.find_best_move_min_max(gs, validMoves, maxDepth, timeLimit, nodeLimit)
+        counter = SmartMoveFinder.counter
+        completedDepth = SmartMoveFinder.completedDepth
+        bestScore = SmartMoveFinder.bestScore
+        principalVariation = SmartMoveFinder.principalVariation
+        return bestMove
+
+    # Captures are dealt out first so that every worker gets some of the moves most likely to be best
+    moves = sorted(validMoves, key=SmartMoveFinder.mvv_lva, reverse=True)
+    shares = [moves[i::workers] for i in range(min(workers, len(moves)))]
+    workerNodeLimit = nodeLimit // len(shares) if nodeLimit is not None else None
+    tasks = [(gs, {move.moveID for move in share}, maxDepth, timeLimit, workerNodeLimit) for share in shares]
+    results = get_pool(workers).map(search_root_moves, tasks)
+
+    counter = sum(nodes for _, nodes in results)
+    # A worker that found a forced mate (for or against it) stops early, as the search does in a single process. Its
+    # mate score holds at every deeper depth, so only the other workers decide the depth that all of them completed
+    searching = [max(depthResults) for depthResults, _ in results
+                 if abs(depthResults[max(depthResults)][0]) < SmartMoveFinder.MATE_SCORE]
+    completedDepth = min(searching) if searching else max(max(depthResults) for depthResults, _ in results)
+    bestScore, principalVariation, bestMoveID = max((depthResults.get(completedDepth, depthResults[max(depthResults)])
+                                                     for depthResults, _ in results), key=lambda result: result[0])
+    # Return the caller's move object, not the copy made by the worker. The worker reports its best move apart from the
+    # principal variation, so a move is returned even if the line is empty
+    return next(move for move in validMoves if move.moveID == bestMoveID)
+
+
+'''
+Searches CHECK_POSITIONS with one process and with the given number of workers (at least one per root move by default,
+so some workers get only losing moves) and prints the completed depth and score of both. Returns True if every depth is
+the same and every score is within CHECK_MARGIN
+'''
+
+
+def check_results(workers=None, depth=SPEEDUP_DEPTH):
+    passed = True
+    for fen in CHECK_POSITIONS:
+        gs = ChessEngine.game_state.from_fen(fen)
+        SmartMoveFinder.transpositionTable.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            SmartMoveFinder.find_best_move_min_max(gs, gs.get_valid_moves(), maxDepth=depth)
+        find_best_move_parallel(gs, gs.get_valid_moves(), workers or len(gs.get_valid_moves()), maxDepth=depth)
+        same = completedDepth == SmartMoveFinder.completedDepth and \
+            abs(bestScore - SmartMoveFinder.bestScore) <= CHECK_MARGIN
+        passed = passed and same
+        print("%s: 1 process depth %d score %d, %d workers depth %d score %d %s" % (
+            fen, SmartMoveFinder.completedDepth, SmartMoveFinder.bestScore, poolWorkers, completedDepth, bestScore,
+            "ok" if same else "MISMATCH"))
+    return passed
+
+
+'''
+Searches the benchmark positions with one process and with the given number of workers, and prints the time, nodes
+and speedup. Returns the total speedup
+'''
+
+
+def measure_speedup(workers=DEFAULT_WORKERS, depth=SPEEDUP_DEPTH):
+    get_pool(workers)  # Start the worker processes before timing
+    print("%-18s %10s %10s %10s %10s %8s" % ("position", "1 process", "nodes", str(workers) + " workers", "nodes",
+                                              "speedup"))
+    totalSequential = 0.0
+    totalParallel = 0.0
+    for positionName, moves in Benchmark.BENCHMARK_POSITIONS.items():
+        gs = Benchmark.set_up_position(ChessEngine.game_state, moves)
+        SmartMoveFinder.transpositionTable.clear()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            SmartMoveFinder.find_best_move_min_max(gs, gs.get_valid_moves(), maxDepth=depth)
+        sequentialTime = time.perf_counter() - start
+        sequentialNodes = SmartMoveFinder.counter
+
+        start = time.perf_counter()
+        find_best_move_parallel(gs, gs.get_valid_moves(), workers, maxDepth=depth)
+        parallelTime = time.perf_counter() - start
+
+        totalSequential += sequentialTime
+        totalParallel += parallelTime
+        print("%-18s %9.2fs %10d %9.2fs %10d %7.2fx" % (positionName, sequentialTime, sequentialNodes, parallelTime,
+                                                        counter, sequentialTime / parallelTime))
+    print("\nTotal speedup with %d workers on %d CPUs: %.2fx" % (workers, os.cpu_count() or 1,
+                                                                 totalSequential / totalParallel))
+    return totalSequential / totalParallel
+
+
+if __name__ == "__main__":
+    try:
+        if not check_results(depth=int(sys.argv[2]) if len(sys.argv) > 2 else SPEEDUP_DEPTH):
+            sys.exit(1)
+        measure_speedup(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_WORKERS,
+                        int(sys.argv[2]) if len(sys.argv) > 2 else SPEEDUP_DEPTH)
+    finally:
+        close_pool()
@@ -0,0 +1,146 @@
+"""This module counts the leaf nodes of the move generation tree (perft) to check game_state.get_valid_moves against
+known results, and to measure how fast moves are generated. Run it as a script:
+
+    python Perft.py                     runs the built-in suite of test positions
+    python Perft.py perft 4 [FEN]       counts the nodes to depth 4 from the start position (or FEN)
+    python Perft.py divide 3 [FEN]      counts the nodes to depth 3 below every root move
+
+Add --backend bitboards to any of them to test BitboardEngine instead of ChessEngine."""
+
+import argparse
+import sys
+import time
+import ChessEngine
+import BitboardEngine
+
+BACKENDS = {"list": ChessEngine.game_state, "bitboards": BitboardEngine.game_state}
+START_FEN = ChessEngine.START_FEN
+# Standard test positions and their node counts for depth 1, 2, 3, ... Between them they cover castling (through and
+# out of check, and after the rook is captured), en passant (including en passant that exposes the king), pins, checks,
+# promotions and underpromotions.
+PERFT_POSITIONS = [
+    ("start", START_FEN, [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862, 4085603]),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467, 422333]),
+    ("position 4b", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1", [6, 264, 9467, 422333]),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379, 2103487]),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594]),
+]
+SUITE_NODE_LIMIT = 100000  # The suite searches each position to the deepest depth that has at most this many nodes
+
+'''
+Builds a game state of the given class from a FEN string
+'''
+
+
+def load_fen(fen, gameState=ChessEngine.game_state):
+    return gameState.from_fen(fen)
+
+
+'''
+Number of leaf nodes of the move generation tree to depth
+'''
+
+
+def perft(gs, depth):
+    if depth == 0:
+        return 1
+    moves = gs.get_valid_moves()
+    if depth == 1:  # Counting the moves is enough, there is no need to make them
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += perft(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+
+'''
+Perft split by root move. Returns a list of (move notation, nodes) sorted by notation
+'''
+
+
+def divide(gs, depth):
+    results = []
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        results.append((move.get_chess_notation(), perft(gs, depth - 1)))
+        gs.undo_move()
+    return sorted(results)
+
+
+'''
+Runs perft and returns (nodes, nodes per second)
+'''
+
+
+def timed_perft(gs, depth):
+    start = time.perf_counter()
+    nodes = perft(gs, depth)
+    elapsed = time.perf_counter() - start
+    return nodes, nodes / elapsed if elapsed > 0 else 0.0
+
+
+'''
+Runs every position of PERFT_POSITIONS and compares the node counts with the known results. Returns the number of
+failures
+'''
+
+
+def run_suite(gameState=ChessEngine.game_state, nodeLimit=SUITE_NODE_LIMIT):
+    failures = 0
+    totalNodes = 0
+    totalTime = 0.0
+    for name, fen, expectedCounts in PERFT_POSITIONS:
+        for depth in range(1, len(expectedCounts) + 1):
+            expected = expectedCounts[depth - 1]
+            if expected > nodeLimit and depth > 1:
+                break
+            gs = load_fen(fen, gameState)
+            start = time.perf_counter()
+            nodes = perft(gs, depth)
+            elapsed = time.perf_counter() - start
+            totalNodes += nodes
+            totalTime += elapsed
+            result = "ok" if nodes == expected else "FAIL"
+            if nodes != expected:
+                failures += 1
+            print("%-12s depth %d %10d nodes (expected %10d) %10.0f nps  %s" % (
+                name, depth, nodes, expected, nodes / elapsed if elapsed > 0 else 0.0, result))
+    print("\n%d failures, %d nodes in %.2f s, %.0f nps" % (failures, totalNodes, totalTime,
+                                                          totalNodes / totalTime if totalTime > 0 else 0.0))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft move generation test and benchmark")
+    parser.add_argument("mode", nargs="?", choices=["suite", "perft", "divide"], default="suite")
+    parser.add_argument("depth", nargs="?", type=int, default=3)
+    parser.add_argument("fen", nargs="*", help="position to search, defaults to the start position")
+    parser.add_argument("--backend", choices=BACKENDS.keys(), default="list")
+    parser.add_argument("--node-limit", type=int, default=SUITE_NODE_LIMIT, help="largest perft run by the suite")
+    args = parser.parse_args()
+    gameState = BACKENDS[args.backend]
+
+    if args.mode == "suite":
+        return 1 if run_suite(gameState, args.node_limit) else 0
+    gs = load_fen(" ".join(args.fen) if args.fen else START_FEN, gameState)
+    if args.mode == "divide":
+        start = time.perf_counter()
+        results = divide(gs, args.depth)
+        elapsed = time.perf_counter() - start
+        for notation, nodes in results:
+            print(notation + ": " + str(nodes))
+        total = sum(nodes for _, nodes in results)
+        print("\nMoves: %d\nNodes: %d\nNPS: %.0f" % (len(results), total, total / elapsed if elapsed > 0 else 0.0))
+    else:
+        nodes, nodesPerSecond = timed_perft(gs, args.depth)
+        print("Nodes: %d\nNPS: %.0f" % (nodes, nodesPerSecond))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""This module runs SmartMoveFinder searches in a background thread, so the window keeps handling events while the
+engine thinks. The thread searches a copy of the game state and reports through a queue that the caller polls.
+
+Pondering: after the engine moves, a ponder search can be started on the position after the reply the engine expects.
+It runs without a time limit while the opponent thinks. If the opponent plays the expected move (a ponder hit), the same
+search carries on with a time limit, keeping its completed depths, killer moves, history and transposition table. If
+the opponent plays something else, the search is stopped and a new one is started."""
+
+import copy
+import queue
+import threading
+import time
+import SmartMoveFinder
+
+
+class SearchThread(threading.Thread):
+    '''
+    Searches gs, or the position after ponderMove when pondering. Only one search can run at a time, since the search
+    keeps its state in SmartMoveFinder
+    '''
+
+    def __init__(self, gs, maxDepth=SmartMoveFinder.MAX_DEPTH, timeLimit=None, nodeLimit=None, ponderMove=None):
+        super().__init__(daemon=True)
+        self.gs = copy.deepcopy(gs)  # The search makes and undoes moves on its own copy
+        self.ponderMove = ponderMove
+        if ponderMove is not None:
+            validMoves = self.gs.get_valid_moves()
+            self.gs.make_move(validMoves[validMoves.index(ponderMove)])  # The generated move knows castling etc.
+        self.maxDepth = maxDepth
+        self.timeLimit = None if ponderMove is not None else timeLimit
+        self.nodeLimit = nodeLimit
+        self.stopEvent = threading.Event()
+        self.stopTimer = None
+        self.startTime = None
+        # ("info", depth, score, nodes, seconds, principal variation) after every depth, then
+        # ("bestmove", move, principal variation) when the search ends
+        self.messages = queue.Queue()
+
+    def run(self):
+        self.startTime = time.perf_counter()
+        bestMove = SmartMoveFinder.find_move(self.gs, self.gs.get_valid_moves(), self.maxDepth, self.timeLimit,
+                                             self.nodeLimit, self.report, self.stopEvent)
+        principalVariation = SmartMoveFinder.principalVariation
+        if not principalVariation or principalVariation[0] != bestMove:  # Book and tablebase moves have no line
+            principalVariation = [bestMove]
+        self.messages.put(("bestmove", bestMove, principalVariation))
+
+    def report(self, depth, score, nodes, seconds, principalVariation):
+        self.messages.put(("info", depth, score, nodes, seconds, principalVariation))
+
+    '''
+    Nodes searched so far and nodes per second, read while the search runs. Only one search runs at a time, so the
+    node counter of SmartMoveFinder is this one's
+    '''
+
+    def progress(self):
+        if self.startTime is None:
+            return 0, 0.0
+        elapsed = time.perf_counter() - self.startTime
+        return SmartMoveFinder.counter, SmartMoveFinder.counter / elapsed if elapsed > 0 else 0.0
+
+    '''
+    The opponent played the expected move. The search goes on for timeLimit more seconds
+    '''
+
+    def ponder_hit(self, timeLimit):
+        self.ponderMove = None
+        self.stopTimer = threading.Timer(timeLimit, self.stopEvent.set)
+        self.stopTimer.daemon = True
+        self.stopTimer.start()
+
+    '''
+    Stops the search and waits for the thread to end. The first depth is always finished, which takes a moment
+    '''
+
+    def stop(self):
+        if self.stopTimer is not None:
+            self.stopTimer.cancel()
+        self.stopEvent.set()
+        if self.is_alive():
+            self.join()
+
+    '''
+    Returns all messages that have arrived since the last call
+    '''
+
+    def poll(self):
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
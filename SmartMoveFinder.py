@@ -1,9 +1,47 @@
+import os
 import random
+import time
+import ChessEngine
+import Evaluation
+import OpeningBook
+import Tablebase
+from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
 
 pieceScore = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "P": 1}
-CHECKMATE = 10000
+CHECKMATE = 100000  # Positions are scored in centipawns (see Evaluation), mate is worth more than any material
+# In the search a mate scores CHECKMATE less the plies from the root to the mate, so a faster mate scores higher. Scores
+# beyond MATE_SCORE are mates
+MATE_SCORE = CHECKMATE - 1000
 STALEMATE = 0
 DEPTH = 3
+TT_SIZE = 2 ** 18  # Number of transposition table entries. Raise it if the hit rate drops in long searches
+transpositionTable = TranspositionTable(TT_SIZE)
+TIME_CHECK_INTERVAL = 256  # Nodes searched between looks at the clock
+MAX_PLY = 64  # Deepest ply killer moves are kept for
+MAX_DEPTH = MAX_PLY // 2 - 1  # Deepest iteration. Check extensions can double the depth, so it has to fit in MAX_PLY
+QUIESCENCE_DEPTH = 8  # Most captures searched after the last full depth move
+ASPIRATION_WINDOW = 50  # Half width in centipawns of the root window around the score of the previous depth
+DELTA_MARGIN = 200  # A capture must be able to raise the score to within this many centipawns of alpha to be searched
+# Move ordering heuristics. Each can be switched off to measure how many nodes it saves (see Benchmark.py ordering)
+MOVE_ORDERING = {"hash move": True, "mvv-lva": True, "killers": True, "history": True}
+# Selective search. Each can be switched off like the move ordering heuristics (see Benchmark.py pruning)
+SEARCH_FEATURES = {"null move": True, "late move reductions": True, "check extensions": True}
+NULL_MOVE_REDUCTION = 2  # The null move is searched this many plies less deep than a normal move
+NULL_MOVE_MIN_DEPTH = 3
+LMR_MIN_DEPTH = 3  # Late move reductions are only done with at least this much depth left
+LMR_MOVES = 3  # Number of moves searched at full depth before the later quiet moves are reduced
+# Opening book consulted by find_move before searching (build one with OpeningBook.py). It is opened on first use
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+USE_BOOK = True
+openingBook = None
+# Endgame tablebases (build them with Tablebase.py). Positions they cover are looked up instead of searched
+USE_TABLEBASES = True
+# Results of the last search, read by callers after find_best_move_min_max. They exist before the first search too,
+# since find_move can return a book or tablebase move without searching
+counter = 0
+completedDepth = 0
+bestScore = 0
+principalVariation = []
 
 '''
 Computer does a random move from list of validMoves
@@ -26,9 +64,9 @@ def find_best_move(gs, validMoves):
         for opponentsMove in opponentsMoves:
             gs.make_move(opponentsMove)
             gs.get_valid_moves()
-            if gs.checkmate:
+            if gs.checkMate:
                 score = -turnMultiplier * CHECKMATE
-            elif gs.stalemate:
+            elif gs.staleMate:
                 score = STALEMATE
             else:
                 score = -turnMultiplier * score_material(gs.board)
@@ -43,81 +81,405 @@ def find_best_move(gs, validMoves):
 
 
 '''
-Finds best move using min-max algorithm
+Resizes the transposition table. The size is the number of entries
 '''
 
 
-def find_best_move_min_max(gs, validMoves):
-    global counter
+def set_transposition_table_size(size):
+    global transpositionTable
+    transpositionTable = TranspositionTable(size)
+
+
+'''
+Raised inside min_max when the time or node limit of the search is reached
+'''
+
+
+class SearchAborted(Exception):
+    pass
+
+
+'''
+Returns a move from the opening book picked at random by weight, or None if the position is not in the book or there is
+no book file
+'''
+
+
+def find_book_move(gs, validMoves):
+    global openingBook
+    if not USE_BOOK:
+        return None
+    if openingBook is None:
+        if not os.path.exists(BOOK_FILE):
+            return None
+        openingBook = OpeningBook.OpeningBook(BOOK_FILE)
+    return openingBook.choose_move(gs, validMoves)
+
+
+'''
+Returns the move the tablebases rate best: the fastest mate when winning, a draw if there is one, otherwise the slowest
+loss. Returns None if the position or one of the positions after the moves cannot be looked up
+'''
+
+
+def find_tablebase_move(gs, validMoves):
+    if not USE_TABLEBASES or Tablebase.probe(gs) is None:
+        return None
+    bestMove = None
+    bestKey = None
+    for move in validMoves:
+        gs.make_move(move)
+        result = Tablebase.probe(gs)
+        gs.undo_move()
+        if result is None:
+            return None
+        opponentResult, plies = result
+        key = (-opponentResult, -plies if opponentResult < 0 else plies)
+        if bestKey is None or key > bestKey:
+            bestMove = move
+            bestKey = key
+    return bestMove
+
+
+'''
+Score of a tablebase result for the side to move. Wins score below CHECKMATE and lower the further away the mate is
+'''
+
+
+def tablebase_score(result, ply):
+    outcome, plies = result
+    return outcome * (CHECKMATE - ply - plies) if outcome else STALEMATE
+
+
+'''
+Mate scores count the plies from the root, so the same position reached at another ply has another score. The
+transposition table keeps them counted from the position itself, and they are converted on the way in and out
+'''
+
+
+def score_to_table(score, ply):
+    if score >= MATE_SCORE:
+        return score + ply
+    if score <= -MATE_SCORE:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    if score >= MATE_SCORE:
+        return score - ply
+    if score <= -MATE_SCORE:
+        return score + ply
+    return score
+
+
+'''
+Plays a tablebase move in endgames the tablebases cover and a book move if there is one, otherwise searches with
+find_best_move_min_max and the same limits
+'''
+
+
+def find_move(gs, validMoves, maxDepth=None, timeLimit=None, nodeLimit=None, infoCallback=None, stopEvent=None):
+    tablebaseMove = find_tablebase_move(gs, validMoves)
+    if tablebaseMove is not None:
+        return tablebaseMove
+    bookMove = find_book_move(gs, validMoves)
+    if bookMove is not None:
+        return bookMove
+    return find_best_move_min_max(gs, validMoves, maxDepth, timeLimit, nodeLimit, infoCallback, stopEvent)
+
+
+'''
+Finds best move using min-max algorithm with iterative deepening. Every depth up to maxDepth is searched to the end
+before the next one starts, and the transposition table makes the best move of one depth the first move searched at the
+next. maxDepth defaults to MAX_DEPTH when there is a timeLimit or nodeLimit, so the limit decides how deep the search
+goes, and to DEPTH otherwise. If timeLimit (seconds) or nodeLimit is reached in the middle of a depth, the moves made so
+far are undone and the best move of the last completed depth is returned. The same happens when stopEvent (a
+threading.Event) is set by another thread. infoCallback, if given, is called after every completed depth with
+(depth, score, nodes, seconds, principal variation)
+'''
+
+
+def find_best_move_min_max(gs, validMoves, maxDepth=None, timeLimit=None, nodeLimit=None, infoCallback=None,
+                           stopEvent=None):
+    global counter, nextMove, rootDepth, completedDepth, deadline, maxNodes, killerMoves, historyTable, pvTable
+    global principalVariation, bestScore, searchStop
     counter = 0
+    completedDepth = 0
+    principalVariation = []  # Best line found by the last completed depth, starting with the move returned
+    bestScore = 0
+    # pvTable[ply] is the best line found from ply onwards in the node being searched at that ply
+    pvTable = [[] for _ in range(MAX_PLY + 1)]
+    killerMoves = [[None, None] for _ in range(MAX_PLY)]  # Two quiet moves per ply that caused a cutoff, newest first
+    # Cutoff counts of quiet moves indexed by piece, rank and file of the target square
+    historyTable = {piece: [[0] * 8 for _ in range(8)] for piece in ChessEngine.PIECE_NAMES}
+    random.shuffle(validMoves)  # Equally good moves are picked at random
+    transpositionTable.new_search()
     turnScalar = 1 if gs.whiteToMove else -1  # This will scale move calculation according to player's turn
-    bestMoves = min_max(gs, validMoves, DEPTH, -CHECKMATE, CHECKMATE, turnScalar)  # List of equally best moves if
-    # there are multiple
-    randomInt = random.randint(0, len(bestMoves) - 1)
-    print("counter = " + str(counter))
-    return bestMoves[randomInt]
+    if maxDepth is None:  # A search with a time or node limit goes on until the limit is reached
+        maxDepth = MAX_DEPTH if timeLimit is not None or nodeLimit is not None else DEPTH
+    maxDepth = min(maxDepth, MAX_DEPTH)
+    startTime = time.perf_counter()
+    deadline = startTime + timeLimit if timeLimit is not None else None
+    maxNodes = nodeLimit
+    searchStop = stopEvent
+    startPly = len(gs.moveLog)
+    bestMove = None
+    for depth in range(1, maxDepth + 1):
+        rootDepth = depth
+        # Aspiration window: the score is not expected to move far from the score of the previous depth, and a narrow
+        # window cuts off more. If the score falls outside the window, the window is widened and the depth searched again
+        alpha, beta = -CHECKMATE, CHECKMATE
+        window = ASPIRATION_WINDOW
+        if depth > 1 and abs(bestScore) < MATE_SCORE:
+            alpha, beta = max(bestScore - window, -CHECKMATE), min(bestScore + window, CHECKMATE)
+        try:
+            while True:
+                nextMove = None
+                score = min_max(gs, validMoves, depth, alpha, beta, turnScalar, 0)
+                if score <= alpha and alpha > -CHECKMATE:
+                    alpha = max(score - window, -CHECKMATE)
+                elif score >= beta and beta < CHECKMATE:
+                    beta = min(score + window, CHECKMATE)
+                else:
+                    break
+                window *= 2
+        except SearchAborted:
+            while len(gs.moveLog) > startPly:  # Take back the moves of the unfinished depth
+                gs.undo_move()
+            break
+        bestMove = nextMove
+        bestScore = score
+        principalVariation = pvTable[0]
+        completedDepth = depth
+        elapsed = time.perf_counter() - startTime
+        print("depth = %d, score = %d, counter = %d, time = %.2f s, pv = %s" % (
+            depth, score, counter, elapsed, " ".join(move.get_chess_notation() for move in principalVariation)))
+        if infoCallback is not None:
+            infoCallback(depth, score, counter, elapsed, principalVariation)
+        if abs(score) >= MATE_SCORE:  # A forced mate was found, searching deeper will not change the result
+            break
+    print("counter = " + str(counter) + ", " + transpositionTable.report())
+    return bestMove
 
 
 '''
-min-max algorithm for calculating best moves
+Stops the search when the time or node limit is reached or the search is stopped. The first depth is always searched
+to the end, so there is a move to return
 '''
 
 
-def min_max(gs, validMoves, depth, alpha, beta, turnScalar):  # Implementing alpha-beta pruning
-    global counter
+def check_limits():
+    if rootDepth > 1:
+        if maxNodes is not None and counter >= maxNodes:
+            raise SearchAborted()
+        if counter % TIME_CHECK_INTERVAL == 0 and ((deadline is not None and time.perf_counter() >= deadline) or
+                                                   (searchStop is not None and searchStop.is_set())):
+            raise SearchAborted()
+
+
+'''
+min-max algorithm for calculating best moves. Returns the score of the position for the player to move. validMoves is
+the list of moves at the root. Below the root it is None and the moves are generated in stages by
+gs.get_staged_moves, so a cutoff on the hash move saves generating the rest. ply is the distance from the root.
+
+Principal variation search: the first move is searched with the full window. Every other move is only expected to be
+worse, which is proven with a cheaper null window search (alpha, alpha + 1). If a move turns out better after all, it is
+searched again with the full window. The best line is collected in pvTable.
+
+Selective search (SEARCH_FEATURES):
+- Check extensions: a player in check is searched one ply deeper, so forced sequences of checks are seen to the end
+- Null move pruning: if the player to move is still at or above beta after passing the turn and a reduced search, a
+  real move will be too, and the node is cut off. Not done in check or with only king and pawns (zugzwang)
+- Late move reductions: quiet moves late in the move order are rarely best, so they are searched one ply less deep.
+  Moves that beat alpha anyway are searched again at full depth
+'''
+
+
+def min_max(gs, validMoves, depth, alpha, beta, turnScalar, ply):  # Implementing alpha-beta pruning
+    global counter, nextMove
     counter += 1
-    if depth == 0:
-        return score_board(gs)
+    check_limits()
+    inCheck = gs.in_check()
+    if inCheck and SEARCH_FEATURES["check extensions"] and ply < 2 * rootDepth:  # Limit extensions of long check lines
+        depth += 1
+    if depth <= 0:
+        return quiescence(gs, alpha, beta, turnScalar, QUIESCENCE_DEPTH, ply)
+    if ply != 0 and USE_TABLEBASES:
+        result = Tablebase.probe(gs)
+        if result is not None:
+            return tablebase_score(result, ply)
 
-    bestMoves = []
+    # Look up the position in the transposition table. A result searched at least as deep can end the search here,
+    # otherwise the best move found last time is searched first. Nodes searched with a full window are not cut off, so
+    # the principal variation is not cut short
+    alphaOriginal = alpha
+    hashMoveID = None
+    pvTable[ply] = []
+    entry = transpositionTable.probe(gs.zobristKey)
+    if entry is not None:
+        entryDepth, entryScore, entryBound, hashMoveID = entry[1], score_from_table(entry[2], ply), entry[3], entry[4]
+        if ply != 0 and beta - alpha == 1 and entryDepth >= depth:
+            if entryBound == EXACT or (entryBound == LOWER_BOUND and entryScore >= beta) or \
+                    (entryBound == UPPER_BOUND and entryScore <= alpha):
+                transpositionTable.cutoffs += 1
+                return entryScore
+
+    if SEARCH_FEATURES["null move"] and ply != 0 and beta - alpha == 1 and depth >= NULL_MOVE_MIN_DEPTH and \
+            not inCheck and gs.moveLog[-1] is not None and gs.has_non_pawn_material() and \
+            turnScalar * gs.evaluation() >= beta:
+        gs.make_null_move()
+        score = -min_max(gs, None, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, -turnScalar, ply + 1)
+        gs.undo_move()
+        if score >= beta:
+            return beta
+    if not MOVE_ORDERING["hash move"]:
+        hashMoveID = None
+    if validMoves is None:
+        validMoves = gs.get_staged_moves(hashMoveID, killerMoves[ply] if MOVE_ORDERING["killers"] else (),
+                                         mvv_lva if MOVE_ORDERING["mvv-lva"] else None,
+                                         history_score if MOVE_ORDERING["history"] else None)
+    else:
+        for i in range(len(validMoves)):
+            if validMoves[i].moveID == hashMoveID:
+                validMoves.insert(0, validMoves.pop(i))
+                break
+
+    bestMove = None
     maxScore = -CHECKMATE
+    movesSearched = 0
     for move in validMoves:
         gs.make_move(move)
-        nextMoves = gs.get_valid_moves()
-        score = -min_max(gs, nextMoves, depth - 1, -beta, -alpha, -turnScalar)
-        if score > maxScore:
-            maxScore = score
-            if depth == DEPTH:
-                bestMoves = [move]  # If there is new higher value, replace list with new best move
-        elif score == maxScore:
-            if depth == DEPTH:
-                bestMoves.append(move)
+        pvTable[ply + 1] = []
+        if bestMove is None:
+            score = -min_max(gs, None, depth - 1, -beta, -alpha, -turnScalar, ply + 1)
+        else:
+            reduction = 0
+            if SEARCH_FEATURES["late move reductions"] and depth >= LMR_MIN_DEPTH and movesSearched >= LMR_MOVES and \
+                    not inCheck and move.pieceCaptured == "--" and not move.promotionPiece and not gs.in_check():
+                reduction = 1
+            score = -min_max(gs, None, depth - 1 - reduction, -alpha - 1, -alpha, -turnScalar, ply + 1)
+            if reduction and score > alpha:  # The reduced search was wrong, search again at full depth
+                score = -min_max(gs, None, depth - 1, -alpha - 1, -alpha, -turnScalar, ply + 1)
+            if alpha < score < beta:  # Better than the best move so far, search again for the exact score
+                score = -min_max(gs, None, depth - 1, -beta, -alpha, -turnScalar, ply + 1)
         gs.undo_move()
+        movesSearched += 1
+        if score > maxScore or bestMove is None:
+            maxScore = score
+            bestMove = move
+            if ply == 0:  # The root always has a line to report, even when every move fails low
+                nextMove = move
+                pvTable[0] = [move] + pvTable[1]
         if maxScore > alpha:  # Pruning
             alpha = maxScore
+            pvTable[ply] = [move] + pvTable[ply + 1]
         if alpha >= beta:
+            if move.pieceCaptured == "--" and not move.promotionPiece:  # Remember quiet moves that cause cutoffs
+                store_killer(ply, move)
+                historyTable[move.pieceMoved][move.endRank][move.endFile] += depth * depth
             break
-    if depth == DEPTH:
-        return bestMoves
+    if bestMove is None:  # No legal moves, get_staged_moves has set checkMate or staleMate
+        return ply - CHECKMATE if gs.checkMate else STALEMATE
+
+    if maxScore <= alphaOriginal:
+        bound = UPPER_BOUND
+    elif maxScore >= beta:
+        bound = LOWER_BOUND
     else:
-        return maxScore
+        bound = EXACT
+    transpositionTable.store(gs.zobristKey, depth, score_to_table(maxScore, ply), bound, bestMove)
+    return maxScore
+
+
+'''
+Quiescence search. At the end of the full depth search captures and promotions are played out until the position is
+quiet, so a position is not scored in the middle of an exchange. The player to move may also "stand pat" and keep the
+static score instead of capturing. In check there is no standing pat, and all moves that get out of check are searched
+(a checkmate scores ply - CHECKMATE, ply being the distance from the root)
+'''
+
+
+def quiescence(gs, alpha, beta, turnScalar, depth, ply):
+    global counter
+    counter += 1
+    check_limits()
+    if gs.in_check():
+        validMoves = gs.get_valid_moves()
+        if not validMoves:  # Checkmate
+            return ply - CHECKMATE
+        if depth == 0:
+            return turnScalar * gs.evaluation()
+        maxScore = -CHECKMATE
+        validMoves.sort(key=mvv_lva, reverse=True)
+    else:
+        # Out of check only captures and promotions are searched, so the quiet moves are never generated. A stalemate
+        # is not noticed here, the position gets its static score
+        standPat = turnScalar * gs.evaluation()
+        if depth == 0 or standPat >= beta:
+            return standPat
+        if standPat > alpha:
+            alpha = standPat
+        maxScore = standPat
+        # Delta pruning: skip captures that cannot raise the score to alpha even when the captured piece is won for
+        # free. Promotions are always searched
+        pieceValues = Evaluation.MG_VALUES
+        validMoves = [move for move in gs.get_capture_moves() if move.promotionPiece or
+                      standPat + pieceValues[move.pieceCaptured[1]] + DELTA_MARGIN > alpha]
+        validMoves.sort(key=mvv_lva, reverse=True)
+
+    for move in validMoves:
+        gs.make_move(move)
+        score = -quiescence(gs, -beta, -alpha, -turnScalar, depth - 1, ply + 1)
+        gs.undo_move()
+        if score > maxScore:
+            maxScore = score
+        if maxScore > alpha:
+            alpha = maxScore
+        if alpha >= beta:
+            break
+    return maxScore
 
 
 '''
-Score Board
+Move ordering keys. MVV-LVA (most valuable victim, least valuable attacker) tries winning captures like pawn takes queen
+first. The history score counts how often a piece moving to a square caused a cutoff, weighted by depth
+'''
+
+
+def mvv_lva(move):
+    score = 10 * pieceScore[move.pieceCaptured[1]] if move.pieceCaptured != "--" else 0
+    if move.promotionPiece:
+        score += 10 * pieceScore[move.promotionPiece[1]]
+    return score - pieceScore[move.pieceMoved[1]]
+
+
+def history_score(move):
+    return historyTable[move.pieceMoved][move.endRank][move.endFile]
+
+
+def store_killer(ply, move):
+    killers = killerMoves[ply]
+    if killers[0] != move.moveID:
+        killers[1] = killers[0]
+        killers[0] = move.moveID
+
+
+'''
+Score Board. Material and piece-square tables are kept up to date by make_move and undo_move, so this does not have to
+look at the board
 '''
 
 
 def score_board(gs):
-    print("gs.checkmate " + str(gs.checkmate))
-    if gs.checkmate:
+    if gs.checkMate:
         if gs.whiteToMove:
             return -CHECKMATE  # Black wins
         else:
             return CHECKMATE  # White wins
-    elif gs.stalemate:
+    elif gs.staleMate:
         return STALEMATE
-
-    score = 0
-    for rank in gs.board:
-        for square in rank:
-            pieceColor = square[0]
-            piece = square[1]
-            if pieceColor == 'w':
-                score += pieceScore[piece]
-            elif pieceColor == 'b':
-                score -= pieceScore[piece]
-    return score
+    return gs.evaluation()
 
 
 '''
@@ -0,0 +1,506 @@
+"""This module generates and probes endgame tablebases for positions with up to four pieces, kings included. A table is
+built by retrograde analysis: checkmates are found first, then the positions one move before them, and so on backwards
+until every position that can be won or lost is known, together with its distance to mate. Captures and promotions
+leave a table, so the smaller tables they lead to are built first. Run it as a script:
+
+    python Tablebase.py build [KQvK KRvK ...]   builds the given tables (the three piece ones by default)
+    python Tablebase.py info [KQvK ...]         shows the wins, draws, losses and longest mate of built tables
+
+Every table file holds one byte per position: 0 for a draw, 1-127 for a win and 128-254 for a loss of the side to move
+in that many plies (minus 128) to mate, and 255 for an illegal position. Positions are indexed by the side to move and
+the squares of the white king, black king, other white pieces and other black pieces. Only the positions with the white
+king in a corner triangle (a corner half of the board for tables with pawns) are stored, the rest are found by
+mirroring the board. En passant is not taken into account, so positions where it is possible are not probed. Building a
+four piece table takes many minutes in Python."""
+
+import argparse
+import collections
+import itertools
+import mmap
+import os
+import struct
+import sys
+import time
+import ChessEngine
+
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+MAX_PIECES = 4
+MAX_TABLE_PHASE = 8  # Largest game phase (see Evaluation.PHASE_WEIGHTS) of a position with at most MAX_PIECES pieces
+DEFAULT_TABLES = ["KQvK", "KRvK", "KPvK"]
+HEADER = struct.Struct(">4sB8s")  # Magic, format version, table name
+MAGIC = b"CPTB"
+VERSION = 1
+PIECE_ORDER = "KQRBNP"
+# Tables without a position in which either side can mate. Probing them always returns a draw
+TRIVIAL_DRAWS = {"KvK", "KBvK", "KNvK"}
+DRAW = 0
+LOSS = 128
+ILLEGAL = 255
+
+'''
+Square tables, indexed by square = rank * 8 + file like BitboardEngine. They are made from the [rank][file] tables of
+ChessEngine
+'''
+
+
+def to_squares(squareLists):
+    return [[r * 8 + f for r, f in squareLists[sq // 8][sq % 8]] for sq in range(64)]
+
+
+STEP_TARGETS = {'K': to_squares(ChessEngine.KING_SQUARES), 'N': to_squares(ChessEngine.KNIGHT_SQUARES)}
+PAWN_CAPTURES = {color: to_squares(squares) for color, squares in ChessEngine.PAWN_ATTACK_SQUARES.items()}
+# Squares attacked by a king, knight or pawn (e.g. 'wP') from every square
+STEP_ATTACKS = {color + pieceType: [set(targets) for targets in STEP_TARGETS[pieceType]]
+                for color in "wb" for pieceType in "KN"}
+STEP_ATTACKS.update({color + 'P': [set(targets) for targets in PAWN_CAPTURES[color]] for color in "wb"})
+SLIDER_RAYS = {
+    'R': [[[r * 8 + f for r, f in ChessEngine.RAY_SQUARES[sq // 8][sq % 8][d]] for d in ChessEngine.ROOK_DIRECTIONS]
+          for sq in range(64)],
+    'B': [[[r * 8 + f for r, f in ChessEngine.RAY_SQUARES[sq // 8][sq % 8][d]] for d in ChessEngine.BISHOP_DIRECTIONS]
+          for sq in range(64)]}
+SLIDER_RAYS['Q'] = [SLIDER_RAYS['R'][sq] + SLIDER_RAYS['B'][sq] for sq in range(64)]
+# LINES[a][b] is (diagonal, squares in between) when a slider on a could attack b on an empty board, otherwise None
+LINES = [[None if ChessEngine.LINES[a // 8][a % 8][b // 8][b % 8] is None else
+          (ChessEngine.LINES[a // 8][a % 8][b // 8][b % 8][2],
+           frozenset(r * 8 + f for r, f in ChessEngine.LINES[a // 8][a % 8][b // 8][b % 8][1]))
+          for b in range(64)] for a in range(64)]
+
+'''
+Symmetry. Without pawns the board can be mirrored left to right, top to bottom and along the a1-h8 diagonal, which
+brings the white king into the triangle a1-d1-d4. Pawns only allow the left to right mirror, into files a-d
+'''
+
+
+def mirror_file(sq):
+    return sq ^ 7
+
+
+def mirror_rank(sq):
+    return sq ^ 56
+
+
+def mirror_diagonal(sq):
+    return (7 - sq % 8) * 8 + 7 - sq // 8
+
+
+def symmetry(kingSquare, pawns):
+    transforms = []
+    if kingSquare % 8 > 3:
+        transforms.append(mirror_file)
+        kingSquare = mirror_file(kingSquare)
+    if not pawns:
+        if kingSquare // 8 < 4:
+            transforms.append(mirror_rank)
+            kingSquare = mirror_rank(kingSquare)
+        if 7 - kingSquare // 8 > kingSquare % 8:
+            transforms.append(mirror_diagonal)
+    return transforms
+
+
+KING_REGIONS = {False: [sq for sq in range(64) if not symmetry(sq, False)],
+                True: [sq for sq in range(64) if not symmetry(sq, True)]}
+REGION_INDEX = {pawns: {sq: i for i, sq in enumerate(squares)} for pawns, squares in KING_REGIONS.items()}
+
+
+def strength(pieceTypes):  # More pieces first, then stronger pieces
+    return len(pieceTypes), [-PIECE_ORDER.index(t) for t in pieceTypes]
+
+
+'''
+Name of the table for the given white and black piece types (e.g. "KQ" and "K"), and whether the colors have to be
+swapped to find the position in it. Tables are made for the side with the stronger pieces as white
+'''
+
+
+def table_name(whiteTypes, blackTypes):
+    whiteTypes = "".join(sorted(whiteTypes, key=PIECE_ORDER.index))
+    blackTypes = "".join(sorted(blackTypes, key=PIECE_ORDER.index))
+    swap = strength(whiteTypes) < strength(blackTypes)
+    if swap:
+        whiteTypes, blackTypes = blackTypes, whiteTypes
+    return whiteTypes + "v" + blackTypes, swap
+
+
+'''
+Pieces of a table in index order as (color, type): white king, black king, the other white pieces, the other black
+pieces
+'''
+
+
+def table_pieces(name):
+    whiteTypes, blackTypes = name.split("v")
+    return [('w', 'K'), ('b', 'K')] + [('w', t) for t in whiteTypes[1:]] + [('b', t) for t in blackTypes[1:]]
+
+
+class Table:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, name = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + " is not a tablebase file of this version")
+        self.name = name.rstrip(b"\0").decode()
+        self.pieces = table_pieces(self.name)
+        self.pawns = 'P' in self.name
+        self.blockSize = 64 ** (len(self.pieces) - 1)
+        self.regionSize = len(KING_REGIONS[self.pawns])
+
+    '''
+    Raw byte of a position given as a list of (color, type, square) with the material of this table
+    '''
+
+    def lookup(self, pieceList, whiteToMove):
+        ordered = sorted(pieceList, key=lambda p: (p[1] != 'K', p[0] != 'w', PIECE_ORDER.index(p[1])))
+        squares = [sq for _, _, sq in ordered]
+        for transform in symmetry(squares[0], self.pawns):
+            squares = [transform(sq) for sq in squares]
+        index = (0 if whiteToMove else self.regionSize) + REGION_INDEX[self.pawns][squares[0]]
+        for sq in squares[1:]:
+            index = index * 64 + sq
+        return self.data[HEADER.size + index]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+tables = {}  # Table name -> open Table, or None when there is no file for it
+
+'''
+Opens the table with the given name, or returns None if it has not been built
+'''
+
+
+def load_table(name):
+    if name not in tables:
+        path = os.path.join(TABLEBASE_DIR, name + ".tb")
+        tables[name] = Table(path) if os.path.exists(path) else None
+    return tables[name]
+
+
+'''
+Result of a position given as a list of (color, type, square): (1, plies to mate) if the side to move wins,
+(-1, plies to mate) if it loses and (0, 0) for a draw. Returns None if the table is missing or the position is illegal
+'''
+
+
+def probe_pieces(pieceList, whiteToMove):
+    name, swap = table_name([t for c, t, _ in pieceList if c == 'w'], [t for c, t, _ in pieceList if c == 'b'])
+    if name in TRIVIAL_DRAWS:
+        return 0, 0
+    table = load_table(name)
+    if table is None:
+        return None
+    if swap:  # Swap the colors and mirror the board top to bottom
+        pieceList = [('b' if c == 'w' else 'w', t, mirror_rank(sq)) for c, t, sq in pieceList]
+        whiteToMove = not whiteToMove
+    value = table.lookup(pieceList, whiteToMove)
+    if value == ILLEGAL:
+        return None
+    if value == DRAW:
+        return 0, 0
+    return (1, value) if value < LOSS else (-1, value - LOSS)
+
+
+'''
+Looks up a game state. Returns None when the position has more than MAX_PIECES pieces, castling rights or an en
+passant capture, or when its table has not been built
+'''
+
+
+def probe(gs):
+    if gs.phase > MAX_TABLE_PHASE or any(gs.castlingRights['w']) or any(gs.castlingRights['b']):
+        return None
+    pieceList = []
+    for r in range(8):
+        for f in range(8):
+            piece = gs.board[r][f]
+            if piece != "--":
+                if len(pieceList) == MAX_PIECES:
+                    return None
+                pieceList.append((piece[0], piece[1], r * 8 + f))
+    if gs.en_passant_square():
+        return None
+    return probe_pieces(pieceList, gs.whiteToMove)
+
+
+'''
+Move generation on square lists, used to build the tables. A position is a list of squares in the order of the table
+pieces. Moves are (piece index, target square, index of the captured piece or -1, promotion type or None)
+'''
+
+
+def is_attacked(target, pieces, squares, color, skip=-1):
+    occupied = set(squares)
+    for k, (pieceColor, pieceType) in enumerate(pieces):
+        if pieceColor != color or k == skip:
+            continue
+        sq = squares[k]
+        if pieceType in "KNP":
+            if target in STEP_ATTACKS[pieceColor + pieceType][sq]:
+                return True
+        else:
+            line = LINES[sq][target]
+            if line is not None and (pieceType == 'Q' or line[0] == (pieceType == 'B')) and \
+                    occupied.isdisjoint(line[1]):
+                return True
+    return False
+
+
+def pseudo_legal_moves(pieces, squares, color):
+    pieceAt = {sq: k for k, sq in enumerate(squares)}
+    moves = []
+    for k, (pieceColor, pieceType) in enumerate(pieces):
+        if pieceColor != color:
+            continue
+        sq = squares[k]
+        if pieceType in "KN":
+            for target in STEP_TARGETS[pieceType][sq]:
+                captured = pieceAt.get(target, -1)
+                if captured == -1 or pieces[captured][0] != color:
+                    moves.append((k, target, captured, None))
+        elif pieceType == 'P':
+            step, startRank, lastRank = (-8, 6, 0) if color == 'w' else (8, 1, 7)
+            targets = []
+            if sq + step not in pieceAt:
+                targets.append((sq + step, -1))
+                if sq // 8 == startRank and sq + 2 * step not in pieceAt:
+                    targets.append((sq + 2 * step, -1))
+            for target in PAWN_CAPTURES[color][sq]:
+                captured = pieceAt.get(target, -1)
+                if captured != -1 and pieces[captured][0] != color:
+                    targets.append((target, captured))
+            for target, captured in targets:
+                if target // 8 == lastRank:
+                    moves.extend((k, target, captured, promotion) for promotion in "QRBN")
+                else:
+                    moves.append((k, target, captured, None))
+        else:
+            for ray in SLIDER_RAYS[pieceType][sq]:
+                for target in ray:
+                    captured = pieceAt.get(target, -1)
+                    if captured == -1:
+                        moves.append((k, target, -1, None))
+                        continue
+                    if pieces[captured][0] != color:
+                        moves.append((k, target, captured, None))
+                    break
+    return moves
+
+
+'''
+Squares a piece of the side that just moved may have come from to reach its square without capturing or promoting
+'''
+
+
+def retro_origins(pieceColor, pieceType, sq, occupied):
+    if pieceType in "KN":
+        return [origin for origin in STEP_TARGETS[pieceType][sq] if origin not in occupied]
+    if pieceType == 'P':
+        step, doubleRank, lastOrigin = (8, 4, 6) if pieceColor == 'w' else (-8, 3, 1)
+        origin = sq + step
+        if not 0 <= origin < 64 or origin in occupied or \
+                (origin // 8 > lastOrigin if pieceColor == 'w' else origin // 8 < lastOrigin):
+            return []
+        origins = [origin]
+        if sq // 8 == doubleRank and origin + step not in occupied:
+            origins.append(origin + step)
+        return origins
+    origins = []
+    for ray in SLIDER_RAYS[pieceType][sq]:
+        for origin in ray:
+            if origin in occupied:
+                break
+            origins.append(origin)
+    return origins
+
+
+'''
+Builds the table with the given name by retrograde analysis and returns its values for every position, indexed by
+side to move and the squares of all pieces. The tables reached by captures and promotions must already exist
+'''
+
+
+def generate_table(name):
+    pieces = table_pieces(name)
+    n = len(pieces)
+    sideSize = 64 ** n
+    weights = [64 ** (n - 1 - k) for k in range(n)]
+    colors = ['w', 'b']
+    values = bytearray(2 * sideSize)  # 0 until the position is won or lost, so the positions left at 0 are draws
+    moveCounts = bytearray(2 * sideSize)  # Moves that stay in the table and have not been found to lose
+    # Best result of the moves that leave the table: shortest win, longest loss and whether one of them draws
+    exitWins = bytearray(2 * sideSize)
+    exitLosses = bytearray(2 * sideSize)
+    exitDraws = bytearray(2 * sideSize)
+    wins = {}  # Plies to mate -> positions that win in that many plies
+    losses = {}
+
+    for squares in itertools.product(range(64), repeat=n):
+        index = sum(sq * weight for sq, weight in zip(squares, weights))
+        if len(set(squares)) < n or any(pieceType == 'P' and sq // 8 in (0, 7)
+                                        for (_, pieceType), sq in zip(pieces, squares)):
+            values[index] = values[sideSize + index] = ILLEGAL
+            continue
+        for side in (0, 1):
+            color, enemy = colors[side], colors[1 - side]
+            position = side * sideSize + index
+            if is_attacked(squares[1 - side], pieces, squares, color):  # The side not to move is in check
+                values[position] = ILLEGAL
+                continue
+            legalMoves = 0
+            for k, target, captured, promotion in pseudo_legal_moves(pieces, squares, color):
+                after = list(squares)
+                after[k] = target
+                if is_attacked(after[side], pieces, after, enemy, captured):
+                    continue
+                legalMoves += 1
+                if captured == -1 and promotion is None:
+                    moveCounts[position] += 1
+                    continue
+                pieceList = [(pieces[j][0], promotion if j == k and promotion else pieces[j][1], after[j])
+                             for j in range(n) if j != captured]
+                result, plies = probe_pieces(pieceList, enemy == 'w')
+                if result < 0:
+                    exitWins[position] = min(exitWins[position] or 255, plies + 1)
+                elif result == 0:
+                    exitDraws[position] = 1
+                else:
+                    exitLosses[position] = max(exitLosses[position], plies)
+            if legalMoves == 0:
+                if is_attacked(squares[side], pieces, squares, enemy):
+                    losses.setdefault(0, []).append(position)  # Checkmate
+            elif exitWins[position]:
+                wins.setdefault(exitWins[position], []).append(position)
+            elif moveCounts[position] == 0 and not exitDraws[position]:
+                losses.setdefault(exitLosses[position] + 1, []).append(position)
+
+    plies = 0
+    while wins or losses:
+        if plies >= LOSS - 1:
+            raise ValueError(name + " has a mate too long to store")
+        won = []
+        for position in wins.pop(plies, []):
+            if values[position] == 0:  # A position can be reached more than once
+                values[position] = plies
+                won.append(position)
+        lost = []
+        for position in losses.pop(plies, []):
+            if values[position] == 0:
+                values[position] = LOSS + plies
+                lost.append(position)
+        # Every position with a move to a lost position is won one ply later. A position all of whose moves lead to
+        # won positions is lost, as late as its longest line
+        for resolved, isLoss in ((lost, True), (won, False)):
+            for position in resolved:
+                side, index = divmod(position, sideSize)
+                squares = [index // weight % 64 for weight in weights]
+                occupied = set(squares)
+                predecessorSide = (1 - side) * sideSize
+                for k, (pieceColor, pieceType) in enumerate(pieces):
+                    if pieceColor != colors[1 - side]:
+                        continue
+                    for origin in retro_origins(pieceColor, pieceType, squares[k], occupied):
+                        predecessor = predecessorSide + index + (origin - squares[k]) * weights[k]
+                        if values[predecessor] != 0:
+                            continue
+                        if isLoss:
+                            wins.setdefault(plies + 1, []).append(predecessor)
+                        else:
+                            moveCounts[predecessor] -= 1
+                            if moveCounts[predecessor] == 0 and not exitWins[predecessor] and \
+                                    not exitDraws[predecessor]:
+                                losses.setdefault(max(plies, exitLosses[predecessor]) + 1, []).append(predecessor)
+        plies += 1
+    return values
+
+
+'''
+Names of the tables that captures and promotions in the given table lead to
+'''
+
+
+def dependencies(name):
+    pieces = table_pieces(name)
+    names = set()
+    for captured in [None] + [k for k in range(len(pieces)) if pieces[k][1] != 'K']:
+        for promoted in [None] + [k for k in range(len(pieces)) if pieces[k][1] == 'P' and k != captured]:
+            for promotion in ("QRBN" if promoted is not None else [None]):
+                remaining = [(color, promotion if k == promoted else pieceType)
+                             for k, (color, pieceType) in enumerate(pieces) if k != captured]
+                names.add(table_name([t for c, t in remaining if c == 'w'], [t for c, t in remaining if c == 'b'])[0])
+    names.discard(name)
+    return names - TRIVIAL_DRAWS
+
+
+'''
+Builds a table and writes it to TABLEBASE_DIR, building the tables it depends on first. Tables that exist already are
+kept
+'''
+
+
+def build_table(name, rebuild=False):
+    name = table_name(*name.split("v"))[0]
+    if name in TRIVIAL_DRAWS or (not rebuild and load_table(name) is not None):
+        return
+    if len(table_pieces(name)) > MAX_PIECES:
+        raise ValueError("Tables have at most %d pieces" % MAX_PIECES)
+    for dependency in sorted(dependencies(name), key=len):
+        build_table(dependency)
+    start = time.perf_counter()
+    values = generate_table(name)
+    pieces = table_pieces(name)
+    pawns = 'P' in name
+    blockSize = 64 ** (len(pieces) - 1)
+    os.makedirs(TABLEBASE_DIR, exist_ok=True)
+    path = os.path.join(TABLEBASE_DIR, name + ".tb")
+    with open(path, "wb") as tableFile:
+        tableFile.write(HEADER.pack(MAGIC, VERSION, name.encode()))
+        for side in (0, 1):
+            for kingSquare in KING_REGIONS[pawns]:
+                blockStart = (side * 64 + kingSquare) * blockSize
+                tableFile.write(values[blockStart:blockStart + blockSize])
+    if tables.get(name) is not None:
+        tables[name].close()
+    tables.pop(name, None)
+    print("%s built in %.1f s" % (name, time.perf_counter() - start))
+
+
+'''
+Counts the wins, draws and losses of the side to move in a built table and finds the longest mate
+'''
+
+
+def table_info(name):
+    table = load_table(table_name(*name.split("v"))[0])
+    if table is None:
+        return None
+    histogram = collections.Counter(table.data[HEADER.size:])
+    counts = {"wins": sum(histogram[value] for value in range(1, LOSS)), "draws": histogram[DRAW],
+              "losses": sum(histogram[value] for value in range(LOSS, ILLEGAL)), "illegal": histogram[ILLEGAL]}
+    return counts, max([value for value in histogram if DRAW < value < LOSS], default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect endgame tablebases")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("tables", nargs="*", help="table names such as KQvK or KRvKP, default: the three piece tables")
+    args = parser.parse_args()
+    names = args.tables or DEFAULT_TABLES
+    if args.command == "build":
+        for name in names:
+            build_table(name)
+        return 0
+    for name in names:
+        info = table_info(name)
+        if info is None:
+            print("%-8s not built" % name)
+            continue
+        counts, longest = info
+        print("%-8s %9d wins %9d draws %9d losses, longest mate %d moves (stored positions)" % (
+            name, counts["wins"], counts["draws"], counts["losses"], (longest + 1) // 2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""This module plays matches between two configurations of SmartMoveFinder to find out whether a change makes the engine
+stronger. A configuration is a set of SmartMoveFinder settings (module constants) given as JSON, for example
+'{"SEARCH_FEATURES": {"null move": false}}'. Dictionaries are merged into the default one, other values replace it.
+
+Every opening is played twice with the colors swapped, and the games are shared out between a pool of worker processes.
+Every move is searched with the same fixed budget (nodes, seconds or depth). The result of every game is appended to a
+JSON Lines file as soon as it is known. After every game a sequential probability ratio test (SPRT) checks whether the
+results so far are enough to decide between elo0 (the change is no better) and elo1 (it is better by that much), and
+the match stops as soon as they are. Run it as a script:
+
+    python Tournament.py --first '{"LMR_MOVES": 4}' --nodes 2000 --games 400 --results match.jsonl"""
+
+import argparse
+import collections
+import contextlib
+import copy
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import ChessEngine
+import SmartMoveFinder
+from TranspositionTable import TranspositionTable
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_GAMES = 200
+DEFAULT_NODES = 2000  # Node budget per move when no budget is given
+MAX_GAME_PLIES = 300  # Longer games are adjudicated as draws
+FIFTY_MOVE_PLIES = 100
+# Settings of both engines unless a configuration says otherwise. The openings already vary the games, a book would
+# make them repeat
+BASE_SETTINGS = {"USE_BOOK": False}
+# Short opening lines from the start position, each played with both colors
+OPENINGS = [
+    "e2e4 e7e5 g1f3 b8c6 f1b5",
+    "e2e4 e7e5 g1f3 b8c6 f1c4",
+    "e2e4 c7c5 g1f3 d7d6",
+    "e2e4 c7c5 b1c3 b8c6",
+    "e2e4 e7e6 d2d4 d7d5",
+    "e2e4 c7c6 d2d4 d7d5",
+    "e2e4 d7d5 e4d5 d8d5",
+    "e2e4 g8f6 e4e5 f6d5",
+    "d2d4 d7d5 c2c4 e7e6",
+    "d2d4 d7d5 c2c4 d5c4",
+    "d2d4 g8f6 c2c4 g7g6",
+    "d2d4 g8f6 c2c4 e7e6 g1f3 b7b6",
+    "d2d4 f7f5 g2g3 g8f6",
+    "c2c4 e7e5 b1c3 g8f6",
+    "g1f3 d7d5 g2g3 c7c5",
+    "b2b3 e7e5 c1b2 b8c6",
+]
+# SPRT error rates: accepting elo1 when elo0 is true (alpha) and the other way round (beta)
+SPRT_ALPHA = 0.05
+SPRT_BETA = 0.05
+
+savedSettings = {}  # Default value of every SmartMoveFinder setting a configuration changed, in a worker process
+engineTables = {}  # Transposition table of each engine in a worker process, so they do not share what they found
+
+'''
+Restores the default SmartMoveFinder settings and applies the settings of one configuration. Raises ValueError for a
+setting SmartMoveFinder does not have
+'''
+
+
+def apply_settings(settings):
+    for name, value in savedSettings.items():
+        setattr(SmartMoveFinder, name, copy.deepcopy(value))
+    for name, value in settings.items():
+        if not hasattr(SmartMoveFinder, name):
+            raise ValueError("SmartMoveFinder has no setting " + name)
+        if name not in savedSettings:
+            savedSettings[name] = copy.deepcopy(getattr(SmartMoveFinder, name))
+        if isinstance(value, dict):
+            merged = dict(savedSettings[name])
+            merged.update(value)
+            value = merged
+        setattr(SmartMoveFinder, name, value)
+
+
+'''
+Builds the FEN of an opening line from the start position. A line that already is a FEN is returned as it is
+'''
+
+
+def opening_fen(opening):
+    if "/" in opening:
+        return opening
+    gs = ChessEngine.game_state()
+    for notation in opening.split():
+        move = next((move for move in gs.get_valid_moves() if move.get_chess_notation() == notation), None)
+        if move is None:
+            raise ValueError("Illegal move %s in opening %s" % (notation, opening))
+        gs.make_move(move)
+    return gs.get_fen()
+
+
+'''
+True if neither side has enough material left to mate: kings only, or kings and a single knight or bishop
+'''
+
+
+def insufficient_material(gs):
+    pieces = [piece[1] for rank in gs.board for piece in rank if piece != "--" and piece[1] != 'K']
+    return not pieces or (len(pieces) == 1 and pieces[0] in "NB")
+
+
+'''
+Runs in a worker process. Plays one game and returns its record. task is (game number, opening FEN, whether the first
+engine plays white, settings of both engines, (depth, seconds, nodes) per move, seed)
+'''
+
+
+def play_game(task):
+    gameNumber, fen, firstIsWhite, engineSettings, (maxDepth, timeLimit, nodeLimit), seed = task
+    random.seed(seed)  # The search picks between equal moves at random
+    for engine in range(2):
+        if engine not in engineTables:
+            engineTables[engine] = TranspositionTable(SmartMoveFinder.TT_SIZE)
+        engineTables[engine].clear()
+    gs = ChessEngine.game_state.from_fen(fen)
+    positionCounts = collections.Counter([gs.zobristKey])
+    halfmoveClock = gs.startHalfmoveClock
+    moves = []
+    while True:
+        validMoves = gs.get_valid_moves()
+        if not validMoves:
+            reason = "checkmate" if gs.checkMate else "stalemate"
+            result = ("0-1" if gs.whiteToMove else "1-0") if gs.checkMate else "1/2-1/2"
+            break
+        reason = ("fifty moves" if halfmoveClock >= FIFTY_MOVE_PLIES else
+                  "repetition" if positionCounts[gs.zobristKey] >= 3 else
+                  "insufficient material" if insufficient_material(gs) else
+                  "move limit" if len(moves) >= MAX_GAME_PLIES else None)
+        if reason is not None:
+            result = "1/2-1/2"
+            break
+        engine = 0 if gs.whiteToMove == firstIsWhite else 1
+        apply_settings(engineSettings[engine])
+        SmartMoveFinder.transpositionTable = engineTables[engine]
+        with contextlib.redirect_stdout(io.StringIO()):  # The per depth lines of the search
+            move = SmartMoveFinder.find_move(gs, validMoves, maxDepth, timeLimit, nodeLimit)
+        halfmoveClock = 0 if move.pieceMoved[1] == 'P' or move.pieceCaptured != "--" else halfmoveClock + 1
+        gs.make_move(move)
+        positionCounts[gs.zobristKey] += 1
+        moves.append(move.get_chess_notation())
+    points = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}[result]
+    return {"game": gameNumber, "fen": fen, "white": "first" if firstIsWhite else "second", "moves": moves,
+            "result": result, "reason": reason, "score": points if firstIsWhite else 1.0 - points}
+
+
+'''
+Expected score of a player that is elo points stronger
+'''
+
+
+def expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+'''
+Log likelihood ratio of elo1 against elo0 for the results of the first engine, with the normal approximation used by
+match runners such as fishtest. The test accepts elo1 above log((1 - beta) / alpha) and elo0 below
+log(beta / (1 - alpha))
+'''
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins + draws / 4) / games - score ** 2
+    if variance <= 0:  # All results the same, nothing to tell the hypotheses apart by yet
+        return 0.0
+    s0, s1 = expected_score(elo0), expected_score(elo1)
+    return (s1 - s0) * (2 * score - s0 - s1) / (2 * variance / games)
+
+
+def sprt_bounds(alpha=SPRT_ALPHA, beta=SPRT_BETA):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+'''
+Elo difference of the first engine and the half width of its 95% confidence interval. A score of 0 or 1 is clamped, so
+the result stays finite
+'''
+
+
+def elo_estimate(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, float("inf")
+    score = (wins + draws / 2) / games
+    deviation = math.sqrt(max((wins + draws / 4) / games - score ** 2, 0.0) / games)
+
+    def elo(s):
+        s = min(max(s, 0.001), 0.999)
+        return 400 * math.log10(s / (1 - s))
+
+    return elo(score), (elo(score + 1.96 * deviation) - elo(score - 1.96 * deviation)) / 2
+
+
+'''
+Plays the match and appends every game to resultsPath. Stops after games games or when the SPRT accepts one of the
+hypotheses. Returns (wins, draws, losses) of the first engine
+'''
+
+
+def run_match(firstSettings, secondSettings, games=DEFAULT_GAMES, workers=DEFAULT_WORKERS, maxDepth=None,
+              timeLimit=None, nodeLimit=None, openings=OPENINGS, resultsPath="tournament.jsonl", elo0=0.0, elo1=5.0,
+              seed=0):
+    engineSettings = [dict(BASE_SETTINGS, **firstSettings), dict(BASE_SETTINGS, **secondSettings)]
+    for settings in engineSettings:  # Find mistakes before starting the workers
+        for name in settings:
+            if not hasattr(SmartMoveFinder, name):
+                raise ValueError("SmartMoveFinder has no setting " + name)
+    if maxDepth is not None and maxDepth <= 0:
+        raise ValueError("The depth must be at least 1")
+    if maxDepth is None and timeLimit is None and nodeLimit is None:
+        nodeLimit = DEFAULT_NODES
+    fens = [opening_fen(opening) for opening in openings]
+    tasks = [(game, fens[game // 2 % len(fens)], game % 2 == 0, engineSettings, (maxDepth, timeLimit, nodeLimit),
+              seed + game) for game in range(games)]
+    lower, upper = sprt_bounds()
+    results = {1.0: 0, 0.5: 0, 0.0: 0}
+    pool = multiprocessing.Pool(workers)
+    try:
+        with open(resultsPath, "a") as resultsFile:
+            for record in pool.imap_unordered(play_game, tasks):
+                resultsFile.write(json.dumps(record) + "\n")
+                resultsFile.flush()
+                results[record["score"]] += 1
+                wins, draws, losses = results[1.0], results[0.5], results[0.0]
+                elo, margin = elo_estimate(wins, draws, losses)
+                llr = sprt_llr(wins, draws, losses, elo0, elo1)
+                print("games %d: +%d =%d -%d, elo %+.1f +- %.1f, LLR %.2f (%.2f, %.2f)" % (
+                    wins + draws + losses, wins, draws, losses, elo, margin, llr, lower, upper))
+                if llr >= upper or llr <= lower:
+                    print("SPRT: %s accepted" % ("elo1 = %g, the first engine is stronger" % elo1 if llr >= upper else
+                                                 "elo0 = %g, the first engine is not stronger" % elo0))
+                    break
+    finally:
+        pool.terminate()
+        pool.join()
+    return results[1.0], results[0.5], results[0.0]
+
+
+'''
+Reads openings from a file: one FEN or one line of moves from the start position (e2e4 e7e5 ...) per line
+'''
+
+
+def read_openings(path):
+    with open(path) as openingsFile:
+        return [line.strip() for line in openingsFile if line.strip() and not line.startswith("#")]
+
+
+def positive_int(text):
+    value = int(text)
+    if value <= 0:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a match between two SmartMoveFinder configurations")
+    parser.add_argument("--first", type=json.loads, default={}, help="settings of the first engine as JSON")
+    parser.add_argument("--second", type=json.loads, default={}, help="settings of the second engine as JSON")
+    parser.add_argument("--games", type=int, default=DEFAULT_GAMES, help="most games to play")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--nodes", type=int, help="nodes per move (%d if no budget is given)" % DEFAULT_NODES)
+    parser.add_argument("--movetime", type=float, help="seconds per move")
+    parser.add_argument("--depth", type=positive_int, help="depth per move")
+    parser.add_argument("--openings", help="file with one FEN or move list per line")
+    parser.add_argument("--results", default="tournament.jsonl", help="JSON Lines file the games are appended to")
+    parser.add_argument("--elo0", type=float, default=0.0)
+    parser.add_argument("--elo1", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    openings = read_openings(args.openings) if args.openings else OPENINGS
+    try:
+        run_match(args.first, args.second, args.games, args.workers, args.depth, args.movetime, args.nodes, openings,
+                  args.results, args.elo0, args.elo1, args.seed)
+    except ValueError as error:
+        print(error)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""This module holds the transposition table used by SmartMoveFinder. It remembers the result of searching a position
+(keyed by game_state.zobristKey) so the search does not have to search the same position again when it is reached
+through a different move order."""
+
+EXACT = 0  # Score is the exact value of the position
+LOWER_BOUND = 1  # Search failed high, the position is worth at least score
+UPPER_BOUND = 2  # Search failed low, the position is worth at most score
+DEFAULT_SIZE = 2 ** 18  # Number of entries
+
+
+class TranspositionTable:
+    def __init__(self, size=DEFAULT_SIZE):
+        # The number of entries is rounded down to a power of two so the index is just the low bits of the key. All
+        # slots are allocated up front, so memory does not grow during long games
+        self.size = 1 << (max(size, 1).bit_length() - 1)
+        self.mask = self.size - 1
+        # Every slot is None or a tuple (key, depth, score, bound, bestMoveID, age)
+        self.slots = [None] * self.size
+        self.age = 0  # Incremented every search so entries from older searches get replaced first
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.stores = 0
+        self.overwrites = 0  # Stores that replaced an entry of another position
+
+    '''
+    Called before every search. Entries from earlier searches are kept but become the first to be replaced
+    '''
+
+    def new_search(self):
+        self.age += 1
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def clear(self):
+        self.slots = [None] * self.size
+        self.new_search()
+
+    '''
+    Returns the entry stored for key or None
+    '''
+
+    def probe(self, key):
+        self.probes += 1
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    '''
+    Replacement policy: an entry is replaced if it is for the same position, left over from an older search, or was
+    searched to the same depth or less than the new result
+    '''
+
+    def store(self, key, depth, score, bound, bestMove):
+        index = key & self.mask
+        entry = self.slots[index]
+        if entry is None or entry[0] == key or entry[5] != self.age or depth >= entry[1]:
+            if entry is not None and entry[0] != key:
+                self.overwrites += 1
+            bestMoveID = bestMove.moveID if bestMove is not None else None
+            self.slots[index] = (key, depth, score, bound, bestMoveID, self.age)
+            self.stores += 1
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    '''
+    Fraction of slots in use, sampled from the first thousand slots
+    '''
+
+    def usage(self):
+        sample = self.slots[:1000]
+        return sum(1 for entry in sample if entry is not None) / len(sample)
+
+    def report(self):
+        return "TT probes = %d, hit rate = %.1f%%, cutoffs = %d, stores = %d, overwrites = %d, usage = %.1f%%" % (
+            self.probes, 100 * self.hit_rate(), self.cutoffs, self.stores, self.overwrites, 100 * self.usage())
@@ -0,0 +1,237 @@
+"""This module lets chess GUIs, match runners and other programs use the engine through the Universal Chess Interface
+(UCI) on stdin and stdout, without pygame. Run it as a script and point the program at it:
+
+    python UCI.py [--backend bitboards]
+
+Supported commands: uci, isready, ucinewgame, setoption (OwnBook, Ponder), position startpos/fen ... moves ...,
+go (depth, movetime, nodes, wtime, btime, winc, binc, movestogo, infinite, ponder), stop, ponderhit and quit. The search
+runs in a SearchThread, so commands are still read while it runs. It reports an info line after every depth. The search
+prints its own progress too; that goes to stderr, so stdout only carries UCI."""
+
+import argparse
+import sys
+import threading
+import SearchThread
+import SmartMoveFinder
+import Perft
+
+ENGINE_NAME = "ChessProject"
+ENGINE_AUTHOR = "ISerenityI"
+MOVES_TO_GO = 30  # Moves the remaining clock time is shared out over when the GUI does not send movestogo
+MOVE_OVERHEAD = 0.05  # Seconds kept back from every move for the time it takes to send it
+MIN_MOVE_TIME = 0.01
+GO_NUMBERS = ("depth", "movetime", "nodes", "wtime", "btime", "winc", "binc", "movestogo")
+
+'''
+Seconds to search a move with the given clock in seconds: an even share of the remaining time plus most of the
+increment, never more than the clock allows
+'''
+
+
+def move_time(remaining, increment=0.0, movesToGo=None):
+    share = remaining / (movesToGo or MOVES_TO_GO) + increment * 0.75
+    return max(MIN_MOVE_TIME, min(share, remaining - MOVE_OVERHEAD))
+
+
+'''
+UCI score of a search score (centipawns for the side to move): "cp 35", or "mate 3" / "mate -2" in moves. A mate scores
+CHECKMATE less the plies to the mate, negative when the engine is being mated
+'''
+
+
+def uci_score(score):
+    if abs(score) < SmartMoveFinder.MATE_SCORE:
+        return "cp %d" % score
+    plies = SmartMoveFinder.CHECKMATE - abs(score)
+    moves = (plies + 1) // 2
+    return "mate %d" % (moves if score > 0 else -moves)
+
+
+class UCIEngine:
+    def __init__(self, gameState=Perft.BACKENDS["list"], output=sys.stdout):
+        self.gameState = gameState
+        self.gs = gameState()
+        self.output = output
+        self.outputLock = threading.Lock()  # The relay thread and the command loop both write
+        self.search = None
+        self.relay = None
+        self.release = None  # Set when the best move may be sent. Held back while pondering or searching infinitely
+        self.ponderTime = None  # Time limit of a ponder search once the GUI sends ponderhit
+        self.infinite = False
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    '''
+    Handles one command line. Returns False when the engine should quit
+    '''
+
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name OwnBook type check default %s" % str(SmartMoveFinder.USE_BOOK).lower())
+            self.send("option name Ponder type check default false")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop()
+            SmartMoveFinder.transpositionTable.clear()
+            self.gs = self.gameState()
+        elif command == "setoption":
+            self.set_option(arguments)
+        elif command == "position":
+            self.stop()
+            self.set_position(arguments)
+        elif command == "go":
+            self.go(arguments)
+        elif command == "stop":
+            self.stop()
+        elif command == "ponderhit":
+            self.ponder_hit()
+        elif command == "quit":
+            self.stop()
+            return False
+        else:
+            self.send("info string unknown command " + command)
+        return True
+
+    def set_option(self, arguments):
+        if "name" not in arguments or "value" not in arguments:
+            return
+        name = " ".join(arguments[arguments.index("name") + 1:arguments.index("value")]).lower()
+        value = " ".join(arguments[arguments.index("value") + 1:]).lower()
+        if name == "ownbook":
+            SmartMoveFinder.USE_BOOK = value == "true"
+
+    '''
+    position startpos [moves e2e4 ...] or position fen <FEN> [moves ...]. Moves are in the notation of
+    Move.get_chess_notation. An illegal move is reported and the moves after it are ignored
+    '''
+
+    def set_position(self, arguments):
+        movesAt = arguments.index("moves") if "moves" in arguments else len(arguments)
+        try:
+            if arguments[:1] == ["fen"]:
+                gs = self.gameState.from_fen(" ".join(arguments[1:movesAt]))
+            else:
+                gs = self.gameState()
+        except ValueError as error:
+            self.send("info string " + str(error))
+            return
+        for notation in arguments[movesAt + 1:]:
+            move = next((move for move in gs.get_valid_moves() if move.get_chess_notation() == notation), None)
+            if move is None:
+                self.send("info string illegal move " + notation)
+                break
+            gs.make_move(move)
+        self.gs = gs
+
+    '''
+    Starts a search of the current position with the limits of the go command. Without any limits it searches to
+    SmartMoveFinder.MAX_DEPTH
+    '''
+
+    def go(self, arguments):
+        self.stop()
+        limits = {}
+        for i, token in enumerate(arguments[:-1]):
+            if token in GO_NUMBERS:
+                try:
+                    limits[token] = int(arguments[i + 1])
+                except ValueError:
+                    pass
+        if not self.gs.get_valid_moves():
+            self.send("bestmove 0000")
+            return
+        timeLimit = None
+        if "movetime" in limits:
+            timeLimit = max(MIN_MOVE_TIME, limits["movetime"] / 1000 - MOVE_OVERHEAD)
+        elif ("wtime" if self.gs.whiteToMove else "btime") in limits:
+            side = 'w' if self.gs.whiteToMove else 'b'
+            timeLimit = move_time(limits[side + "time"] / 1000, limits.get(side + "inc", 0) / 1000,
+                                  limits.get("movestogo"))
+        self.infinite = "infinite" in arguments
+        held = self.infinite or "ponder" in arguments
+        self.ponderTime = timeLimit if "ponder" in arguments else None
+        self.search = SearchThread.SearchThread(self.gs, limits.get("depth", SmartMoveFinder.MAX_DEPTH),
+                                                None if held else timeLimit, limits.get("nodes"))
+        self.release = threading.Event()
+        if not held:
+            self.release.set()
+        self.relay = threading.Thread(target=self.relay_messages, args=(self.search, self.release), daemon=True)
+        self.search.start()
+        self.relay.start()
+
+    '''
+    Runs in its own thread during a search. Sends an info line for every depth the search reports, then the best move
+    once it may be sent
+    '''
+
+    def relay_messages(self, search, release):
+        while True:
+            message = search.messages.get()
+            if message[0] == "info":
+                _, depth, score, nodes, seconds, principalVariation = message
+                self.send("info depth %d score %s nodes %d nps %d time %d pv %s" % (
+                    depth, uci_score(score), nodes, nodes / seconds if seconds > 0 else 0,
+                    seconds * 1000, " ".join(move.get_chess_notation() for move in principalVariation)))
+            else:
+                _, bestMove, principalVariation = message
+                release.wait()
+                line = "bestmove " + bestMove.get_chess_notation()
+                if len(principalVariation) > 1:
+                    line += " ponder " + principalVariation[1].get_chess_notation()
+                self.send(line)
+                return
+
+    '''
+    Stops the running search, if any, and waits until its best move has been sent
+    '''
+
+    def stop(self):
+        if self.search is None:
+            return
+        self.release.set()
+        self.search.stop()
+        self.relay.join()
+        self.search = None
+        self.relay = None
+
+    '''
+    The GUI's opponent played the move the engine was pondering on. The search carries on as a normal search with the
+    time limit of the go ponder command, or with its other limits if it had no clock
+    '''
+
+    def ponder_hit(self):
+        if self.search is None:
+            return
+        if self.ponderTime is not None:
+            self.search.ponder_hit(self.ponderTime)
+        if not self.infinite:
+            self.release.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UCI engine on stdin and stdout")
+    parser.add_argument("--backend", choices=Perft.BACKENDS.keys(), default="list")
+    args = parser.parse_args()
+    engine = UCIEngine(Perft.BACKENDS[args.backend], sys.stdout)
+    sys.stdout = sys.stderr  # The prints of the search must not mix with the UCI output
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    else:
+        engine.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())